@@ -3,6 +3,7 @@ Application configuration and settings
 Loads environment variables from .env file
 """
 import os
+from typing import List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -15,10 +16,130 @@ class Settings(BaseSettings):
     
     # Gemini API
     gemini_api_key: str = ""  # Must be set in .env
+    gemini_model: str = "gemini-2.5-flash"
+    gemini_temperature: float = 0.7
+    gemini_max_output_tokens: int = 2048
+    gemini_deterministic: bool = False  # Force temperature 0 so personas can be cached
+    gemini_api_endpoint: str = ""  # Base URL for the REST client (e.g. a local stand-in); empty uses the SDK
+    gemini_api_timeout_seconds: float = 120.0  # REST client only
+    
+    # LLM Backend (gemini, fake for offline runs, record/replay for prompt -> response cassettes on disk)
+    llm_backend: str = "gemini"
+    llm_fake_latency_seconds: float = 0.5
+    llm_fake_jitter_seconds: float = 0.1
+    llm_cassette_dir: str = "llm_cassettes"  # record writes here, replay reads from here
+    llm_cassette_replay_latency: bool = False  # Sleep each call's recorded latency on replay
+    
+    # Gemini Rate Limits (callers queue for capacity instead of failing)
+    gemini_max_concurrency: int = 8
+    gemini_requests_per_minute: int = 60  # 0 disables the limit
+    gemini_tokens_per_minute: int = 1000000  # 0 disables the limit
+    
+    # LLM Resilience (retries, deadline and hedged requests around each Gemini call)
+    llm_max_attempts: int = 4  # 1 disables retries
+    llm_backoff_initial_seconds: float = 0.5  # Jittered exponential backoff between attempts
+    llm_backoff_max_seconds: float = 8.0
+    llm_deadline_seconds: float = 60.0  # All attempts of one call, from its first admission (queueing excluded); 0 disables
+    llm_hedge_enabled: bool = False
+    llm_hedge_quantile: float = 0.95  # Hedge calls still running past this latency quantile
+    llm_hedge_min_samples: int = 20  # Recent calls needed before hedging starts
+    llm_hedge_budget_ratio: float = 0.05  # Hedged calls per call, at most
+    
+    # Circuit Breaker (stop calling Gemini while it is failing)
+    circuit_breaker_enabled: bool = True
+    circuit_window_calls: int = 20  # Recent calls the failure ratio is computed over
+    circuit_min_calls: int = 10
+    circuit_failure_ratio: float = 0.5  # Failed or slow share that opens the circuit
+    circuit_slow_call_seconds: float = 30.0  # Successful calls slower than this count as failures; 0 disables
+    circuit_open_seconds: float = 30.0  # Before probing again
+    circuit_half_open_probes: int = 2  # Successful probes needed to close
+    heuristic_fallback_enabled: bool = True  # Answer with a keyword-based persona (marked degraded) when Gemini is unavailable
+    
+    # Persona Cache (only used in deterministic mode)
+    persona_cache_enabled: bool = True
+    persona_cache_max_entries: int = 256
+    persona_cache_ttl_seconds: int = 24 * 60 * 60
+    persona_cache_sqlite_path: str = ""  # Empty disables the on-disk tier
+    
+    # Incremental Analysis (running personas of growing surveys, keyed by survey_key)
+    persona_state_max_entries: int = 64
+    persona_state_ttl_seconds: int = 30 * 24 * 60 * 60  # Since the last update
+    persona_state_sqlite_path: str = ""  # Empty keeps running personas in memory only
+    incremental_summary_words: int = 250  # Running summary the model keeps next to the persona
+    
+    # Survey Store (parsed uploads, referenced by survey_id)
+    survey_store_dir: str = "survey_store"  # Parquet files; empty keeps surveys in memory only
+    survey_store_memory_entries: int = 16
+    survey_store_ttl_seconds: int = 24 * 60 * 60  # Since last access
+    survey_store_max_disk_mb: int = 1024
+    survey_store_preview_rows: int = 5
+    
+    # Map-Reduce Analysis (large surveys)
+    map_reduce_enabled: bool = True
+    map_reduce_chunk_tokens: int = 30000  # Input budget per chunk prompt
+    map_reduce_concurrency: int = 4  # Chunk calls in flight per analysis
+    map_reduce_summary_tokens: int = 1024  # Output budget per chunk summary
+    
+    # Prompt Budget (stratified sampling of oversized surveys)
+    prompt_input_token_budget: int = 200000  # Response tokens per analysis; 0 disables
+    prompt_sample_keyword_clusters: int = 8
+    prompt_sample_length_buckets: int = 4
+    prompt_sample_order_buckets: int = 4
+    gemini_input_price_per_million: float = 0.30  # USD, for cost estimates only
+    gemini_output_price_per_million: float = 2.50
+    
+    # Segmentation (/analyze/segments: one persona per cluster of responses)
+    segment_default_clusters: int = 4
+    segment_max_clusters: int = 12
+    segment_vocabulary_size: int = 2000  # Most frequent words kept as TF-IDF features
+    segment_batch_size: int = 2048  # Mini-batch k-means
+    segment_iterations: int = 100
+    segment_input_token_budget: int = 30000  # Per cluster prompt, instead of prompt_input_token_budget
+    segment_concurrency: int = 4  # Cluster analyses in flight per request
+    
+    # Response Pre-filter (drop low-signal answers while parsing; lists are JSON in the environment)
+    filter_enabled: bool = True
+    filter_min_chars: int = 0  # 0 disables
+    filter_min_alpha_ratio: float = 0.0  # Letters per non-space character; 0 disables
+    filter_stop_answers: List[str] = [  # Only non-answers; real words like "yes" or "same" can carry meaning
+        "n/a", "na", "idk", "asdf", "qwerty", "xxx",
+    ]
+    filter_deny_patterns: List[str] = [  # RE2 syntax, case-insensitive
+        r"^(https?://|www\.)\S*$",  # Bare URL
+        r"^\S+@\S+\.\S+$",  # Bare email address
+        r"^(asdf|qwer|zxcv|hjkl|sdfg|dfgh|fghj)\w*$",  # Keyboard mashing
+    ]
+    filter_scripts: List[str] = []  # e.g. ["Latin"]; empty accepts every script
+    
+    # Response Dedup (collapse duplicate answers before prompting)
+    dedup_enabled: bool = True
+    dedup_similarity_threshold: float = 0.8  # Estimated Jaccard over byte 4-grams
+    dedup_num_perm: int = 64  # MinHash signature length
+    dedup_bands: int = 16  # LSH bands (must divide dedup_num_perm)
+    
+    # Analysis Jobs (background worker pool)
+    job_workers: int = 2
+    job_queue_backend: str = "memory"  # memory or sqlite
+    job_queue_sqlite_path: str = "analysis_jobs.db"
+    job_poll_interval_seconds: float = 1.0
+    job_lease_seconds: float = 60.0  # SQLite: running jobs not renewed for this long are claimed again
+    job_retention_seconds: int = 24 * 60 * 60
     
     # File Upload Settings
     max_file_size_mb: int = 5
-    allowed_file_types: str = "csv,xlsx"
+    allowed_file_types: str = "csv,xlsx,parquet,arrow,feather,ndjson"
+    survey_response_column: str = ""  # Parquet/Arrow/NDJSON; empty picks the first text column (preferring "*response*")
+    
+    # Parse Pool (CPU-bound file parsing in worker processes)
+    parse_pool_workers: int = min(4, os.cpu_count() or 1)  # 0 parses on a thread in the server process
+    parse_timeout_seconds: float = 60.0  # Per file; the worker is killed when exceeded
+    parse_disconnect_poll_seconds: float = 0.5  # How often to check for a client that went away
+    
+    # Batch Analysis
+    batch_max_files: int = 50
+    batch_max_upload_mb: int = 100  # Whole multipart body or zip archive
+    batch_parse_concurrency: int = 4
+    batch_analysis_concurrency: int = 4  # Shared by all batch requests
     
     # Server Settings
     host: str = "0.0.0.0"
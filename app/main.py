@@ -1,8 +1,23 @@
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from app.config import settings
 from app.routes import router
+from app.services.job_queue import job_pool
+from app.services.parse_pool import parse_pool
+from app.services.upload_intake import (
+    UploadSizeLimitMiddleware, UploadTooLargeError, upload_too_large_handler
+)
+from app.services.metrics import registry, RequestMetricsMiddleware
+from app.services.persona_cache import persona_cache
+from app.services.persona_state import persona_states
+from app.services.rate_limiter import llm_limiter
+from app.services.llm_resilience import llm_resilience
+from app.services.circuit_breaker import llm_breaker
+from app.services.single_flight import analysis_flight
+from app.services.survey_store import survey_store
 
 # Configure logging
 logging.basicConfig(
@@ -11,11 +26,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background workers for /analyze/jobs, and parse processes warmed up before the first upload
+    await job_pool.start()
+    parse_pool.start()
+    yield
+    await job_pool.stop()
+    parse_pool.stop()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Game Survey Analyzer",
     description="Analyze game survey responses with Gemini 2.5 API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -27,6 +52,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized uploads while they stream in
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path_limits={"/analyze/batch": settings.batch_max_upload_mb * 1024 * 1024}
+)
+app.add_exception_handler(UploadTooLargeError, upload_too_large_handler)
+
+# Outermost, so rejected uploads are timed too
+app.add_middleware(RequestMetricsMiddleware)
+
+# Service stats exposed as /metrics gauges
+registry.gauge_callback("persona_cache", "Persona cache counter", persona_cache.get_stats)
+registry.gauge_callback("llm_limiter", "LLM admission control", llm_limiter.get_stats)
+registry.gauge_callback("llm_resilience", "LLM retries and hedged requests", llm_resilience.get_stats)
+registry.gauge_callback("llm_circuit", "LLM circuit breaker", llm_breaker.get_stats)
+registry.gauge_callback("analysis_flight", "Coalesced analysis calls", analysis_flight.get_stats)
+registry.gauge_callback("persona_state", "Running personas of growing surveys", persona_states.get_stats)
+registry.gauge_callback("survey_store", "Stored survey counter", survey_store.get_stats)
+registry.gauge_callback("parse_pool", "File parse worker pool", parse_pool.get_stats)
+
 # Include routes
 app.include_router(router)
 
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Union
+import pyarrow as pa
 
 # ============================================
 # REQUEST/RESPONSE MODELS
@@ -10,10 +11,60 @@ class SurveyResponse(BaseModel):
     text: str = Field(..., description="Response text from survey")
     respondent_id: str = Field(..., description="ID of respondent")
 
-class SurveyData(BaseModel):
-    """Parsed survey data from uploaded file"""
-    responses: List[SurveyResponse] = Field(..., description="List of survey responses")
-    format: str = Field(..., description="File format (csv or xlsx)")
+def _string_column(values: Union[Sequence[str], pa.Array, pa.ChunkedArray]) -> pa.Array:
+    """Contiguous large_string Arrow array (one UTF-8 buffer plus offsets)"""
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    if isinstance(values, pa.Array):
+        return values.cast(pa.large_string())
+    return pa.array(values, type=pa.large_string())
+
+class SurveyData:
+    """
+    Parsed survey data from uploaded file, held column-wise
+
+    texts and respondent_ids are contiguous Arrow string columns rather
+    than one SurveyResponse object per row, so a large survey costs about
+    its text bytes. SurveyResponse views are only built at API boundaries
+    (responses()); internal code works on the columns.
+    """
+    
+    def __init__(self, texts: Union[Sequence[str], pa.Array, pa.ChunkedArray],
+                 respondent_ids: Union[Sequence[str], pa.Array, pa.ChunkedArray], format: str,
+                 filter_report: Optional[Dict] = None):
+        self.texts = _string_column(texts)
+        self.respondent_ids = _string_column(respondent_ids)
+        if len(self.texts) != len(self.respondent_ids):
+            raise ValueError("Survey texts and respondent IDs differ in length")
+        self.format = format
+        # What the parse-time pre-filter dropped (None if it did not run)
+        self.filter_report = filter_report
+    
+    def __len__(self) -> int:
+        return len(self.texts)
+    
+    @property
+    def nbytes(self) -> int:
+        """Memory held by both columns"""
+        return self.texts.nbytes + self.respondent_ids.nbytes
+    
+    def text_list(self) -> List[str]:
+        """Response texts as Python strings"""
+        return self.texts.to_pylist()
+    
+    def respondent_ids_at(self, indices: Sequence[int]) -> List[str]:
+        """Respondent IDs of the given rows"""
+        return self.respondent_ids.take(pa.array(indices, type=pa.int64())).to_pylist()
+    
+    def responses(self, limit: Optional[int] = None) -> List[SurveyResponse]:
+        """SurveyResponse views of the first limit rows (all rows when None)"""
+        texts, respondent_ids = self.texts, self.respondent_ids
+        if limit is not None:
+            texts, respondent_ids = texts.slice(0, limit), respondent_ids.slice(0, limit)
+        return [
+            SurveyResponse(text=text, respondent_id=respondent_id)
+            for text, respondent_id in zip(texts.to_pylist(), respondent_ids.to_pylist())
+        ]
 
 # ============================================
 # PERSONA MODELS
@@ -50,6 +101,7 @@ class PlayerPersona(BaseModel):
     motivations: Motivations = Field(..., description="Player motivations")
     pain_points: PainPoints = Field(..., description="Player pain points")
     spending_habits: SpendingHabits = Field(..., description="Spending and monetization habits")
+    degraded: bool = Field(False, description="Built from keyword heuristics because Gemini was unavailable")
 
 # ============================================
 # API RESPONSE MODELS
@@ -61,13 +113,33 @@ class UploadResponse(BaseModel):
     message: str = Field(..., description="Response message")
     responses_count: Optional[int] = Field(None, description="Number of responses parsed")
     format: Optional[str] = Field(None, description="File format")
-    survey_data: Optional[SurveyData] = Field(None, description="Parsed survey data")
+    survey_id: Optional[str] = Field(None, description="Stored survey ID to pass to /analyze")
+    preview: Optional[List[SurveyResponse]] = Field(None, description="First few parsed responses")
+    filter: Optional[dict] = Field(None, description="Low-signal responses dropped by the pre-filter, per rule")
 
 class AnalysisResponse(BaseModel):
     """Response from /analyze endpoint"""
     status: str = Field(..., description="Status (success or error)")
     message: str = Field(..., description="Response message")
     persona: Optional[PlayerPersona] = Field(None, description="Generated persona")
+    metadata: Optional[dict] = Field(None, description="Pipeline details such as the dedup report")
+
+class AnalysisJob(BaseModel):
+    """Background analysis job"""
+    job_id: str = Field(..., description="Job identifier")
+    status: str = Field(..., description="queued, running, succeeded, failed or cancelled")
+    created_at: float = Field(..., description="Unix timestamp when the job was queued")
+    updated_at: float = Field(..., description="Unix timestamp of the last status change")
+    responses_count: int = Field(..., description="Number of responses to analyze")
+    persona: Optional[PlayerPersona] = Field(None, description="Generated persona once succeeded")
+    error_type: Optional[str] = Field(None, description="Type of error if the job failed")
+    message: Optional[str] = Field(None, description="Error or status message")
+
+class JobResponse(BaseModel):
+    """Response from /analyze/jobs endpoints"""
+    status: str = Field(..., description="Status (success or error)")
+    message: str = Field(..., description="Response message")
+    job: Optional[AnalysisJob] = Field(None, description="Job state")
 
 class ErrorResponse(BaseModel):
     """Error response"""
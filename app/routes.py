@@ -1,20 +1,49 @@
 import logging
-from fastapi import APIRouter, UploadFile, File
-from fastapi.responses import JSONResponse
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from app.models import UploadResponse, ErrorResponse, SurveyData
-from app.services.file_validator import validator
+from app.config import settings
+from app.services.file_validator import validator, classify_validation_error
+from app.services.batch_analysis import batch_analyzer
+from app.services.job_queue import job_pool
+from app.services.parse_pool import parse_pool
+from app.services.single_flight import analysis_flight
+from app.services.response_dedup import deduplicator
+from app.services.survey_store import survey_store
+from app.services.persona_stream import sse_event
+from app.services.heuristic_persona import DEGRADED_MESSAGE
+from app.services.metrics import registry, count_error
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+
+async def load_survey(file: Optional[UploadFile], survey_id: Optional[str], request: Request) -> SurveyData:
+    """Parsed survey from a stored survey_id, or from the uploaded file"""
+    if survey_id:
+        survey_data = await asyncio.to_thread(survey_store.get, survey_id)
+        if survey_data is None:
+            raise ValueError(f"Survey {survey_id} not found or expired; upload the file again")
+        return survey_data
+    
+    if file is None:
+        raise ValueError("Provide a survey file or the survey_id returned by /upload")
+    return await parse_pool.parse(file.filename, file.file, request.is_disconnected)
+
+
 @router.post("/upload")
-async def upload_survey(file: UploadFile = File(...)):
+async def upload_survey(request: Request, file: UploadFile = File(...)):
     """
-    Upload and validate survey file (CSV or XLSX)
+    Upload and validate survey file (CSV, XLSX, Parquet, Arrow/Feather or NDJSON)
+    
+    The parsed survey is kept server-side; pass the returned survey_id to
+    /analyze (or /analyze/stream, /analyze/jobs) instead of the file.
     
     Returns:
-        - Success (200): Survey data extracted and validated
+        - Success (200): survey_id, responses count and a short preview
         - Error (400): Validation error (format, size, empty)
         - Error (415): Unsupported file format
         - Error (413): File too large
@@ -23,22 +52,27 @@ async def upload_survey(file: UploadFile = File(...)):
     try:
         logger.info(f"Upload request: filename={file.filename}")
         
-        # Read file content
-        file_content = await file.read()
-        logger.info(f"File size: {len(file_content) / (1024*1024):.2f}MB")
+        # Body was size-checked while streaming; large files are spooled to disk
+        logger.info(f"File size: {(file.size or 0) / (1024*1024):.2f}MB")
+        
+        # Validate and parse file in a worker process (straight from the spooled upload)
+        survey_data = await parse_pool.parse(file.filename, file.file, request.is_disconnected)
         
-        # Validate and parse file
-        survey_data = validator.validate_file(file.filename, file_content)
+        logger.info(f"File validated successfully. Responses: {len(survey_data)}")
         
-        logger.info(f"File validated successfully. Responses: {len(survey_data.responses)}")
+        # Keep the parsed survey so /analyze does not parse it again
+        survey_id = validator.content_hash(survey_data)
+        await asyncio.to_thread(survey_store.put, survey_id, survey_data)
         
         # Success response
         return {
             "status": "success",
             "message": "File validated and ready for analysis",
-            "responses_count": len(survey_data.responses),
+            "responses_count": len(survey_data),
             "format": survey_data.format,
-            "survey_data": survey_data.dict()
+            "survey_id": survey_id,
+            "preview": survey_store.preview(survey_data),
+            "filter": survey_data.filter_report
         }
     
     except ValueError as e:
@@ -46,19 +80,9 @@ async def upload_survey(file: UploadFile = File(...)):
         logger.warning(f"Validation error: {error_msg}")
         
         # Determine error type and HTTP status
-        if "Unsupported file format" in error_msg:
-            status_code = 415
-            error_type = "unsupported_format"
-        elif "exceeds" in error_msg and "MB" in error_msg:
-            status_code = 413
-            error_type = "file_too_large"
-        elif "empty" in error_msg.lower():
-            status_code = 400
-            error_type = "empty_file"
-        else:
-            status_code = 400
-            error_type = "validation_error"
+        status_code, error_type = classify_validation_error(error_msg)
         
+        count_error(error_type)
         return JSONResponse(
             status_code=status_code,
             content={
@@ -71,6 +95,7 @@ async def upload_survey(file: UploadFile = File(...)):
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         
+        count_error("internal_error")
         return JSONResponse(
             status_code=500,
             content={
@@ -82,73 +107,440 @@ async def upload_survey(file: UploadFile = File(...)):
 
 
 @router.post("/analyze")
-async def analyze_survey(file: UploadFile = File(...)):
+async def analyze_survey(request: Request, file: Optional[UploadFile] = File(None),
+                         survey_id: Optional[str] = Form(None)):
     """
-    Upload survey file and generate AI-powered player persona
+    Upload survey file (or reference one stored by /upload) and generate AI-powered player persona
     
     Complete workflow:
-    1. Validate file (CSV/XLSX)
+    1. Validate file (CSV/XLSX/Parquet/Arrow/NDJSON), or load the stored survey by survey_id
     2. Extract survey responses
-    3. Analyze with Gemini 2.5 API
-    4. Return structured persona
+    3. Collapse duplicate responses
+    4. Analyze with Gemini 2.5 API (sampled down to the prompt budget)
+    5. Return structured persona with dedup, sampling and prompt-cost metadata
     
     Returns:
-        - Success (200): Player persona generated
+        - Success (200): Player persona generated (persona.degraded if Gemini was
+          unavailable and a keyword-based fallback was returned instead)
         - Error (400-500): See error details
     """
     try:
         from app.services.gemini_analyzer import analyzer
         
-        logger.info(f"Analysis request: {file.filename}")
+        logger.info(f"Analysis request: {survey_id or file and file.filename}")
         
-        # Step 1: Read and validate file
-        file_content = await file.read()
-        survey_data = validator.validate_file(file.filename, file_content)
+        # Step 1: Load the stored survey, or parse the file in a worker process
+        survey_data = await load_survey(file, survey_id, request)
         
         logger.info(f"File validated. Starting Gemini analysis...")
         
-        # Step 2: Extract response texts
-        response_texts = [resp.text for resp in survey_data.responses]
+        # Step 2: Extract response texts, collapsing duplicates into weighted lines
+        response_texts, weights, representatives, dedup_report = await asyncio.to_thread(
+            deduplicator.collapse, survey_data.texts
+        )
+        respondent_ids = survey_data.respondent_ids_at(representatives)
         
-        # Step 3: Analyze with Gemini
-        persona = await analyzer.analyze_survey(response_texts)
+        # Step 3: Analyze with Gemini within the prompt budget
+        # (identical concurrent surveys share one call)
+        persona, analysis_metadata = await analysis_flight.do(
+            validator.content_hash(survey_data),
+            lambda: analyzer.analyze_survey_with_metadata(
+                response_texts, respondent_ids=respondent_ids, weights=weights
+            )
+        )
         
         logger.info(f"✓ Analysis complete: {persona.archetype_name}")
         
         # Step 4: Return response
         return {
             "status": "success",
-            "message": "Player persona generated successfully",
-            "persona": persona.dict()
+            "message": DEGRADED_MESSAGE if persona.degraded else "Player persona generated successfully",
+            "persona": persona.dict(),
+            "metadata": {"filter": survey_data.filter_report, "dedup": dedup_report, **analysis_metadata}
         }
     
     except ValueError as e:
-        logger.warning(f"Validation error: {str(e)}")
+        error_msg = str(e)
+        logger.warning(f"Validation error: {error_msg}")
         
-        if "Unsupported file format" in str(e):
-            return JSONResponse(status_code=415, content={
-                "status": "error",
-                "error_type": "unsupported_format",
-                "message": str(e)
-            })
-        elif "exceeds" in str(e):
-            return JSONResponse(status_code=413, content={
-                "status": "error",
-                "error_type": "file_too_large",
-                "message": str(e)
-            })
-        else:
-            return JSONResponse(status_code=400, content={
-                "status": "error",
-                "error_type": "validation_error",
-                "message": str(e)
-            })
+        status_code, error_type = classify_validation_error(error_msg)
+        count_error(error_type)
+        return JSONResponse(status_code=status_code, content={
+            "status": "error",
+            "error_type": error_type,
+            "message": error_msg
+        })
     
     except Exception as e:
         logger.error(f"Analysis error: {str(e)}", exc_info=True)
         
+        count_error("analysis_error")
         return JSONResponse(status_code=500, content={
             "status": "error",
             "error_type": "analysis_error",
             "message": "Failed to generate persona. Please try again."
         })
+
+
+@router.post("/analyze/segments")
+async def analyze_survey_segments(request: Request, file: Optional[UploadFile] = File(None),
+                                  survey_id: Optional[str] = Form(None),
+                                  clusters: int = Form(settings.segment_default_clusters)):
+    """
+    Cluster survey responses locally and generate one persona per cluster
+    
+    Responses are grouped by the words they use (TF-IDF + mini-batch
+    k-means), then every cluster is analyzed concurrently with its own,
+    smaller prompt.
+    
+    Returns:
+        - Success (200): segments (cluster size, share, top terms and persona
+          or per-cluster error) plus the clustering report
+        - Error (400-415): Validation error, same as /upload
+        - Error (404): Unknown or expired survey_id
+    """
+    try:
+        from app.services.segmentation import segmenter
+        
+        if not 1 <= clusters <= settings.segment_max_clusters:
+            raise ValueError(f"clusters must be between 1 and {settings.segment_max_clusters}")
+        
+        logger.info(f"Segment analysis request ({clusters} clusters): {survey_id or file and file.filename}")
+        
+        survey_data = await load_survey(file, survey_id, request)
+        segments, clustering = await segmenter.analyze(survey_data, clusters)
+        
+        succeeded = sum(1 for segment in segments if segment["status"] == "success")
+        logger.info(f"✓ Segment analysis complete: {succeeded}/{len(segments)} personas")
+        
+        return {
+            "status": "success",
+            "message": f"Generated {succeeded} personas for {len(segments)} clusters",
+            "segments": segments,
+            "metadata": {"filter": survey_data.filter_report, "clustering": clustering}
+        }
+    
+    except ValueError as e:
+        error_msg = str(e)
+        logger.warning(f"Validation error: {error_msg}")
+        
+        status_code, error_type = classify_validation_error(error_msg)
+        count_error(error_type)
+        return JSONResponse(status_code=status_code, content={
+            "status": "error",
+            "error_type": error_type,
+            "message": error_msg
+        })
+    
+    except Exception as e:
+        logger.error(f"Segment analysis error: {str(e)}", exc_info=True)
+        
+        count_error("analysis_error")
+        return JSONResponse(status_code=500, content={
+            "status": "error",
+            "error_type": "analysis_error",
+            "message": "Failed to generate personas. Please try again."
+        })
+
+
+@router.post("/analyze/incremental")
+async def analyze_survey_incremental(request: Request, survey_key: str = Form(...),
+                                     file: Optional[UploadFile] = File(None),
+                                     survey_id: Optional[str] = Form(None),
+                                     match_on: str = Form("content")):
+    """
+    Keep the persona of a live survey up to date as responses are appended
+    
+    survey_key is any stable name for the survey (it stays the same while
+    the file grows). The first call analyzes the whole survey; later calls
+    send only the responses not analyzed yet, matched by respondent ID and
+    text (match_on=content) or respondent ID alone (match_on=respondent_id).
+    
+    Returns:
+        - Success (200): Persona plus metadata.incremental (mode full, update,
+          unchanged, or stale if Gemini was unavailable for the update)
+        - Error (400-415): Validation error, same as /upload
+        - Error (404): Unknown or expired survey_id
+    """
+    try:
+        from app.services.incremental_analysis import incremental_analyzer
+        
+        logger.info(f"Incremental analysis request for {survey_key!r}: {survey_id or file and file.filename}")
+        
+        survey_data = await load_survey(file, survey_id, request)
+        persona, metadata = await incremental_analyzer.analyze(survey_key, survey_data, match_on)
+        
+        logger.info(f"✓ Incremental analysis ({metadata['incremental']['mode']}): {persona.archetype_name}")
+        
+        return {
+            "status": "success",
+            "message": DEGRADED_MESSAGE if persona.degraded else "Player persona generated successfully",
+            "persona": persona.dict(),
+            "metadata": {"filter": survey_data.filter_report, **metadata}
+        }
+    
+    except ValueError as e:
+        error_msg = str(e)
+        logger.warning(f"Validation error: {error_msg}")
+        
+        status_code, error_type = classify_validation_error(error_msg)
+        count_error(error_type)
+        return JSONResponse(status_code=status_code, content={
+            "status": "error",
+            "error_type": error_type,
+            "message": error_msg
+        })
+    
+    except Exception as e:
+        logger.error(f"Incremental analysis error: {str(e)}", exc_info=True)
+        
+        count_error("analysis_error")
+        return JSONResponse(status_code=500, content={
+            "status": "error",
+            "error_type": "analysis_error",
+            "message": "Failed to generate persona. Please try again."
+        })
+
+
+@router.post("/analyze/stream")
+async def analyze_survey_stream(request: Request, file: Optional[UploadFile] = File(None),
+                                survey_id: Optional[str] = Form(None)):
+    """
+    Upload survey file (or pass a survey_id from /upload) and stream persona generation as Server-Sent Events
+    
+    Events:
+        - started: responses count and dedup report
+        - section: one completed persona section ({"name", "value"}), as
+          soon as Gemini has generated it
+        - persona: the validated persona and metadata (last event)
+        - error: error_type and message if analysis fails mid-stream
+    
+    Returns:
+        - Success (200): text/event-stream
+        - Error (400-415): Validation error before streaming starts, same as /upload
+        - Error (404): Unknown or expired survey_id
+        - Error (500): Unexpected error before streaming starts
+    """
+    try:
+        from app.services.gemini_analyzer import analyzer
+        
+        logger.info(f"Streaming analysis request: {survey_id or file and file.filename}")
+        
+        survey_data = await load_survey(file, survey_id, request)
+        response_texts, weights, representatives, dedup_report = await asyncio.to_thread(
+            deduplicator.collapse, survey_data.texts
+        )
+        respondent_ids = survey_data.respondent_ids_at(representatives)
+    
+    except ValueError as e:
+        error_msg = str(e)
+        logger.warning(f"Validation error: {error_msg}")
+        
+        status_code, error_type = classify_validation_error(error_msg)
+        count_error(error_type)
+        return JSONResponse(status_code=status_code, content={
+            "status": "error",
+            "error_type": error_type,
+            "message": error_msg
+        })
+    
+    except Exception as e:
+        logger.error(f"Streaming analysis error: {str(e)}", exc_info=True)
+        
+        count_error("analysis_error")
+        return JSONResponse(status_code=500, content={
+            "status": "error",
+            "error_type": "analysis_error",
+            "message": "Failed to generate persona. Please try again."
+        })
+    
+    async def events():
+        yield sse_event("started", {
+            "responses_count": len(survey_data),
+            "metadata": {"filter": survey_data.filter_report, "dedup": dedup_report}
+        })
+        try:
+            async for event, data in analyzer.stream_survey(response_texts, respondent_ids=respondent_ids, weights=weights):
+                yield sse_event(event, data)
+        except ValueError as e:
+            logger.warning(f"Streaming analysis error: {str(e)}")
+            count_error("validation_error")
+            yield sse_event("error", {"error_type": "validation_error", "message": str(e)})
+        except Exception as e:
+            logger.error(f"Streaming analysis error: {str(e)}", exc_info=True)
+            count_error("analysis_error")
+            yield sse_event("error", {
+                "error_type": "analysis_error",
+                "message": "Failed to generate persona. Please try again."
+            })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/analyze/batch")
+async def analyze_batch(files: List[UploadFile] = File(...)):
+    """
+    Analyze several survey files (or one zip archive of them) in one request
+    
+    Streams NDJSON: one line per file as soon as it finishes, with either
+    a persona or the same error_type taxonomy as /upload, followed by a
+    summary line.
+    
+    Returns:
+        - Success (200): NDJSON stream of per-file results
+        - Error (400): Empty batch, too many files or a broken zip
+        - Error (413): Batch upload too large
+    """
+    try:
+        logger.info(f"Batch analysis request: {len(files)} uploads")
+        
+        sources = batch_analyzer.expand_uploads(files)
+        
+        logger.info(f"Batch contains {len(sources)} survey files")
+        
+        return StreamingResponse(
+            batch_analyzer.stream(sources),
+            media_type="application/x-ndjson"
+        )
+    
+    except ValueError as e:
+        error_msg = str(e)
+        logger.warning(f"Batch validation error: {error_msg}")
+        
+        status_code, error_type = classify_validation_error(error_msg)
+        count_error(error_type)
+        return JSONResponse(status_code=status_code, content={
+            "status": "error",
+            "error_type": error_type,
+            "message": error_msg
+        })
+
+
+@router.post("/analyze/jobs", status_code=202)
+async def create_analysis_job(request: Request, file: Optional[UploadFile] = File(None),
+                              survey_id: Optional[str] = Form(None)):
+    """
+    Validate a survey file (or load a survey_id from /upload) and queue its persona analysis
+    
+    Returns immediately with a job ID; poll GET /analyze/jobs/{job_id}.
+    
+    Returns:
+        - Accepted (202): Job queued
+        - Error (400-415): Validation error, same as /upload
+        - Error (404): Unknown or expired survey_id
+    """
+    try:
+        logger.info(f"Analysis job request: {survey_id or file and file.filename}")
+        
+        survey_data = await load_survey(file, survey_id, request)
+        response_texts, weights, _, _ = await asyncio.to_thread(deduplicator.collapse, survey_data.texts)
+        
+        job = await job_pool.submit(response_texts, weights)
+        
+        return {
+            "status": "success",
+            "message": "Analysis job queued",
+            "job": job.dict()
+        }
+    
+    except ValueError as e:
+        error_msg = str(e)
+        logger.warning(f"Validation error: {error_msg}")
+        
+        status_code, error_type = classify_validation_error(error_msg)
+        count_error(error_type)
+        return JSONResponse(status_code=status_code, content={
+            "status": "error",
+            "error_type": error_type,
+            "message": error_msg
+        })
+    
+    except Exception as e:
+        logger.error(f"Job submission error: {str(e)}", exc_info=True)
+        
+        count_error("internal_error")
+        return JSONResponse(status_code=500, content={
+            "status": "error",
+            "error_type": "internal_error",
+            "message": "An unexpected error occurred during file processing"
+        })
+
+
+@router.get("/analyze/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Job status, and the persona once the job has succeeded"""
+    job = await job_pool.get(job_id)
+    
+    if job is None:
+        count_error("job_not_found")
+        return JSONResponse(status_code=404, content={
+            "status": "error",
+            "error_type": "job_not_found",
+            "message": f"Job {job_id} not found"
+        })
+    
+    return {
+        "status": "success",
+        "message": f"Job {job.status}",
+        "job": job.dict()
+    }
+
+
+@router.post("/analyze/jobs/{job_id}/cancel")
+async def cancel_analysis_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = await job_pool.cancel(job_id)
+    
+    if job is None:
+        existing = await job_pool.get(job_id)
+        if existing is None:
+            count_error("job_not_found")
+            return JSONResponse(status_code=404, content={
+                "status": "error",
+                "error_type": "job_not_found",
+                "message": f"Job {job_id} not found"
+            })
+        count_error("job_not_cancellable")
+        return JSONResponse(status_code=409, content={
+            "status": "error",
+            "error_type": "job_not_cancellable",
+            "message": f"Job {job_id} already {existing.status}"
+        })
+    
+    logger.info(f"Job {job_id} cancelled")
+    
+    return {
+        "status": "success",
+        "message": "Job cancelled",
+        "job": job.dict()
+    }
+
+
+@router.get("/cache/stats")
+def persona_cache_stats():
+    """Persona cache hit/miss counters"""
+    from app.services.persona_cache import persona_cache
+    
+    return {
+        "enabled": persona_cache.enabled,
+        "stats": persona_cache.get_stats()
+    }
+
+
+@router.get("/llm/stats")
+def llm_stats():
+    """Gemini admission-control counters (queue waits, calls in flight)"""
+    from app.services.rate_limiter import llm_limiter
+    
+    return {"limiter": llm_limiter.get_stats()}
+
+
+@router.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of request-stage latencies, counters and service stats"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,152 @@
+import logging
+import asyncio
+import json
+import os
+import zipfile
+from typing import AsyncIterator, Callable, List, Tuple
+from fastapi import UploadFile
+from app.config import settings
+from app.services.file_validator import validator, classify_validation_error, FileContent
+from app.services.parse_pool import parse_pool
+from app.services.single_flight import analysis_flight
+from app.services.response_dedup import deduplicator
+from app.services.metrics import count_error
+
+logger = logging.getLogger(__name__)
+
+# (filename, loader) - loaders run on a worker thread and return the raw file
+BatchSource = Tuple[str, Callable[[], FileContent]]
+
+
+class BatchAnalyzer:
+    """
+    Analyze many survey files in one request
+
+    Every file gets its own pipeline (parse in the parse pool, then
+    analyze), and results are streamed back as NDJSON in completion order,
+    so a slow or broken file never holds up the others. Parsing is bounded
+    per request; analyses share one limit across all batch requests.
+    """
+
+    def __init__(self):
+        self.logger = logger
+        self._analysis_slots = asyncio.Semaphore(settings.batch_analysis_concurrency)
+
+    def expand_uploads(self, uploads: List[UploadFile]) -> List[BatchSource]:
+        """Flatten uploaded files and zip archives into per-file sources"""
+        sources = []
+        for upload in uploads:
+            if os.path.splitext(upload.filename or "")[1].lower() == ".zip":
+                sources.extend(self._expand_zip(upload))
+            else:
+                sources.append((upload.filename, lambda upload=upload: upload.file))
+
+        if not sources:
+            raise ValueError("Batch contains no survey files")
+        if len(sources) > settings.batch_max_files:
+            raise ValueError(f"Batch has {len(sources)} files; the limit is {settings.batch_max_files}")
+
+        return sources
+
+    def _expand_zip(self, upload: UploadFile) -> List[BatchSource]:
+        try:
+            archive = zipfile.ZipFile(upload.file)
+        except zipfile.BadZipFile:
+            raise ValueError(f"{upload.filename} is not a valid zip archive")
+
+        sources = []
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            # Skip folders and OS metadata (__MACOSX/, .DS_Store, ...)
+            if info.is_dir() or not name or name.startswith(".") or "__MACOSX" in info.filename:
+                continue
+            sources.append((info.filename, lambda info=info: self._read_zip_member(archive, info)))
+
+        self.logger.info(f"Expanded {upload.filename}: {len(sources)} files")
+        return sources
+
+    def _read_zip_member(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+        # Check the declared size first so a zip bomb is never inflated
+        if info.file_size > validator.MAX_FILE_SIZE_BYTES:
+            raise ValueError(f"File exceeds {validator.MAX_FILE_SIZE_BYTES / (1024*1024):.0f}MB limit")
+        return archive.read(info)
+
+    async def _process(self, filename: str, load: Callable[[], FileContent], parse_slots: asyncio.Semaphore) -> dict:
+        """Parse and analyze one file, returning its NDJSON record"""
+        from app.services.gemini_analyzer import analyzer
+
+        try:
+            async with parse_slots:
+                survey_data = await parse_pool.parse(filename, await asyncio.to_thread(load))
+                response_texts, weights, representatives, dedup_report = await asyncio.to_thread(
+                    deduplicator.collapse, survey_data.texts
+                )
+            respondent_ids = survey_data.respondent_ids_at(representatives)
+
+            async with self._analysis_slots:
+                persona, analysis_metadata = await analysis_flight.do(
+                    validator.content_hash(survey_data),
+                    lambda: analyzer.analyze_survey_with_metadata(
+                        response_texts, respondent_ids=respondent_ids, weights=weights
+                    )
+                )
+
+            self.logger.info(f"Batch file {filename}: {persona.archetype_name}")
+            return {
+                "filename": filename,
+                "status": "success",
+                "responses_count": len(survey_data),
+                "persona": persona.dict(),
+                "metadata": {"filter": survey_data.filter_report, "dedup": dedup_report, **analysis_metadata}
+            }
+
+        except ValueError as e:
+            status_code, error_type = classify_validation_error(str(e))
+            count_error(error_type)
+            self.logger.warning(f"Batch file {filename}: {str(e)}")
+            return {
+                "filename": filename,
+                "status": "error",
+                "error_type": error_type,
+                "message": str(e)
+            }
+
+        except Exception as e:
+            self.logger.error(f"Batch file {filename} analysis error: {str(e)}", exc_info=True)
+            count_error("analysis_error")
+            return {
+                "filename": filename,
+                "status": "error",
+                "error_type": "analysis_error",
+                "message": "Failed to generate persona. Please try again."
+            }
+
+    async def stream(self, sources: List[BatchSource]) -> AsyncIterator[str]:
+        """Yield one NDJSON line per file as it finishes, then a summary line"""
+        parse_slots = asyncio.Semaphore(settings.batch_parse_concurrency)
+        tasks = [
+            asyncio.ensure_future(self._process(filename, load, parse_slots))
+            for filename, load in sources
+        ]
+
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                record = await next_done
+                succeeded += record["status"] == "success"
+                yield json.dumps(record) + "\n"
+
+            yield json.dumps({
+                "status": "complete",
+                "files": len(sources),
+                "succeeded": succeeded,
+                "failed": len(sources) - succeeded
+            }) + "\n"
+        finally:
+            # Client went away mid-stream: stop the remaining work
+            for task in tasks:
+                task.cancel()
+
+
+# Create singleton instance
+batch_analyzer = BatchAnalyzer()
@@ -0,0 +1,160 @@
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict
+from app.config import settings
+from app.services.llm_resilience import RETRYABLE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the LLM while the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Stop calling a provider that keeps failing
+
+    The outcomes of the last window_calls calls are kept. A call (each
+    attempt or hedge llm_resilience makes) fails if it raises a retryable
+    error or succeeds slower than slow_call_seconds. Once at least min_calls are in the
+    window and the failing share reaches failure_ratio, the circuit opens
+    and every call is rejected at once with CircuitOpenError.
+
+    After open_seconds the circuit goes half-open and lets up to
+    half_open_probes calls through. If that many succeed it closes again;
+    one failure reopens it for another open_seconds.
+
+    guard() should wrap the provider call alone, entered after any local
+    admission control, so queueing never counts as a slow call. Timeouts
+    and cancellations raised on our side are not failures. check() lets
+    callers give up before queueing while the circuit is open.
+    """
+
+    def __init__(self, name: str, enabled: bool, window_calls: int, min_calls: int, failure_ratio: float,
+                 slow_call_seconds: float, open_seconds: float, half_open_probes: int):
+        self.name = name
+        self.logger = logger
+        self.enabled = enabled
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window_calls)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self.stats = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+
+    def check(self):
+        """Raise CircuitOpenError if a call would be rejected now (claims no probe)"""
+        if self.enabled and self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds:
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(f"{self.name} circuit is open; not calling the provider")
+
+    @contextmanager
+    def guard(self):
+        """Wrap one call: raises CircuitOpenError if rejected, records the outcome otherwise"""
+        if not self.enabled:
+            yield
+            return
+
+        probe = self._admit()
+        self.stats["calls"] += 1
+        start = time.perf_counter()
+        try:
+            yield
+        except RETRYABLE_ERRORS:
+            self.stats["failures"] += 1
+            self._record(probe, failed=True)
+            raise
+        except BaseException:
+            # Cancelled (e.g. by our own deadline) or rejected by the provider
+            # (bad request, auth): says nothing about its health
+            if probe:
+                self._probes -= 1
+            raise
+
+        slow = self.slow_call_seconds > 0 and time.perf_counter() - start > self.slow_call_seconds
+        if slow:
+            self.stats["slow_calls"] += 1
+        self._record(probe, failed=slow)
+
+    def _admit(self) -> bool:
+        """Whether the call may go ahead as a probe (False for a normal call); raises if rejected"""
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+            self.logger.info(f"{self.name} circuit half-open, probing with up to {self.half_open_probes} calls")
+
+        if self.state == CLOSED:
+            return False
+        if self.state == HALF_OPEN and self._probes < self.half_open_probes:
+            self._probes += 1
+            return True
+
+        self.stats["rejected"] += 1
+        raise CircuitOpenError(f"{self.name} circuit is open; not calling the provider")
+
+    def _record(self, probe: bool, failed: bool):
+        if probe:
+            self._probes -= 1
+            if self.state != HALF_OPEN:
+                return
+            if failed:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self.state = CLOSED
+                self._outcomes.clear()
+                self.logger.info(f"{self.name} circuit closed after {self._probe_successes} successful probes")
+            return
+
+        # Calls admitted before the circuit opened don't count towards the next window
+        if self.state != CLOSED:
+            return
+        self._outcomes.append(failed)
+        if len(self._outcomes) >= self.min_calls:
+            ratio = sum(self._outcomes) / len(self._outcomes)
+            if ratio >= self.failure_ratio:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.stats["opened"] += 1
+        self.logger.warning(f"{self.name} circuit opened for {self.open_seconds:g}s")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Outcome counters plus the current state (open/half_open as 0/1)"""
+        return {
+            **self.stats,
+            "open": int(self.state == OPEN),
+            "half_open": int(self.state == HALF_OPEN),
+            "window_failures": sum(self._outcomes),
+            "window_calls": len(self._outcomes),
+        }
+
+
+# Guards every Gemini call
+llm_breaker = CircuitBreaker(
+    "Gemini",
+    enabled=settings.circuit_breaker_enabled,
+    window_calls=settings.circuit_window_calls,
+    min_calls=settings.circuit_min_calls,
+    failure_ratio=settings.circuit_failure_ratio,
+    slow_call_seconds=settings.circuit_slow_call_seconds,
+    open_seconds=settings.circuit_open_seconds,
+    half_open_probes=settings.circuit_half_open_probes
+)
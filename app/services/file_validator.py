@@ -1,18 +1,73 @@
 import logging
 import os
 import io
-from typing import List, Optional
+import hashlib
+import mmap
+import time
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.ipc as paipc
+import pyarrow.json as pajson
+import pyarrow.parquet as pq
 import openpyxl
-from app.models import SurveyData, SurveyResponse
+from app.models import SurveyData
+from app.config import settings
+from app.services.metrics import stage_timer, STAGE_SECONDS, RESPONSES_PARSED, RESPONSES_FILTERED
+from app.services.response_filter import response_filter
 
 logger = logging.getLogger(__name__)
 
+# Raw upload: an in-memory payload or a (possibly disk-spooled) binary file
+FileContent = Union[bytes, BinaryIO]
+# Uploads at least this large are memory-mapped instead of read (Starlette's spool size)
+MMAP_MIN_BYTES = 1024 * 1024
+
+# Strings pandas' CSV reader treats as missing by default (pandas STR_NA_VALUES)
+CSV_NULL_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+    "n/a", "nan", "null",
+]
+CSV_TRUE_VALUES = ["True", "TRUE", "true"]
+CSV_FALSE_VALUES = ["False", "FALSE", "false"]
+# Decimal integer literals as pandas reads them (no hex, no digit separators)
+CSV_INTEGER_PATTERN = r"^[+-]?[0-9]+$"
+CSV_UINT64_MAX = str(np.iinfo(np.uint64).max)
+
+# RE2 character class matching exactly what str.split() treats as whitespace
+_WHITESPACE_RUN = "[" + "".join(
+    f"\\x{{{code:04x}}}" for code in range(0x3001) if chr(code).isspace()
+) + "]+"
+
+
+def classify_validation_error(error_msg: str) -> Tuple[int, str]:
+    """Map a validation error message to (HTTP status, error_type)"""
+    if "Unsupported file format" in error_msg:
+        return 415, "unsupported_format"
+    elif "exceeds" in error_msg and "MB" in error_msg:
+        return 413, "file_too_large"
+    elif error_msg.startswith("Survey ") and "not found" in error_msg:
+        return 404, "survey_not_found"
+    elif error_msg.startswith("Parsing took longer"):
+        return 422, "parse_timeout"
+    elif error_msg.startswith("Client disconnected"):
+        return 499, "client_closed_request"
+    elif "empty" in error_msg.lower():
+        return 400, "empty_file"
+    else:
+        return 400, "validation_error"
+
+
 class FileValidator:
-    """Validates and parses survey files (CSV/XLSX)"""
+    """Validates and parses survey files (CSV/XLSX/Parquet/Arrow/NDJSON)"""
     
-    MAX_FILE_SIZE_BYTES = 5 * 1024 * 1024  # 5MB
-    ALLOWED_EXTENSIONS = {'.csv', '.xlsx'}
+    MAX_FILE_SIZE_BYTES = settings.get_max_file_size_bytes()
+    ALLOWED_EXTENSIONS = {'.csv', '.xlsx', '.parquet', '.arrow', '.feather', '.ndjson'}
     
     def __init__(self):
         self.logger = logger
@@ -35,115 +90,470 @@ class FileValidator:
         ext = os.path.splitext(filename)[1].lower()
         
         if ext not in self.ALLOWED_EXTENSIONS:
-            raise ValueError(f"Unsupported file format: {ext}. Please upload CSV or XLSX.")
+            raise ValueError(
+                f"Unsupported file format: {ext}. Please upload CSV, XLSX, Parquet, Arrow/Feather or NDJSON."
+            )
         
         return ext
     
+    def normalize_column(self, column: pa.ChunkedArray) -> pa.ChunkedArray:
+        """Vectorized normalize_text over a whole string column (empty results become null)"""
+        # Same result as strip() + split()/join(); Arrow strings are already
+        # valid UTF-8, so the encode/decode round-trip has nothing to drop
+        column = pc.replace_substring_regex(column, pattern=_WHITESPACE_RUN, replacement=" ")
+        column = pc.utf8_trim(column, characters=" ")
+        return pc.if_else(pc.greater(pc.binary_length(column), 0), column, pa.scalar(None, pa.string()))
+    
+    def filter_responses(self, survey_data: SurveyData) -> SurveyData:
+        """Drop low-signal responses (see ResponseFilter), recording what each rule dropped"""
+        with stage_timer("filter"):
+            kept, report = response_filter.apply(survey_data.texts)
+            if report["dropped_responses"]:
+                indices = pa.array(kept, type=pa.int64())
+                survey_data = SurveyData(
+                    texts=survey_data.texts.take(indices),
+                    respondent_ids=survey_data.respondent_ids.take(indices),
+                    format=survey_data.format
+                )
+        
+        for rule, count in report["dropped_by_rule"].items():
+            if count:
+                RESPONSES_FILTERED.inc(count, rule=rule)
+        survey_data.filter_report = report
+        return survey_data
+    
+    def _no_responses_message(self, survey_data: SurveyData, label: str) -> str:
+        message = f"{label} file contains no valid response data"
+        dropped = survey_data.filter_report and survey_data.filter_report["dropped_responses"]
+        if dropped:
+            message += f" ({dropped} low-signal responses were dropped by the pre-filter)"
+        return message
+    
+    def _read_csv_table(self, file_content: bytes) -> Tuple[pa.Table, Optional[List[str]]]:
+        """Read CSV into an Arrow table of string columns, plus pandas row labels if non-positional"""
+        buffer = pa.py_buffer(file_content)
+        try:
+            # Peek at the header so every column can be read as raw text
+            with pacsv.open_csv(pa.BufferReader(buffer)) as reader:
+                names = reader.schema.names
+            
+            convert_options = pacsv.ConvertOptions(
+                column_types={name: pa.string() for name in names},
+                null_values=CSV_NULL_VALUES,
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=True
+            )
+            table = pacsv.read_csv(
+                pa.BufferReader(buffer),
+                read_options=pacsv.ReadOptions(use_threads=True),
+                convert_options=convert_options
+            )
+            return table, None
+        
+        except pa.ArrowInvalid as e:
+            # Ragged rows, bad encodings etc. - let pandas apply its own rules
+            self.logger.info(f"Arrow CSV reader rejected file ({str(e)}), falling back to pandas")
+            df = pd.read_csv(io.BytesIO(file_content))
+            labels = None if isinstance(df.index, pd.RangeIndex) else [str(idx) for idx in df.index]
+            return pa.Table.from_pandas(df, preserve_index=False), labels
+    
+    def _infer_csv_kind(self, column: pa.ChunkedArray) -> Tuple[str, pa.ChunkedArray]:
+        """Mirror pandas' type inference for a CSV column: int, float, bool or str"""
+        if pa.types.is_integer(column.type):
+            return ("float" if column.null_count else "int"), column
+        if pa.types.is_floating(column.type) or pa.types.is_null(column.type):
+            return "float", column
+        if pa.types.is_boolean(column.type):
+            return "bool", column
+        
+        column = column.cast(pa.string())
+        values = column.drop_null()
+        if len(values) == 0:
+            return "float", column
+        
+        # pandas reads numbers with surrounding spaces, and integers with a leading "+"
+        numbers = pc.ascii_trim_whitespace(column)
+        integers = pc.match_substring_regex(numbers.drop_null(), pattern=CSV_INTEGER_PATTERN)
+        if pc.all(integers).as_py():
+            digits = pc.replace_substring_regex(numbers, pattern=r"^\+", replacement="")
+            for target in (pa.int64(), pa.uint64()):
+                try:
+                    converted = pc.cast(digits, target)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                    continue
+                if not column.null_count:
+                    return "int", converted
+                if target == pa.int64():
+                    return "float", converted
+            # Beyond uint64 (or uint64 with gaps) pandas keeps the column as text rather than lose digits
+            return "str", column
+        
+        try:
+            converted = pc.cast(numbers, pa.float64())
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            converted = None
+        if converted is not None:
+            if self._beyond_uint64(numbers.drop_null().filter(integers)):
+                return "str", column
+            return "float", converted
+        
+        bool_values = pa.array(CSV_TRUE_VALUES + CSV_FALSE_VALUES)
+        if pc.all(pc.is_in(values, value_set=bool_values)).as_py():
+            return "bool", pc.is_in(column, value_set=pa.array(CSV_TRUE_VALUES))
+        
+        return "str", column
+    
+    def _beyond_uint64(self, integers: pa.ChunkedArray) -> bool:
+        """Whether any of these integer literals is a positive number too large for uint64"""
+        digits = pc.utf8_ltrim(pc.replace_substring_regex(integers, pattern=r"^\+", replacement=""), characters="0")
+        lengths = pc.utf8_length(digits)
+        beyond = pc.or_(
+            pc.greater(lengths, len(CSV_UINT64_MAX)),
+            pc.and_(pc.equal(lengths, len(CSV_UINT64_MAX)), pc.greater(digits, CSV_UINT64_MAX))
+        )
+        return bool(pc.any(beyond).as_py())
+    
+    def _csv_text_columns(self, table: pa.Table) -> List[pa.ChunkedArray]:
+        """Render every column as the text str(val) would give for pandas' parsed values"""
+        # One chunk per column: the rendered text is rebuilt as a single array
+        # and must line up with the validity of the original column
+        table = table.combine_chunks()
+        kinds = [self._infer_csv_kind(column) for column in table.columns]
+        
+        # df.iterrows() upcasts int cells to float when every column is numeric
+        # and there is a float column, or both int64 and uint64 ones
+        numeric_only = all(kind in ("int", "float") for kind, _ in kinds)
+        int_types = {column.type for kind, column in kinds if kind == "int"}
+        upcast = numeric_only and (
+            any(kind == "float" for kind, _ in kinds) or {pa.int64(), pa.uint64()} <= int_types
+        )
+        
+        text_columns = []
+        for kind, column in kinds:
+            valid = pc.is_valid(column)
+            if kind == "int" and not upcast:
+                text = pc.cast(column, pa.string())
+            elif kind in ("int", "float"):
+                values = pc.cast(column, pa.float64(), safe=False).to_numpy()
+                text = pa.chunked_array([pa.array(values.astype(str), type=pa.string(), mask=np.isnan(values))])
+            elif kind == "bool":
+                text = pc.if_else(column, "True", "False")
+            else:
+                text = column
+            text_columns.append(pc.if_else(valid, text, pa.scalar(None, pa.string())))
+        
+        return text_columns
+    
     def validate_csv(self, file_content: bytes) -> SurveyData:
         """Parse and validate CSV file"""
         try:
             self.logger.info("Starting CSV parsing")
             
-            # Read CSV
-            df = pd.read_csv(io.BytesIO(file_content))
-            
-            self.logger.info(f"CSV loaded: {len(df)} rows, {len(df.columns)} columns")
-            
-            # Validate headers exist
-            if df.empty or len(df.columns) == 0:
-                raise ValueError("CSV file has no headers")
-            
-            # Extract text responses (assume first column)
-            responses = []
-            for idx, row in df.iterrows():
-                # Get first non-null value from row
-                text = None
-                for val in row:
-                    if pd.notna(val):
-                        text = self.normalize_text(str(val))
-                        if text:
-                            break
+            # Read CSV (multithreaded Arrow reader)
+            with stage_timer("parse_csv"):
+                table, row_labels = self._read_csv_table(file_content)
                 
-                if text and text.lower() != "nan":
-                    responses.append(SurveyResponse(
-                        text=text,
-                        respondent_id=str(idx)
-                    ))
-            
-            if not responses:
-                raise ValueError("CSV file contains no valid response data")
-            
-            self.logger.info(f"Extracted {len(responses)} responses from CSV")
+                self.logger.info(f"CSV loaded: {table.num_rows} rows, {table.num_columns} columns")
+                
+                # Validate headers exist
+                if table.num_rows == 0 or table.num_columns == 0:
+                    raise ValueError("CSV file has no headers")
+                
+                text_columns = self._csv_text_columns(table)
             
-            return SurveyData(
-                responses=responses,
-                format="csv"
-            )
+            return self._survey_from_columns(text_columns, row_labels, "csv", "CSV")
         
         except Exception as e:
             self.logger.error(f"CSV parsing error: {str(e)}")
             raise
     
-    def validate_xlsx(self, file_content: bytes) -> SurveyData:
+    def _survey_from_columns(self, text_columns: List[pa.ChunkedArray], row_labels: Optional[List[str]],
+                             survey_format: str, label: str) -> SurveyData:
+        """SurveyData from string columns: first non-empty normalized value per row, IDs by row position"""
+        # Normalize whole columns, then take the first non-empty value per row
+        with stage_timer("normalize"):
+            columns = [self.normalize_column(column) for column in text_columns]
+            text = pc.coalesce(*columns)
+            keep = pc.fill_null(pc.not_equal(pc.utf8_lower(text), "nan"), False)
+            
+            row_ids = pa.array(np.flatnonzero(keep.to_numpy()))
+            texts = pc.filter(text, keep)
+        
+        # Columns stay in Arrow; no per-row objects are built
+        with stage_timer("build_responses"):
+            if row_labels is None:
+                respondent_ids = pc.cast(row_ids, pa.string())
+            else:
+                respondent_ids = pa.array(row_labels, type=pa.string()).take(row_ids)
+            survey_data = SurveyData(texts=texts, respondent_ids=respondent_ids, format=survey_format)
+        
+        survey_data = self.filter_responses(survey_data)
+        if not len(survey_data):
+            raise ValueError(self._no_responses_message(survey_data, label))
+        
+        self.logger.info(f"Extracted {len(survey_data)} responses from {label}")
+        RESPONSES_PARSED.inc(len(survey_data), format=survey_format)
+        
+        return survey_data
+    
+    def _iter_xlsx_responses(self, sheet, timing: Optional[Dict[str, float]] = None):
+        """Stream (text, respondent_id) from column A of a read-only sheet as rows arrive (normalize time goes into timing)"""
+        # Column A only; rows are parsed lazily and never held as a list
+        rows = sheet.iter_rows(min_row=1, max_col=1, values_only=True)
+        
+        # Skip header row
+        if next(rows, None) is None:
+            raise ValueError("Excel file is empty")
+        
+        for row_idx, row in enumerate(rows, start=2):
+            if row and row[0]:
+                start = time.perf_counter()
+                text = self.normalize_text(str(row[0]))
+                if timing is not None:
+                    timing["normalize"] += time.perf_counter() - start
+                
+                if text and text.lower() != "none" and text.lower() != "nan":
+                    yield text, f"row_{row_idx}"
+    
+    def validate_xlsx(self, file_content: FileContent) -> SurveyData:
         """Parse and validate XLSX file"""
+        workbook = None
         try:
             self.logger.info("Starting XLSX parsing")
+            start = time.perf_counter()
             
-            # Load workbook
-            workbook = openpyxl.load_workbook(io.BytesIO(file_content))
+            # Load workbook lazily (read-only mode streams the sheet XML)
+            if isinstance(file_content, (bytes, bytearray, memoryview)):
+                file_content = io.BytesIO(file_content)
+            workbook = openpyxl.load_workbook(file_content, read_only=True)
             
             # Use first sheet
             sheet = workbook.active
             self.logger.info(f"Using sheet: {sheet.title}")
             
-            # Extract all rows
-            rows = list(sheet.iter_rows(values_only=True))
-            
-            if not rows:
-                raise ValueError("Excel file is empty")
+            # Don't trust the stored dimensions; read until the sheet data ends
+            sheet.reset_dimensions()
             
             # Extract responses (skip header row)
-            responses = []
-            for row_idx, row in enumerate(rows[1:], start=2):
-                if row and row[0]:
-                    text = self.normalize_text(str(row[0]))
-                    
-                    if text and text.lower() != "none" and text.lower() != "nan":
-                        responses.append(SurveyResponse(
-                            text=text,
-                            respondent_id=f"row_{row_idx}"
-                        ))
+            timing = {"normalize": 0.0}
+            texts, respondent_ids = [], []
+            for text, respondent_id in self._iter_xlsx_responses(sheet, timing):
+                texts.append(text)
+                respondent_ids.append(respondent_id)
+            survey_data = SurveyData(texts=texts, respondent_ids=respondent_ids, format="xlsx")
+            
+            # Rows are normalized as they stream in; report the two stages apart
+            STAGE_SECONDS.observe(time.perf_counter() - start - timing["normalize"], stage="parse_xlsx")
+            STAGE_SECONDS.observe(timing["normalize"], stage="normalize")
             
-            if not responses:
-                raise ValueError("Excel file contains no valid response data")
+            survey_data = self.filter_responses(survey_data)
+            if not len(survey_data):
+                raise ValueError(self._no_responses_message(survey_data, "Excel"))
             
-            self.logger.info(f"Extracted {len(responses)} responses from XLSX")
+            self.logger.info(f"Extracted {len(survey_data)} responses from XLSX")
+            RESPONSES_PARSED.inc(len(survey_data), format="xlsx")
             
-            return SurveyData(responses=responses, format="xlsx")
+            return survey_data
         
         except Exception as e:
             self.logger.error(f"XLSX parsing error: {str(e)}")
             raise
+        
+        finally:
+            # Read-only workbooks keep the archive open until closed
+            if workbook is not None:
+                workbook.close()
     
-    def validate_file(self, filename: str, file_content: bytes) -> SurveyData:
-        """Auto-detect and validate file format"""
+    def _response_field(self, schema: pa.Schema) -> int:
+        """Index of the column holding responses in a typed (Parquet/Arrow/NDJSON) file"""
+        name = settings.survey_response_column
+        if name:
+            index = schema.get_field_index(name)
+            if index < 0:
+                raise ValueError(f"Response column '{name}' not found in file")
+            return index
+        
+        # Otherwise the first text column, preferring one named like "response"
+        text_fields = [
+            index for index, field in enumerate(schema)
+            if pa.types.is_string(field.type) or pa.types.is_large_string(field.type)
+            or (pa.types.is_dictionary(field.type) and pa.types.is_string(field.type.value_type))
+        ]
+        if not text_fields:
+            raise ValueError("File has no text column to read responses from")
+        named = [index for index in text_fields if "response" in schema.field(index).name.lower()]
+        return (named or text_fields)[0]
+    
+    def _text_column(self, column: pa.ChunkedArray) -> pa.ChunkedArray:
+        """Response column as plain strings (decodes dictionaries, renders numbers)"""
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        try:
+            return column.cast(pa.string())
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            raise ValueError(f"Response column of type {column.type} cannot be read as text")
+    
+    def validate_parquet(self, file_content: bytes) -> SurveyData:
+        """Parse and validate Parquet file (only the response column is decoded)"""
+        try:
+            self.logger.info("Starting Parquet parsing")
+            
+            with stage_timer("parse_parquet"):
+                try:
+                    parquet_file = pq.ParquetFile(pa.BufferReader(pa.py_buffer(file_content)))
+                    schema = parquet_file.schema_arrow
+                    name = schema.field(self._response_field(schema)).name
+                    column = parquet_file.read(columns=[name]).column(0)
+                except pa.ArrowInvalid as e:
+                    raise ValueError(f"Invalid Parquet file: {str(e)}")
+                
+                self.logger.info(f"Parquet loaded: {len(column)} rows, response column '{name}'")
+                text_column = self._text_column(column)
+            
+            return self._survey_from_columns([text_column], None, "parquet", "Parquet")
+        
+        except Exception as e:
+            self.logger.error(f"Parquet parsing error: {str(e)}")
+            raise
+    
+    def _read_ipc_column(self, buffer: pa.Buffer) -> Tuple[pa.ChunkedArray, str]:
+        """Response column of an Arrow IPC file (Feather v2) or stream, without reading other columns"""
+        try:
+            open_ipc, schema = paipc.open_file, paipc.open_file(buffer).schema
+        except pa.ArrowInvalid:
+            # No file footer: IPC stream format
+            open_ipc, schema = paipc.open_stream, paipc.open_stream(buffer).schema
+        
+        index = self._response_field(schema)
+        options = paipc.IpcReadOptions(included_fields=[index])
+        return open_ipc(buffer, options=options).read_all().column(0), schema.field(index).name
+    
+    def validate_arrow(self, file_content: bytes) -> SurveyData:
+        """Parse and validate Arrow IPC / Feather file (zero-copy for uncompressed files)"""
+        try:
+            self.logger.info("Starting Arrow parsing")
+            
+            with stage_timer("parse_arrow"):
+                try:
+                    column, name = self._read_ipc_column(pa.py_buffer(file_content))
+                except pa.ArrowInvalid as e:
+                    raise ValueError(f"Invalid Arrow file: {str(e)}")
+                
+                self.logger.info(f"Arrow loaded: {len(column)} rows, response column '{name}'")
+                text_column = self._text_column(column)
+            
+            return self._survey_from_columns([text_column], None, "arrow", "Arrow")
+        
+        except Exception as e:
+            self.logger.error(f"Arrow parsing error: {str(e)}")
+            raise
+    
+    def validate_ndjson(self, file_content: bytes) -> SurveyData:
+        """Parse and validate NDJSON file, streaming record batches and keeping only the response column"""
+        try:
+            self.logger.info("Starting NDJSON parsing")
+            
+            with stage_timer("parse_ndjson"):
+                try:
+                    # Types are inferred from the first block; other fields are dropped batch by batch
+                    with pajson.open_json(pa.BufferReader(pa.py_buffer(file_content))) as reader:
+                        index = self._response_field(reader.schema)
+                        field = reader.schema.field(index)
+                        column = pa.chunked_array([batch.column(index) for batch in reader], type=field.type)
+                except pa.ArrowInvalid as e:
+                    raise ValueError(f"Invalid NDJSON file: {str(e)}")
+                
+                self.logger.info(f"NDJSON loaded: {len(column)} rows, response column '{field.name}'")
+                text_column = self._text_column(column)
+            
+            return self._survey_from_columns([text_column], None, "ndjson", "NDJSON")
+        
+        except Exception as e:
+            self.logger.error(f"NDJSON parsing error: {str(e)}")
+            raise
+    
+    def _content_size(self, file_content: FileContent) -> int:
+        """Size of the upload in bytes without reading it"""
+        if isinstance(file_content, (bytes, bytearray, memoryview)):
+            return len(file_content)
+        
+        file_content.seek(0, io.SEEK_END)
+        size = file_content.tell()
+        file_content.seek(0)
+        return size
+    
+    @contextmanager
+    def _content_buffer(self, file_content: FileContent) -> Iterator[Union[bytes, memoryview, mmap.mmap]]:
+        """Buffer view of the upload for the Arrow readers (memory-maps large files)"""
+        if isinstance(file_content, (bytes, bytearray, memoryview)):
+            yield file_content
+            return
+        
+        # Small uploads are read; Starlette keeps them in memory anyway, and
+        # fileno() would make a spooled file write them to disk first
+        if self._content_size(file_content) < MMAP_MIN_BYTES:
+            yield file_content.read()
+            return
+        
+        try:
+            fileno = file_content.fileno()
+            file_content.flush()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            yield file_content.read()
+            return
+        with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
+    
+    def _hash_column(self, digest, column: pa.Array):
+        """Feed a large_string column's offsets and bytes into digest (slice-independent)"""
+        _, offsets_buffer, data_buffer = column.buffers()
+        offsets = np.frombuffer(offsets_buffer, dtype=np.int64)[column.offset:column.offset + len(column) + 1]
+        digest.update((offsets - offsets[0]).tobytes())
+        if data_buffer is not None:
+            digest.update(memoryview(data_buffer)[int(offsets[0]):int(offsets[-1])])
+    
+    def content_hash(self, survey_data: SurveyData) -> str:
+        """Stable hash of the parsed survey content (format, ids and texts)"""
+        digest = hashlib.sha256(survey_data.format.encode("utf-8"))
+        digest.update(b"\x1e")
+        self._hash_column(digest, survey_data.respondent_ids)
+        digest.update(b"\x1f")
+        self._hash_column(digest, survey_data.texts)
+        return digest.hexdigest()
+    
+    def check_upload(self, filename: str, file_content: FileContent) -> Tuple[str, int]:
+        """Format, size and emptiness checks that need no parsing; returns (extension, size)"""
         # Validate format
         ext = self.validate_file_format(filename)
         
         # Validate size
-        if len(file_content) > self.MAX_FILE_SIZE_BYTES:
+        size = self._content_size(file_content)
+        if size > self.MAX_FILE_SIZE_BYTES:
             raise ValueError(f"File exceeds {self.MAX_FILE_SIZE_BYTES / (1024*1024):.0f}MB limit")
         
         # Validate not empty
-        if not file_content or len(file_content) == 0:
+        if size == 0:
             raise ValueError("File is empty")
         
-        # Parse based on format
-        if ext == ".csv":
-            return self.validate_csv(file_content)
-        else:  # .xlsx
+        return ext, size
+    
+    def validate_file(self, filename: str, file_content: FileContent) -> SurveyData:
+        """Auto-detect and validate file format"""
+        ext, _ = self.check_upload(filename, file_content)
+        
+        if ext == ".xlsx":
             return self.validate_xlsx(file_content)
-
+        
+        # Parse based on format
+        parsers = {
+            ".csv": self.validate_csv,
+            ".parquet": self.validate_parquet,
+            ".arrow": self.validate_arrow,
+            ".feather": self.validate_arrow,
+            ".ndjson": self.validate_ndjson,
+        }
+        with self._content_buffer(file_content) as buffer:
+            return parsers[ext](buffer)
 
 # Create singleton instance
 validator = FileValidator()
@@ -1,27 +1,112 @@
 import logging
 import json
 import asyncio
-import google.generativeai as genai
-from typing import Optional
+import time
+from contextlib import contextmanager
+import pyarrow as pa
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import ValidationError
 from app.models import (
     PlayerPersona, Demographics, Motivations, PainPoints, SpendingHabits
 )
 from app.config import settings
+from app.services.persona_cache import persona_cache
+from app.services.rate_limiter import llm_limiter
+from app.services.llm_resilience import llm_resilience, RETRYABLE_ERRORS, LLMDeadlineError
+from app.services.circuit_breaker import llm_breaker, CircuitOpenError
+from app.services.heuristic_persona import heuristic_personas
+from app.services.llm_backend import create_backend
+from app.services.response_dedup import weighted_lines
+from app.services.prompt_budget import prompt_budget
+from app.services.persona_stream import PersonaStreamParser, PERSONA_SECTIONS
+from app.services.metrics import stage_timer, STAGE_SECONDS, PROMPT_CHARS, LLM_CALLS
+from app.services.token_estimator import estimate_tokens
+from app.services.text_vectors import TextColumn
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the analysis prompt changes so cached personas are not reused
+PROMPT_VERSION = "persona-v2"
+
+# Persona JSON structure, shared by every prompt that returns a persona
+PERSONA_JSON_SCHEMA = """{
+  "archetype_name": "A memorable persona name (e.g., 'The Curious Adventurer')",
+  "demographics": {
+    "age_range": "e.g., '24-32'",
+    "gaming_frequency": "e.g., '30+ hours per week'",
+    "preferred_genres": ["list", "of", "genres"],
+    "primary_platform": "e.g., 'PC'"
+  },
+  "motivations": {
+    "primary_driver": "Main reason they play",
+    "engagement_factors": ["what", "keeps", "them", "engaged"],
+    "psychological_profile": "Description of psychological drivers"
+  },
+  "pain_points": {
+    "frustrations": ["what", "frustrates", "them"],
+    "what_they_hate": "Main dislike or pain point"
+  },
+  "spending_habits": {
+    "in_game_purchase_likelihood": "e.g., 'Moderate - would pay for story DLC'",
+    "monetization_preference": "e.g., 'Battle Pass or Story DLC'",
+    "price_sensitivity": "e.g., 'Willing to pay 20+ for significant content'"
+  }
+}"""
+
+# Output contract shared by the single-pass and map-reduce prompts
+PERSONA_JSON_INSTRUCTIONS = f"""Generate a comprehensive player persona with these EXACT JSON structure (no markdown, pure JSON):
+
+{PERSONA_JSON_SCHEMA}
+
+IMPORTANT:
+- Return ONLY valid JSON, no markdown or extra text
+- Base all information on the actual survey responses
+- A response ending in "(xN)" was given by N respondents; weigh it accordingly
+- Be specific and actionable in descriptions
+- Focus on game player psychology, not generic personas
+- All fields must be populated based on the survey data
+"""
+
+# Gemini is down, overloaded or too slow (after retries); answered with a heuristic persona when enabled
+FALLBACK_ERRORS = (CircuitOpenError, LLMDeadlineError) + RETRYABLE_ERRORS
+
+# Models for the streamed persona sections (archetype_name is a plain string)
+SECTION_MODELS = {
+    "demographics": Demographics,
+    "motivations": Motivations,
+    "pain_points": PainPoints,
+    "spending_habits": SpendingHabits,
+}
+
 class GeminiAnalyzer:
     """Analyze survey data using Gemini API"""
     
     def __init__(self):
         try:
-            genai.configure(api_key=settings.gemini_api_key)
-            # Use gemini-2.5-flash (free tier compatible)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
             self.logger = logger
-            self.logger.info("Gemini API initialized successfully (gemini-2.5-flash)")
+            # Gemini by default (gemini-2.5-flash, free tier compatible); its client is created on first call
+            self.backend = create_backend()
+            self.model_name = self.backend.model_name
+            
+            # Deterministic mode pins temperature to 0 so cached personas stay valid
+            self.deterministic = settings.gemini_deterministic
+            self.generation_settings = {
+                "temperature": 0.0 if self.deterministic else settings.gemini_temperature,
+                "max_output_tokens": settings.gemini_max_output_tokens,
+            }
+            self.cache_version = json.dumps(
+                {
+                    "prompt": PROMPT_VERSION,
+                    "model": self.model_name,
+                    "map_reduce_chunk_tokens": settings.map_reduce_chunk_tokens if settings.map_reduce_enabled else None,
+                    "input_token_budget": settings.prompt_input_token_budget,
+                    **self.generation_settings,
+                },
+                sort_keys=True
+            )
+            self.logger.info(f"LLM backend initialized successfully ({self.backend.name}, {self.model_name})")
         except Exception as e:
-            self.logger.error(f"Failed to initialize Gemini: {str(e)}")
+            self.logger.error(f"Failed to initialize LLM backend: {str(e)}")
             raise
     
     def create_analysis_prompt(self, survey_responses: list) -> str:
@@ -36,42 +121,265 @@ Analyze the following player survey responses and create a detailed player perso
 SURVEY RESPONSES:
 {responses_text}
 
-Generate a comprehensive player persona with these EXACT JSON structure (no markdown, pure JSON):
+{PERSONA_JSON_INSTRUCTIONS}"""
+        return prompt
+    
+    def chunk_responses(self, survey_responses: list, token_budget: int) -> List[list]:
+        """Split responses into consecutive chunks of at most token_budget estimated tokens"""
+        chunks = []
+        current = []
+        current_tokens = 0
+        
+        for resp in survey_responses:
+            # "- {resp}\n" per response line
+            tokens = estimate_tokens(str(resp)) + 1
+            if current and current_tokens + tokens > token_budget:
+                chunks.append(current)
+                current = []
+                current_tokens = 0
+            current.append(resp)
+            current_tokens += tokens
+        
+        if current:
+            chunks.append(current)
+        
+        return chunks
+    
+    def should_map_reduce(self, survey_responses: list) -> bool:
+        """Whether the survey is too large for a single analysis prompt"""
+        if not settings.map_reduce_enabled:
+            return False
+        
+        total_tokens = int(prompt_budget.line_tokens(survey_responses).sum())
+        return total_tokens > settings.map_reduce_chunk_tokens
+    
+    def create_map_prompt(self, chunk: list, part: int, total_parts: int) -> str:
+        """Create a prompt that summarizes one chunk of a large survey"""
+        
+        responses_text = "\n".join([f"- {resp}" for resp in chunk])
+        
+        prompt = f"""You are an expert game design analyst specializing in player psychology and experience design.
 
-{{
-  "archetype_name": "A memorable persona name (e.g., 'The Curious Adventurer')",
-  "demographics": {{
-    "age_range": "e.g., '24-32'",
-    "gaming_frequency": "e.g., '30+ hours per week'",
-    "preferred_genres": ["list", "of", "genres"],
-    "primary_platform": "e.g., 'PC'"
-  }},
-  "motivations": {{
-    "primary_driver": "Main reason they play",
-    "engagement_factors": ["what", "keeps", "them", "engaged"],
-    "psychological_profile": "Description of psychological drivers"
-  }},
-  "pain_points": {{
-    "frustrations": ["what", "frustrates", "them"],
-    "what_they_hate": "Main dislike or pain point"
-  }},
-  "spending_habits": {{
-    "in_game_purchase_likelihood": "e.g., 'Moderate - would pay for story DLC'",
-    "monetization_preference": "e.g., 'Battle Pass or Story DLC'",
-    "price_sensitivity": "e.g., 'Willing to pay 20+ for significant content'"
-  }}
-}}
+The following player survey responses are part {part} of {total_parts} of a larger survey. Summarize what they reveal about the players; your summary will be merged with the other parts into one player persona.
 
-IMPORTANT:
-- Return ONLY valid JSON, no markdown or extra text
-- Base all information on the actual survey responses
-- Be specific and actionable in descriptions
-- Focus on game player psychology, not generic personas
-- All fields must be populated based on the survey data
+SURVEY RESPONSES:
+{responses_text}
+
+Write a concise plain-text summary (no JSON, no markdown headings) covering:
+- Demographics: age cues, how often they play, preferred genres, platforms
+- Motivations: why they play and what keeps them engaged
+- Pain points: recurring frustrations and dislikes
+- Spending habits: willingness to pay, preferred monetization, price sensitivity
+
+A response ending in "(xN)" was given by N respondents. For each theme say how common it is in this part (e.g. "most", "several", "a few"). Only report what the responses actually say.
 """
         return prompt
     
-    async def analyze_survey(self, survey_responses: list, game_title: Optional[str] = None) -> PlayerPersona:
+    def create_reduce_prompt(self, summaries: List[str], chunk_sizes: List[int]) -> str:
+        """Create a prompt that merges chunk summaries into one persona"""
+        
+        summaries_text = self._format_summaries(summaries, chunk_sizes)
+        
+        prompt = f"""You are an expert game design analyst specializing in player psychology and experience design.
+
+A large player survey of {sum(chunk_sizes)} responses was split into {len(summaries)} parts and each part was summarized. Combine the partial summaries below into ONE detailed player persona, weighting themes by how common they are across all parts.
+
+PARTIAL SUMMARIES:
+{summaries_text}
+
+{PERSONA_JSON_INSTRUCTIONS}"""
+        return prompt
+    
+    def create_update_prompt(self, persona: PlayerPersona, summary: str, previous_count: int,
+                             new_count: int, new_material: str) -> str:
+        """Create a prompt that updates an existing persona with newly added responses"""
+        
+        persona_json = json.dumps(persona.dict(exclude={"degraded"}), indent=2)
+        summary_text = summary or "(none yet; start it from the current persona)"
+        
+        prompt = f"""You are an expert game design analyst specializing in player psychology and experience design.
+
+A player persona was built from {previous_count} survey responses. Since then {new_count} new responses were added to the survey. Update the persona so it describes all {previous_count + new_count} respondents: keep what the new responses don't contradict, and shift emphasis only in proportion to how many respondents the new themes come from.
+
+CURRENT PERSONA:
+{persona_json}
+
+RUNNING SUMMARY OF THE RESPONSES SO FAR:
+{summary_text}
+
+{new_material}
+
+Return ONLY valid JSON (no markdown or extra text) of the form {{"persona": <updated persona>, "summary": "<updated running summary>"}}.
+
+The summary is your compact plain-text record of the themes across ALL {previous_count + new_count} responses and how common each is (e.g. "most", "several", "a few"). Fold the new responses into it and keep it under {settings.incremental_summary_words} words.
+
+The persona must use this EXACT structure:
+
+{PERSONA_JSON_SCHEMA}
+
+A response ending in "(xN)" was given by N respondents; weigh it accordingly. All persona fields must be populated.
+"""
+        return prompt
+    
+    def _format_summaries(self, summaries: List[str], chunk_sizes: List[int]) -> str:
+        return "\n\n".join([
+            f"### Part {idx} ({size} responses)\n{summary}"
+            for idx, (summary, size) in enumerate(zip(summaries, chunk_sizes), start=1)
+        ])
+    
+    def _prepare_call(self, prompt: str, max_output_tokens: Optional[int], usage: Optional[Dict],
+                      kind: str) -> Tuple[Dict, int]:
+        """Generation settings for one call and its estimated token cost (tallied into usage)"""
+        generation_settings = dict(self.generation_settings)
+        if max_output_tokens:
+            generation_settings["max_output_tokens"] = max_output_tokens
+        
+        input_tokens = estimate_tokens(prompt)
+        PROMPT_CHARS.inc(len(prompt), kind=kind)
+        if usage is not None:
+            usage["llm_calls"] += 1
+            usage["prompt_chars"] += len(prompt)
+            usage["input_tokens_estimated"] += input_tokens
+            usage["max_output_tokens"] += generation_settings["max_output_tokens"]
+        
+        return generation_settings, input_tokens + generation_settings["max_output_tokens"]
+    
+    async def _generate(self, prompt: str, max_output_tokens: Optional[int] = None,
+                        usage: Optional[Dict] = None, kind: str = "persona") -> str:
+        """Run one Gemini call (retried/hedged) and return the raw response text (tallying prompt size into usage)"""
+        attempts = 0
+        
+        async def attempt() -> str:
+            nonlocal attempts
+            attempts += 1
+            if attempts > 1:
+                # Retries and hedges resend the prompt; count them into usage and cost
+                self._prepare_call(prompt, max_output_tokens, usage, kind)
+            
+            # Only the provider call itself counts towards the circuit breaker
+            with llm_breaker.guard():
+                with self._track_call(kind):
+                    response_text = await self.backend.generate(prompt, generation_settings)
+            return response_text.strip()
+        
+        # Rejected at once while Gemini keeps failing, before queueing for the limiter
+        llm_breaker.check()
+        generation_settings, estimated_tokens = self._prepare_call(prompt, max_output_tokens, usage, kind)
+        # Each attempt waits for a concurrency slot and RPM/TPM budget first
+        return await llm_resilience.call(attempt, kind, admit=lambda: llm_limiter.acquire(estimated_tokens))
+    
+    async def _generate_stream(self, prompt: str, usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Run one streaming Gemini call, yielding text as it is generated"""
+        llm_breaker.check()
+        generation_settings, estimated_tokens = self._prepare_call(prompt, None, usage, "stream")
+        
+        # The concurrency slot is held until the stream is fully read
+        async with llm_limiter.acquire(estimated_tokens):
+            with llm_breaker.guard(), self._track_call("stream"):
+                start = time.perf_counter()
+                first_chunk = True
+                async for text in self.backend.stream(prompt, generation_settings):
+                    if first_chunk:
+                        STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm_first_chunk")
+                        first_chunk = False
+                    yield text
+    
+    @contextmanager
+    def _track_call(self, kind: str):
+        """Time one LLM call and count its outcome"""
+        outcome = "error"
+        try:
+            with stage_timer("llm_call"):
+                yield
+            outcome = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            LLM_CALLS.inc(kind=kind, outcome=outcome)
+    
+    async def _summarize_chunks(self, survey_responses: list, weights: List[int], usage: Optional[Dict] = None) -> str:
+        """Map phase: summarize token-budgeted chunks concurrently and return the reduce prompt"""
+        summaries, chunk_sizes = await self._map_chunks(survey_responses, weights, usage)
+        with stage_timer("prompt_build"):
+            return self.create_reduce_prompt(summaries, chunk_sizes)
+    
+    async def _map_chunks(self, survey_responses: list, weights: List[int],
+                          usage: Optional[Dict] = None) -> Tuple[List[str], List[int]]:
+        """Summaries of token-budgeted chunks (run concurrently) and the respondents in each"""
+        chunks = self.chunk_responses(survey_responses, settings.map_reduce_chunk_tokens)
+        self.logger.info(
+            f"Map-reduce analysis: {len(survey_responses)} responses in {len(chunks)} chunks "
+            f"(concurrency {settings.map_reduce_concurrency})"
+        )
+        
+        semaphore = asyncio.Semaphore(settings.map_reduce_concurrency)
+        
+        async def summarize(part: int, chunk: list) -> str:
+            async with semaphore:
+                with stage_timer("prompt_build"):
+                    prompt = self.create_map_prompt(chunk, part, len(chunks))
+                summary = await self._generate(
+                    prompt,
+                    max_output_tokens=settings.map_reduce_summary_tokens,
+                    usage=usage,
+                    kind="map"
+                )
+                self.logger.info(f"Chunk {part}/{len(chunks)} summarized")
+                return summary
+        
+        tasks = [
+            asyncio.ensure_future(summarize(part, chunk))
+            for part, chunk in enumerate(chunks, start=1)
+        ]
+        try:
+            summaries = await asyncio.gather(*tasks)
+        except BaseException:
+            # One failed chunk fails the analysis; don't leave the rest running
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        # Part sizes count respondents, not collapsed lines
+        chunk_sizes, start = [], 0
+        for chunk in chunks:
+            chunk_sizes.append(sum(weights[start:start + len(chunk)]))
+            start += len(chunk)
+        return summaries, chunk_sizes
+    
+    def _parse_persona(self, response_text: str) -> PlayerPersona:
+        """Parse Gemini's JSON output into a validated PlayerPersona"""
+        return self._build_persona(self._load_json(response_text))
+    
+    def _load_json(self, response_text: str) -> Dict:
+        """Gemini's JSON output as a dict (markdown code fences removed)"""
+        # Remove markdown code blocks if present
+        if response_text.startswith("```"):
+            response_text = response_text.split("```")[1]
+            if response_text.startswith("json"):
+                response_text = response_text[4:]
+        response_text = response_text.strip()
+        
+        self.logger.info(f"Gemini response received, parsing JSON")
+        
+        # Parse JSON
+        with stage_timer("json_parse"):
+            return json.loads(response_text)
+    
+    def _build_persona(self, persona_data: Dict) -> PlayerPersona:
+        """Validated PlayerPersona from parsed persona JSON"""
+        # Validate and create PersonaResponse model
+        with stage_timer("model_validation"):
+            return PlayerPersona(
+                archetype_name=persona_data["archetype_name"],
+                demographics=Demographics(**persona_data["demographics"]),
+                motivations=Motivations(**persona_data["motivations"]),
+                pain_points=PainPoints(**persona_data["pain_points"]),
+                spending_habits=SpendingHabits(**persona_data["spending_habits"])
+            )
+    
+    async def analyze_survey(self, survey_responses: list, game_title: Optional[str] = None,
+                             weights: Optional[List[int]] = None) -> PlayerPersona:
         """
         Analyze survey responses and generate player persona
         
@@ -82,52 +390,130 @@ IMPORTANT:
         Returns:
             PlayerPersona object with analysis results
         """
+        persona, _ = await self.analyze_survey_with_metadata(survey_responses, game_title, weights=weights)
+        return persona
+    
+    async def analyze_survey_with_metadata(self, survey_responses: TextColumn, game_title: Optional[str] = None,
+                                           respondent_ids: Optional[List[str]] = None,
+                                           token_budget: Optional[int] = None,
+                                           weights: Optional[List[int]] = None) -> Tuple[PlayerPersona, Dict]:
+        """
+        Analyze survey responses and report how the prompt was built
+        
+        Args:
+            survey_responses: Survey response texts, as a list or an Arrow
+                string column (e.g. SurveyData.texts)
+            game_title: Optional game title for context
+            respondent_ids: Optional IDs aligned with survey_responses, used
+                to report which respondents a sampled prompt included
+            token_budget: Input token budget for this analysis (defaults to
+                prompt_input_token_budget)
+            weights: Optional respondents behind each response (from
+                ResponseDeduplicator.collapse; 1 each by default)
+            
+        Returns:
+            (PlayerPersona, metadata) where metadata has the sampling report
+            (which responses were included) and the prompt size and
+            estimated cost across all Gemini calls
+        """
         try:
             self.logger.info(f"Starting analysis of {len(survey_responses)} responses")
             
-            # Create prompt
-            prompt = self.create_analysis_prompt(survey_responses)
+            usage = self._new_usage()
             
-            # Call Gemini API
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.7,
-                        max_output_tokens=2048,
-                    )
-                )
+            # Reuse a cached persona for identical surveys (deterministic mode only)
+            cache_key, cached = await self._cache_lookup(survey_responses, usage, token_budget, weights)
+            if cached is not None:
+                return cached, self._metadata(usage, None)
+            
+            # Keep input within the token budget (stratified sample of large surveys)
+            prompt_responses, prompt_weights, sampling = self._fit_budget(
+                survey_responses, respondent_ids, token_budget, weights
             )
             
-            # Extract JSON from response
-            response_text = response.text.strip()
+            # Large surveys are summarized in parallel chunks first, then merged
+            try:
+                prompt = await self._final_prompt(prompt_responses, prompt_weights, usage)
+                response_text = await self._generate(prompt, usage=usage)
+            except FALLBACK_ERRORS as e:
+                if not settings.heuristic_fallback_enabled:
+                    raise
+                # Degraded personas are never cached, so Gemini gets the survey once it recovers
+                return self._fallback(survey_responses, weights, usage, sampling, e)
             
-            # Remove markdown code blocks if present
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            response_text = response_text.strip()
+            persona = self._parse_persona(response_text)
             
-            self.logger.info(f"Gemini response received, parsing JSON")
+            self.logger.info(f"✓ Persona generated successfully: {persona.archetype_name}")
             
-            # Parse JSON
-            persona_data = json.loads(response_text)
+            if cache_key is not None:
+                await persona_cache.set(cache_key, persona)
             
-            # Validate and create PersonaResponse model
-            persona = PlayerPersona(
-                archetype_name=persona_data["archetype_name"],
-                demographics=Demographics(**persona_data["demographics"]),
-                motivations=Motivations(**persona_data["motivations"]),
-                pain_points=PainPoints(**persona_data["pain_points"]),
-                spending_habits=SpendingHabits(**persona_data["spending_habits"])
+            return persona, self._metadata(usage, sampling)
+        
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Failed to parse Gemini JSON response: {str(e)}")
+            raise ValueError(f"Failed to parse API response as JSON")
+        
+        except Exception as e:
+            self.logger.error(f"Gemini analysis error: {str(e)}")
+            raise
+    
+    async def stream_survey(self, survey_responses: TextColumn, respondent_ids: Optional[List[str]] = None,
+                            weights: Optional[List[int]] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Analyze survey responses, yielding persona sections as they are generated
+        
+        Yields ("section", {"name", "value"}) for each completed top-level
+        persona field, then ("persona", {"persona", "metadata"}) with the
+        validated PlayerPersona. Map-reduce summaries run first; only the
+        final persona call is streamed.
+        """
+        try:
+            self.logger.info(f"Starting streamed analysis of {len(survey_responses)} responses")
+            
+            usage = self._new_usage()
+            
+            cache_key, cached = await self._cache_lookup(survey_responses, usage, weights=weights)
+            if cached is not None:
+                persona_data = cached.dict()
+                for name in PERSONA_SECTIONS:
+                    yield "section", {"name": name, "value": persona_data[name]}
+                yield "persona", {"persona": persona_data, "metadata": self._metadata(usage, None)}
+                return
+            
+            prompt_responses, prompt_weights, sampling = self._fit_budget(
+                survey_responses, respondent_ids, weights=weights
             )
             
-            self.logger.info(f"✓ Persona generated successfully: {persona.archetype_name}")
+            parser = PersonaStreamParser()
+            streamed = False
+            try:
+                prompt = await self._final_prompt(prompt_responses, prompt_weights, usage)
+                async for text in self._generate_stream(prompt, usage=usage):
+                    for name, value in parser.feed(text):
+                        section = self._validate_section(name, value)
+                        if section is not None:
+                            streamed = True
+                            yield "section", {"name": name, "value": section}
+            except FALLBACK_ERRORS as e:
+                # Sections already sent can't be taken back; only fall back before the first one
+                if streamed or not settings.heuristic_fallback_enabled:
+                    raise
+                persona, metadata = self._fallback(survey_responses, weights, usage, sampling, e)
+                persona_data = persona.dict()
+                for name in PERSONA_SECTIONS:
+                    yield "section", {"name": name, "value": persona_data[name]}
+                yield "persona", {"persona": persona_data, "metadata": metadata}
+                return
+            
+            persona = self._parse_persona(parser.text.strip())
+            
+            self.logger.info(f"✓ Streamed persona generated successfully: {persona.archetype_name}")
             
-            return persona
+            if cache_key is not None:
+                await persona_cache.set(cache_key, persona)
+            
+            yield "persona", {"persona": persona.dict(), "metadata": self._metadata(usage, sampling)}
         
         except json.JSONDecodeError as e:
             self.logger.error(f"Failed to parse Gemini JSON response: {str(e)}")
@@ -136,7 +522,156 @@ IMPORTANT:
         except Exception as e:
             self.logger.error(f"Gemini analysis error: {str(e)}")
             raise
-
+    
+    async def update_persona_with_metadata(self, persona: PlayerPersona, summary: str, previous_count: int,
+                                           new_responses: TextColumn, new_count: int,
+                                           respondent_ids: Optional[List[str]] = None,
+                                           weights: Optional[List[int]] = None) -> Tuple[PlayerPersona, str, Dict]:
+        """
+        Update a persona with responses added since it was generated
+        
+        Only the new responses are sent, together with the current persona
+        and the running summary, so the prompt grows with the delta rather
+        than the survey. A delta too large for one prompt is sampled down
+        to the budget and, past the map-reduce threshold, summarized in
+        chunks first.
+        
+        Args:
+            persona: Persona covering the previous_count earlier responses
+            summary: Running summary returned by the previous update ("" at first)
+            previous_count: Respondents the persona already covers
+            new_responses: New response texts (list or Arrow string column)
+            new_count: Respondents behind new_responses (before dedup)
+            respondent_ids: Optional IDs aligned with new_responses
+            weights: Optional respondents behind each new response
+            
+        Returns:
+            (updated persona, updated running summary, metadata)
+        """
+        try:
+            self.logger.info(f"Updating persona with {new_count} new responses (had {previous_count})")
+            
+            usage = self._new_usage()
+            prompt_responses, prompt_weights, sampling = self._fit_budget(new_responses, respondent_ids, weights=weights)
+            
+            if self.should_map_reduce(prompt_responses):
+                usage["map_reduce"] = True
+                summaries, chunk_sizes = await self._map_chunks(prompt_responses, prompt_weights, usage)
+                new_material = f"PARTIAL SUMMARIES OF THE NEW RESPONSES:\n{self._format_summaries(summaries, chunk_sizes)}"
+            else:
+                responses_text = "\n".join([f"- {resp}" for resp in prompt_responses])
+                new_material = f"NEW SURVEY RESPONSES:\n{responses_text}"
+            
+            with stage_timer("prompt_build"):
+                prompt = self.create_update_prompt(persona, summary, previous_count, new_count, new_material)
+            
+            # Room for the running summary next to the persona
+            max_output_tokens = self.generation_settings["max_output_tokens"] + 2 * settings.incremental_summary_words
+            response_text = await self._generate(prompt, max_output_tokens=max_output_tokens, usage=usage, kind="update")
+            
+            data = self._load_json(response_text)
+            updated = self._build_persona(data["persona"])
+            
+            self.logger.info(f"✓ Persona updated: {updated.archetype_name}")
+            
+            return updated, str(data.get("summary") or "").strip(), self._metadata(usage, sampling)
+        
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Failed to parse Gemini JSON response: {str(e)}")
+            raise ValueError(f"Failed to parse API response as JSON")
+        
+        except (KeyError, TypeError) as e:
+            self.logger.error(f"Malformed persona update: {str(e)}")
+            raise ValueError(f"API response is missing the updated persona")
+        
+        except Exception as e:
+            self.logger.error(f"Gemini update error: {str(e)}")
+            raise
+    
+    def _fallback(self, survey_responses: TextColumn, weights: Optional[List[int]], usage: Dict,
+                  sampling: Optional[Dict], error: Exception) -> Tuple[PlayerPersona, Dict]:
+        """Heuristic persona and metadata for when Gemini is unavailable"""
+        reason = "circuit_open" if isinstance(error, CircuitOpenError) else "llm_unavailable"
+        self.logger.warning(f"Gemini unavailable ({type(error).__name__}), answering with a heuristic persona")
+        persona = heuristic_personas.build(survey_responses, weights)
+        metadata = self._metadata(usage, sampling)
+        metadata["degraded"] = {"reason": reason, "error": f"{type(error).__name__}: {str(error)}"}
+        return persona, metadata
+    
+    def _new_usage(self) -> Dict:
+        return {
+            "cache_hit": False,
+            "map_reduce": False,
+            "llm_calls": 0,
+            "prompt_chars": 0,
+            "input_tokens_estimated": 0,
+            "max_output_tokens": 0,
+        }
+    
+    async def _cache_lookup(self, survey_responses: TextColumn, usage: Dict, token_budget: Optional[int] = None,
+                            weights: Optional[List[int]] = None) -> Tuple[Optional[str], Optional[PlayerPersona]]:
+        """(cache key, cached persona); the key is None when caching is off"""
+        if not (persona_cache.enabled and self.deterministic):
+            return None, None
+        
+        # A different budget samples a different prompt
+        version = self.cache_version if token_budget is None else f"{self.cache_version}|budget={token_budget}"
+        # Normalizing and hashing a large survey takes a while; keep it off the event loop
+        cache_key = await asyncio.to_thread(persona_cache.make_key, survey_responses, version, weights)
+        cached = await persona_cache.get(cache_key)
+        if cached is not None:
+            self.logger.info(f"✓ Persona cache hit: {cached.archetype_name}")
+            usage["cache_hit"] = True
+        return cache_key, cached
+    
+    def _fit_budget(self, survey_responses: TextColumn, respondent_ids: Optional[List[str]],
+                    token_budget: Optional[int] = None,
+                    weights: Optional[List[int]] = None) -> Tuple[list, List[int], Dict]:
+        """
+        Prompt lines that fit the budget (as Python strings, weights shown
+        as "(xN)"), the weight of each, and the sampling report
+        """
+        weights = [1] * len(survey_responses) if weights is None else list(weights)
+        with stage_timer("sampling"):
+            lines = weighted_lines(survey_responses, weights)
+            included, sampling = prompt_budget.fit(lines, token_budget, weights)
+        
+        # Only the lines that reach the prompt are turned into strings
+        if not sampling["applied"]:
+            return lines.to_pylist(), weights, sampling
+        
+        if respondent_ids is not None:
+            del sampling["included_indices"]
+            sampling["included_respondent_ids"] = [respondent_ids[idx] for idx in included]
+        return lines.take(pa.array(included, type=pa.int64())).to_pylist(), [weights[idx] for idx in included], sampling
+    
+    async def _final_prompt(self, survey_responses: list, weights: List[int], usage: Dict) -> str:
+        """The persona prompt: direct, or the reduce prompt after summarizing chunks"""
+        if self.should_map_reduce(survey_responses):
+            usage["map_reduce"] = True
+            return await self._summarize_chunks(survey_responses, weights, usage)
+        with stage_timer("prompt_build"):
+            return self.create_analysis_prompt(survey_responses)
+    
+    def _validate_section(self, name: str, value) -> Optional[object]:
+        """Validated value of one streamed persona section (None if unknown or malformed)"""
+        if name == "archetype_name":
+            return value if isinstance(value, str) else None
+        model = SECTION_MODELS.get(name)
+        if model is None or not isinstance(value, dict):
+            return None
+        try:
+            return model(**value).dict()
+        except ValidationError:
+            return None
+    
+    def _metadata(self, usage: Dict, sampling: Optional[Dict]) -> Dict:
+        """Prompt size/cost summary (output cost is an upper bound at max_output_tokens)"""
+        prompt = dict(usage)
+        prompt["estimated_cost_usd"] = round(
+            prompt_budget.estimate_cost(usage["input_tokens_estimated"], usage["max_output_tokens"]), 6
+        )
+        return {"prompt": prompt, "sampling": sampling}
 
 # Create singleton instance
 analyzer = GeminiAnalyzer()
@@ -0,0 +1,116 @@
+import logging
+import json
+import dataclasses
+from typing import AsyncIterator, Dict, List, Optional
+import httpx
+from google.api_core import exceptions as api_exceptions
+
+logger = logging.getLogger(__name__)
+
+
+def _camel_case(name: str) -> str:
+    head, *rest = name.split("_")
+    return head + "".join(part.title() for part in rest)
+
+
+def _generation_config_json(generation_config) -> Dict:
+    """GenerationConfig (dataclass or dict) as the REST generationConfig object"""
+    if generation_config is None:
+        return {}
+    if dataclasses.is_dataclass(generation_config):
+        generation_config = dataclasses.asdict(generation_config)
+    return {
+        _camel_case(key): value
+        for key, value in generation_config.items()
+        if value is not None
+    }
+
+
+class RestResponse:
+    """The parts of GenerateContentResponse the analyzer reads"""
+
+    def __init__(self, payload: Dict):
+        candidates = payload.get("candidates") or []
+        content = candidates[0].get("content", {}) if candidates else {}
+        self.parts: List[Dict] = [part for part in content.get("parts", []) if "text" in part]
+        self.usage_metadata = payload.get("usageMetadata", {})
+
+    @property
+    def text(self) -> str:
+        return "".join(part["text"] for part in self.parts)
+
+
+class GeminiRestModel:
+    """
+    Gemini generateContent over plain HTTP
+
+    Used instead of the SDK's gRPC client when gemini_api_endpoint is set,
+    e.g. to point the analyzer at a local stand-in for load tests. Exposes
+    the same generate_content_async() the analyzer calls on the SDK model,
+    and raises the same google.api_core exceptions for HTTP errors.
+    """
+
+    def __init__(self, model_name: str, api_key: str, endpoint: str, timeout: float):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.endpoint = endpoint.rstrip("/")
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it binds to the serving event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.endpoint,
+                timeout=self.timeout,
+                headers={"x-goog-api-key": self.api_key},
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=64),
+            )
+        return self._client
+
+    def _url(self, method: str) -> str:
+        return f"/v1beta/models/{self.model_name}:{method}"
+
+    def _body(self, prompt: str, generation_config) -> Dict:
+        return {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": _generation_config_json(generation_config),
+        }
+
+    @staticmethod
+    async def _raise_for_status(response: httpx.Response):
+        if response.status_code < 400:
+            return
+        await response.aread()
+        try:
+            message = response.json().get("error", {}).get("message", response.text)
+        except ValueError:
+            message = response.text
+        if response.status_code == 429:
+            # The SDK's gRPC client reports quota errors as ResourceExhausted
+            raise api_exceptions.ResourceExhausted(message, response=response)
+        raise api_exceptions.from_http_status(response.status_code, message, response=response)
+
+    async def generate_content_async(self, prompt: str, generation_config=None, stream: bool = False):
+        body = self._body(prompt, generation_config)
+        if stream:
+            return self._stream(body)
+
+        response = await self.client.post(self._url("generateContent"), json=body)
+        await self._raise_for_status(response)
+        return RestResponse(response.json())
+
+    async def _stream(self, body: Dict) -> AsyncIterator[RestResponse]:
+        async with self.client.stream(
+            "POST", self._url("streamGenerateContent"), params={"alt": "sse"}, json=body
+        ) as response:
+            await self._raise_for_status(response)
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    yield RestResponse(json.loads(line[len("data:"):]))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,241 @@
+"""
+Keyword-based persona builder used when Gemini is unavailable
+Counts lexicon matches over the response column with Arrow regex kernels
+"""
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.models import PlayerPersona, Demographics, Motivations, PainPoints, SpendingHabits
+from app.services.metrics import stage_timer
+from app.services.text_vectors import TextColumn, as_text_array
+
+logger = logging.getLogger(__name__)
+
+NOT_STATED = "Not stated in responses"
+
+# Status message for responses carrying a degraded persona
+DEGRADED_MESSAGE = "Gemini is unavailable; returned an approximate keyword-based persona"
+
+# Label -> keywords (matched case-insensitively on word boundaries)
+GENRES = {
+    "RPG": ["rpg", "jrpg", "role-playing", "role playing"],
+    "Shooter": ["shooter", "fps", "call of duty", "valorant", "counter-strike"],
+    "Battle Royale": ["battle royale", "fortnite", "apex", "pubg", "warzone"],
+    "Strategy": ["strategy", "rts", "4x", "tactics", "tactical"],
+    "MOBA": ["moba", "league of legends", "dota"],
+    "Action Adventure": ["adventure", "open world", "action"],
+    "Roguelike": ["roguelike", "roguelite"],
+    "Survival": ["survival", "crafting"],
+    "Simulation": ["simulation", "simulator", "city builder", "farming"],
+    "Sports": ["sports", "fifa", "football", "soccer", "nba", "basketball"],
+    "Racing": ["racing", "racer", "cars", "kart"],
+    "Puzzle": ["puzzle", "puzzles", "match-3", "match 3"],
+    "Fighting": ["fighting game", "fighter", "combos"],
+    "Horror": ["horror", "scary"],
+    "Platformer": ["platformer", "platforming"],
+}
+PLATFORMS = {
+    "PC": ["pc", "steam", "keyboard", "mouse", "epic games"],
+    "PlayStation": ["playstation", "ps4", "ps5"],
+    "Xbox": ["xbox", "game pass"],
+    "Nintendo Switch": ["switch", "nintendo"],
+    "Mobile": ["mobile", "phone", "ios", "android", "tablet"],
+    "Console": ["console", "consoles", "controller"],
+}
+FREQUENCIES = {
+    "Daily": ["every day", "daily", "each day", "every night", "every evening"],
+    "Mostly weekends": ["weekend", "weekends"],
+    "Long sessions (hours at a time)": ["hours", "all night", "marathon"],
+    "A few times a week": ["few times a week", "couple times a week", "after work", "after school"],
+    "Occasionally": ["occasionally", "sometimes", "once a week", "now and then"],
+}
+AGE_RANGES = {
+    "16-24": ["school", "college", "university", "student", "exams", "homework"],
+    "25-34": ["work", "job", "office", "commute", "coworkers"],
+    "35-50": ["my kids", "my son", "my daughter", "parent", "family"],
+}
+MOTIVATIONS = {
+    "Story and characters": ["story", "narrative", "characters", "dialogue", "lore", "quests", "writing"],
+    "Competition": ["pvp", "competitive", "ranked", "leaderboard", "esports", "winning"],
+    "Playing with friends": ["friends", "coop", "co-op", "multiplayer", "team", "squad", "guild", "clan"],
+    "Progression and loot": ["progression", "loot", "level up", "leveling", "unlock", "unlocks", "rewards"],
+    "Exploration": ["exploration", "explore", "exploring", "open world", "discover", "secrets"],
+    "Creativity": ["crafting", "building", "creative", "customization", "customize", "design"],
+    "Challenge and mastery": ["bosses", "boss", "difficulty", "challenge", "challenging", "mastery", "hard"],
+    "Relaxation": ["relax", "relaxing", "chill", "casual", "unwind", "cozy"],
+    "Audiovisual immersion": ["graphics", "music", "soundtrack", "art style", "visuals", "atmosphere"],
+}
+ARCHETYPES = {
+    "Story and characters": "The Story Seeker",
+    "Competition": "The Competitive Challenger",
+    "Playing with friends": "The Social Squad Player",
+    "Progression and loot": "The Loot-Driven Achiever",
+    "Exploration": "The Curious Explorer",
+    "Creativity": "The Creative Builder",
+    "Challenge and mastery": "The Mastery Hunter",
+    "Relaxation": "The Casual Unwinder",
+    "Audiovisual immersion": "The Immersion Enthusiast",
+}
+FRUSTRATIONS = {
+    "Bugs and crashes": ["bug", "bugs", "buggy", "crash", "crashes", "glitch", "glitches", "broken"],
+    "Performance and frame drops": ["performance", "lag", "laggy", "frames", "fps drops", "stutter", "loading"],
+    "Servers and matchmaking": ["server", "servers", "matchmaking", "disconnect", "disconnects", "queue"],
+    "Grind and repetition": ["grind", "grindy", "repetitive", "tedious"],
+    "Aggressive monetization": ["microtransactions", "pay to win", "pay-to-win", "p2w", "cash grab", "battle pass"],
+    "Pricing": ["price", "overpriced", "expensive"],
+    "Controls and camera": ["controls", "camera", "clunky"],
+    "Difficulty and balance": ["difficulty", "balance", "unfair", "too hard", "too easy"],
+    "Onboarding": ["tutorial", "confusing", "unclear"],
+    "Toxic players and cheaters": ["toxic", "cheaters", "cheating", "hackers"],
+    "Lack of content": ["more content", "content", "boring", "nothing to do"],
+}
+MONETIZATION = {
+    "Battle pass": ["battle pass", "season pass"],
+    "Story DLC and expansions": ["dlc", "expansion", "expansions"],
+    "Cosmetics": ["cosmetic", "cosmetics", "skins", "skin", "outfits"],
+    "Subscription": ["subscription", "subscribe", "game pass"],
+    "One-time premium purchase": ["full price", "one-time", "buy once", "premium"],
+    "Free-to-play": ["free to play", "free-to-play", "f2p"],
+}
+
+# Sentiment cues that decide whether a topic mention is praise or a complaint
+POSITIVE = ["love", "enjoy", "fun", "amazing", "awesome", "great", "best", "keeps me", "favorite", "like", "pretty good"]
+NEGATIVE = ["hate", "annoying", "frustrating", "clunky", "broken", "fix", "bad", "terrible", "awful", "too",
+            "needs work", "not a fan", "could be better", "could improve", "confusing", "overpriced", "boring", "worse"]
+WILLING_TO_PAY = ["would pay", "happy to pay", "worth the", "worth it", "bought", "buy", "purchase", "support the devs"]
+PRICE_AVERSE = ["overpriced", "too expensive", "expensive", "pay to win", "pay-to-win", "cash grab", "greedy", "refund"]
+
+# Lines scored per survey; larger surveys are sampled evenly (shares are estimates anyway)
+SAMPLE_LINES = 2000
+
+
+def _pattern(keywords: List[str]) -> str:
+    return r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")\b"
+
+
+class HeuristicPersonaBuilder:
+    """
+    Persona from keyword lexicons, for when the LLM cannot be reached
+
+    Every lexicon label is one case-insensitive regex pass over the Arrow
+    column (sampled evenly down to SAMPLE_LINES lines), so a survey of any
+    size is scored in milliseconds without per-row Python calls. Topic
+    mentions are split into praise and complaints by co-occurring sentiment
+    cues, and collapsed lines are weighted by their respondent count. The result is a valid
+    PlayerPersona marked degraded: a rough fallback, not an analysis.
+    """
+
+    def __init__(self):
+        self.logger = logger
+
+    def build(self, survey_responses: TextColumn, weights: Optional[List[int]] = None) -> PlayerPersona:
+        """Degraded persona for the responses (list or Arrow string column) and their respondent weights"""
+        with stage_timer("heuristic_persona"):
+            texts = as_text_array(survey_responses)
+            weights = pa.array(np.ones(len(texts), dtype=np.int64) if weights is None else weights, type=pa.int64())
+            if len(texts) > SAMPLE_LINES:
+                sample = pa.array(np.linspace(0, len(texts) - 1, SAMPLE_LINES).astype(np.int64))
+                texts = texts.take(sample)
+                weights = weights.take(sample)
+            total = max(float(pc.sum(weights).as_py() or 0), 1.0)
+            positive = self._matches(texts, POSITIVE)
+            negative = self._matches(texts, NEGATIVE)
+
+            def score(lexicon: Dict[str, List[str]], mask=None) -> List[Tuple[str, float]]:
+                return self._score(texts, weights, total, lexicon, mask)
+
+            genres = score(GENRES)
+            platforms = score(PLATFORMS)
+            frequencies = score(FREQUENCIES)
+            ages = score(AGE_RANGES)
+            # Fall back to plain mentions when nobody phrases a topic as praise/complaint
+            motivations = score(MOTIVATIONS, positive) or score(MOTIVATIONS)
+            frustrations = score(FRUSTRATIONS, negative) or score(FRUSTRATIONS)
+            monetization = score(MONETIZATION)
+            willing = self._share(self._matches(texts, WILLING_TO_PAY), weights, total)
+            averse = self._share(self._matches(texts, PRICE_AVERSE), weights, total)
+
+            persona = PlayerPersona(
+                archetype_name=ARCHETYPES[motivations[0][0]] if motivations else "The Everyday Player",
+                demographics=Demographics(
+                    age_range=f"{ages[0][0]} (inferred from life-stage mentions)" if ages else NOT_STATED,
+                    gaming_frequency=frequencies[0][0] if frequencies else NOT_STATED,
+                    preferred_genres=[label for label, _ in genres[:3]] or [NOT_STATED],
+                    primary_platform=platforms[0][0] if platforms else NOT_STATED,
+                ),
+                motivations=Motivations(
+                    primary_driver=motivations[0][0] if motivations else NOT_STATED,
+                    engagement_factors=[self._describe(label, share) for label, share in motivations[:4]] or [NOT_STATED],
+                    psychological_profile=self._profile(motivations, frustrations),
+                ),
+                pain_points=PainPoints(
+                    frustrations=[self._describe(label, share) for label, share in frustrations[:4]] or [NOT_STATED],
+                    what_they_hate=frustrations[0][0] if frustrations else NOT_STATED,
+                ),
+                spending_habits=SpendingHabits(
+                    in_game_purchase_likelihood=self._purchase_likelihood(willing, averse),
+                    monetization_preference=monetization[0][0] if monetization else NOT_STATED,
+                    price_sensitivity=self._price_sensitivity(willing, averse),
+                ),
+                degraded=True,
+            )
+
+        self.logger.info(f"Heuristic persona built from {len(survey_responses)} responses: {persona.archetype_name}")
+        return persona
+
+    def _matches(self, texts: pa.Array, keywords: List[str]) -> pa.Array:
+        return pc.fill_null(pc.match_substring_regex(texts, _pattern(keywords), ignore_case=True), False)
+
+    def _share(self, mask: pa.Array, weights: pa.Array, total: float) -> float:
+        return float(pc.sum(pc.if_else(mask, weights, 0)).as_py() or 0) / total
+
+    def _score(self, texts: pa.Array, weights: pa.Array, total: float, lexicon: Dict[str, List[str]],
+               mask=None) -> List[Tuple[str, float]]:
+        """(label, share of respondents) for every mentioned label, most common first"""
+        scores = []
+        for label, keywords in lexicon.items():
+            matches = self._matches(texts, keywords)
+            if mask is not None:
+                matches = pc.and_(matches, mask)
+            share = self._share(matches, weights, total)
+            if share > 0:
+                scores.append((label, share))
+        return sorted(scores, key=lambda item: -item[1])
+
+    def _describe(self, label: str, share: float) -> str:
+        return f"{label} ({share:.0%} of respondents)"
+
+    def _profile(self, motivations: List[Tuple[str, float]], frustrations: List[Tuple[str, float]]) -> str:
+        if not motivations and not frustrations:
+            return "Too few recognizable themes in the responses to profile these players"
+        parts = []
+        if motivations:
+            parts.append(f"Mostly driven by {motivations[0][0].lower()}")
+        if len(motivations) > 1:
+            parts.append(f"also values {motivations[1][0].lower()}")
+        if frustrations:
+            parts.append(f"most sensitive to {frustrations[0][0].lower()}")
+        return "; ".join(parts) + " (keyword estimate)"
+
+    def _purchase_likelihood(self, willing: float, averse: float) -> str:
+        if not willing and not averse:
+            return NOT_STATED
+        if willing >= 2 * averse:
+            return f"Moderate to high - {willing:.0%} mention paying for content"
+        if averse >= 2 * willing:
+            return f"Low - {averse:.0%} object to prices or monetization"
+        return f"Mixed - {willing:.0%} willing to pay, {averse:.0%} object to prices"
+
+    def _price_sensitivity(self, willing: float, averse: float) -> str:
+        if not averse:
+            return "No price complaints found" if willing else NOT_STATED
+        if averse >= 0.1:
+            return f"High - {averse:.0%} complain about price or monetization"
+        return f"Moderate - {averse:.0%} complain about price or monetization"
+
+
+# Create singleton instance
+heuristic_personas = HeuristicPersonaBuilder()
@@ -0,0 +1,98 @@
+import logging
+import asyncio
+from typing import Dict, Tuple
+import numpy as np
+import pyarrow as pa
+from app.models import PlayerPersona, SurveyData
+from app.services.persona_state import persona_states, PersonaState, row_keys
+from app.services.response_dedup import deduplicator
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalAnalyzer:
+    """
+    Keep the persona of a growing survey up to date
+
+    The first analysis of a survey_key is a full one. Later uploads of the
+    same survey are diffed against the stored row keys, and only the rows
+    not analyzed yet go to Gemini, together with the current persona and
+    a running summary, so an update costs in proportion to the new rows.
+    Rows removed from the survey are not unlearned; pass a new survey_key
+    (or change match_on) to start over.
+
+    Degraded personas are never stored. If Gemini is unavailable during an
+    update, the stored persona is returned unchanged and the same rows are
+    picked up again by the next update.
+    """
+
+    def __init__(self):
+        self.logger = logger
+
+    async def analyze(self, survey_key: str, survey_data: SurveyData, match_on: str) -> Tuple[PlayerPersona, Dict]:
+        """Persona covering every row of survey_data, and metadata on what was (re)analyzed"""
+        from app.services.gemini_analyzer import analyzer, FALLBACK_ERRORS
+
+        key = persona_states.make_key(survey_key)
+        keys = await asyncio.to_thread(row_keys, survey_data, match_on)
+
+        async with persona_states.lock(key):
+            state = await asyncio.to_thread(persona_states.get, key)
+            if state is None or state.version != analyzer.cache_version or state.match_on != match_on:
+                return await self._full(key, survey_data, keys, match_on, analyzer)
+
+            new_rows = state.new_rows(keys)
+            report = {
+                "mode": "update",
+                "match_on": match_on,
+                "previous_responses": state.responses_count,
+                "new_responses": len(new_rows),
+            }
+            if not len(new_rows):
+                self.logger.info(f"Incremental analysis: no new responses for {survey_key}")
+                return state.persona, {"incremental": {**report, "mode": "unchanged"}}
+
+            delta = pa.array(new_rows, type=pa.int64())
+            response_texts, weights, representatives, dedup_report = await asyncio.to_thread(
+                deduplicator.collapse, survey_data.texts.take(delta)
+            )
+            respondent_ids = survey_data.respondent_ids.take(delta).take(
+                pa.array(representatives, type=pa.int64())
+            ).to_pylist()
+
+            try:
+                persona, summary, metadata = await analyzer.update_persona_with_metadata(
+                    state.persona, state.summary, state.responses_count,
+                    response_texts, len(new_rows), respondent_ids=respondent_ids, weights=weights
+                )
+            except FALLBACK_ERRORS as e:
+                self.logger.warning(f"Gemini unavailable ({type(e).__name__}), keeping the previous persona")
+                report.update(mode="stale", reason=f"{type(e).__name__}: {str(e)}")
+                return state.persona, {"dedup": dedup_report, "incremental": report}
+
+            seen = np.union1d(state.seen, keys[new_rows])
+            await asyncio.to_thread(
+                persona_states.set, key, PersonaState(persona, summary, seen, match_on, analyzer.cache_version)
+            )
+            return persona, {"dedup": dedup_report, **metadata, "incremental": report}
+
+    async def _full(self, key: str, survey_data: SurveyData, keys: np.ndarray, match_on: str,
+                    analyzer) -> Tuple[PlayerPersona, Dict]:
+        """First analysis of a survey: the regular pipeline, then its state is stored"""
+        response_texts, weights, representatives, dedup_report = await asyncio.to_thread(
+            deduplicator.collapse, survey_data.texts
+        )
+        respondent_ids = survey_data.respondent_ids_at(representatives)
+        persona, metadata = await analyzer.analyze_survey_with_metadata(
+            response_texts, respondent_ids=respondent_ids, weights=weights
+        )
+
+        report = {"mode": "full", "match_on": match_on, "previous_responses": 0, "new_responses": len(survey_data)}
+        if not persona.degraded:
+            state = PersonaState(persona, "", np.unique(keys), match_on, analyzer.cache_version)
+            await asyncio.to_thread(persona_states.set, key, state)
+        return persona, {"dedup": dedup_report, **metadata, "incremental": report}
+
+
+# Create singleton instance
+incremental_analyzer = IncrementalAnalyzer()
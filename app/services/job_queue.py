@@ -0,0 +1,411 @@
+import logging
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+from app.models import AnalysisJob
+from app.config import settings
+from app.services.metrics import count_error
+from app.services.heuristic_persona import DEGRADED_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+
+class JobQueue(ABC):
+    """Storage for analysis jobs and their response payloads"""
+
+    @abstractmethod
+    async def put(self, job: AnalysisJob, responses: List[str], weights: List[int]):
+        """Enqueue a new job with its responses and the respondents behind each"""
+
+    @abstractmethod
+    async def claim(self) -> Optional[Tuple[AnalysisJob, List[str], List[int]]]:
+        """Atomically move the oldest queued job to running and return it with its payload"""
+
+    @abstractmethod
+    async def renew(self, job_id: str):
+        """Tell the queue a running job is still being worked on"""
+
+    @abstractmethod
+    async def release(self, job: AnalysisJob) -> bool:
+        """Hand back a running job whose worker is shutting down; False if it can't be resumed"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        """Current state of a job"""
+
+    @abstractmethod
+    async def update(self, job: AnalysisJob):
+        """Persist a job's new state (dropping its payload once finished)"""
+
+    @abstractmethod
+    async def cancel(self, job_id: str) -> Optional[AnalysisJob]:
+        """Mark a queued or running job as cancelled"""
+
+
+class InMemoryJobQueue(JobQueue):
+    """Process-local job queue"""
+
+    def __init__(self):
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._payloads: Dict[str, Tuple[List[str], List[int]]] = {}
+
+    def _purge(self):
+        cutoff = time.time() - settings.job_retention_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in FINISHED_STATES and job.updated_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def put(self, job: AnalysisJob, responses: List[str], weights: List[int]):
+        self._purge()
+        self._jobs[job.job_id] = job
+        self._payloads[job.job_id] = (responses, weights)
+
+    async def claim(self) -> Optional[Tuple[AnalysisJob, List[str], List[int]]]:
+        for job in self._jobs.values():
+            if job.status == QUEUED:
+                job.status = RUNNING
+                job.updated_at = time.time()
+                return (job.model_copy(), *self._payloads[job.job_id])
+        return None
+
+    async def renew(self, job_id: str):
+        # Jobs die with the process here, so there is no lease to extend
+        pass
+
+    async def release(self, job: AnalysisJob) -> bool:
+        # Nothing will pick it up after the process exits
+        return False
+
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        job = self._jobs.get(job_id)
+        return job.model_copy() if job else None
+
+    async def update(self, job: AnalysisJob):
+        current = self._jobs.get(job.job_id)
+        # Never resurrect a job that was cancelled while it ran
+        if current is None or current.status == CANCELLED:
+            return
+        self._jobs[job.job_id] = job.model_copy()
+        if job.status in FINISHED_STATES:
+            self._payloads.pop(job.job_id, None)
+
+    async def cancel(self, job_id: str) -> Optional[AnalysisJob]:
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return None
+        job.status = CANCELLED
+        job.updated_at = time.time()
+        self._payloads.pop(job_id, None)
+        return job.model_copy()
+
+
+class SqliteJobQueue(JobQueue):
+    """
+    SQLite-backed job queue
+
+    Survives restarts and can be shared by several server processes; claims
+    run in an IMMEDIATE transaction so each job is picked up once. A running
+    job holds a lease that its worker renews; if the lease runs out (the
+    process crashed or was killed) the job is claimed again from the start.
+    Jobs interrupted by a graceful shutdown go straight back to the queue.
+    """
+
+    def __init__(self, path: str, lease_seconds: float):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL, "
+                "updated_at REAL NOT NULL, record TEXT NOT NULL, payload TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; transactions are opened explicitly where needed
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _put(self, job: AnalysisJob, responses: List[str], weights: List[int]):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated_at < ?",
+                (*sorted(FINISHED_STATES), time.time() - settings.job_retention_seconds)
+            )
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, created_at, updated_at, record, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job.job_id, job.status, job.created_at, job.updated_at,
+                 job.model_dump_json(), json.dumps({"responses": responses, "weights": weights}))
+            )
+
+    def _claim(self) -> Optional[Tuple[AnalysisJob, List[str], List[int]]]:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT record, payload FROM jobs WHERE status = ? OR (status = ? AND updated_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, time.time() - self.lease_seconds)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+
+                job = AnalysisJob.model_validate_json(row[0])
+                if job.status == RUNNING:
+                    logger.warning(f"Job {job.job_id} lease expired, running it again")
+                job.status = RUNNING
+                job.updated_at = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ?, record = ? WHERE job_id = ?",
+                    (job.status, job.updated_at, job.model_dump_json(), job.job_id)
+                )
+                conn.execute("COMMIT")
+                payload = json.loads(row[1])
+                return job, payload["responses"], payload["weights"]
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _renew(self, job_id: str):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE job_id = ? AND status = ?",
+                (time.time(), job_id, RUNNING)
+            )
+
+    def _release(self, job: AnalysisJob):
+        job.status = QUEUED
+        job.updated_at = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, record = ? WHERE job_id = ? AND status = ?",
+                (job.status, job.updated_at, job.model_dump_json(), job.job_id, RUNNING)
+            )
+
+    def _get(self, job_id: str) -> Optional[AnalysisJob]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return AnalysisJob.model_validate_json(row[0]) if row else None
+
+    def _update(self, job: AnalysisJob):
+        payload_sql = ", payload = NULL" if job.status in FINISHED_STATES else ""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                f"UPDATE jobs SET status = ?, updated_at = ?, record = ?{payload_sql} "
+                "WHERE job_id = ? AND status != ?",
+                (job.status, job.updated_at, job.model_dump_json(), job.job_id, CANCELLED)
+            )
+
+    def _cancel(self, job_id: str) -> Optional[AnalysisJob]:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                job = AnalysisJob.model_validate_json(row[0]) if row else None
+                if job is None or job.status in FINISHED_STATES:
+                    conn.execute("COMMIT")
+                    return None
+
+                job.status = CANCELLED
+                job.updated_at = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ?, record = ?, payload = NULL WHERE job_id = ?",
+                    (job.status, job.updated_at, job.model_dump_json(), job_id)
+                )
+                conn.execute("COMMIT")
+                return job
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    async def put(self, job: AnalysisJob, responses: List[str], weights: List[int]):
+        await asyncio.to_thread(self._put, job, responses, weights)
+
+    async def claim(self) -> Optional[Tuple[AnalysisJob, List[str], List[int]]]:
+        return await asyncio.to_thread(self._claim)
+
+    async def renew(self, job_id: str):
+        await asyncio.to_thread(self._renew, job_id)
+
+    async def release(self, job: AnalysisJob) -> bool:
+        await asyncio.to_thread(self._release, job)
+        return True
+
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def update(self, job: AnalysisJob):
+        await asyncio.to_thread(self._update, job)
+
+    async def cancel(self, job_id: str) -> Optional[AnalysisJob]:
+        return await asyncio.to_thread(self._cancel, job_id)
+
+
+class AnalysisWorkerPool:
+    """
+    Bounded pool of in-process workers running queued analysis jobs
+
+    Throughput is tuned with the worker count; each worker runs one job at
+    a time through the shared analyzer singleton.
+    """
+
+    def __init__(self, queue: JobQueue, workers: int, poll_interval: float, lease_seconds: float):
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.logger = logger
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self):
+        """Start the worker tasks (called from the app lifespan)"""
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(idx)) for idx in range(self.workers)]
+        self.logger.info(f"Started {self.workers} analysis workers ({type(self.queue).__name__})")
+
+    async def stop(self):
+        """Cancel the workers; unfinished jobs are requeued, or marked failed if the queue dies with us"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, responses: List[str], weights: Optional[List[int]] = None) -> AnalysisJob:
+        """
+        Queue an analysis and return its job record immediately
+
+        weights are the respondents behind each response when duplicates
+        were already collapsed (1 each by default).
+        """
+        weights = [1] * len(responses) if weights is None else list(weights)
+        now = time.time()
+        job = AnalysisJob(
+            job_id=uuid.uuid4().hex,
+            status=QUEUED,
+            created_at=now,
+            updated_at=now,
+            responses_count=sum(weights)
+        )
+        await self.queue.put(job, responses, weights)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        self.logger.info(f"Queued analysis job {job.job_id} ({len(responses)} responses)")
+        return job
+
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return await self.queue.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[AnalysisJob]:
+        """Cancel a queued job, or stop it if it is running in this process"""
+        job = await self.queue.cancel(job_id)
+        task = self._running.get(job_id)
+        if job is not None and task is not None:
+            task.cancel()
+        return job
+
+    async def _next_job(self) -> Tuple[AnalysisJob, List[str], List[int]]:
+        while True:
+            claimed = await self.queue.claim()
+            if claimed is not None:
+                return claimed
+
+            # Woken by local submits; polling picks up jobs queued by other processes
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _keep_leased(self, job_id: str):
+        """Renew a running job's lease well before it runs out"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.queue.renew(job_id)
+            except Exception as e:
+                self.logger.warning(f"Could not renew lease of job {job_id}: {str(e)}")
+
+    async def _worker(self, idx: int):
+        from app.services.gemini_analyzer import analyzer
+
+        while True:
+            job, responses, weights = await self._next_job()
+            self.logger.info(f"Worker {idx} running job {job.job_id}")
+
+            task = asyncio.ensure_future(analyzer.analyze_survey(responses, weights=weights))
+            self._running[job.job_id] = task
+            lease = asyncio.create_task(self._keep_leased(job.job_id))
+            try:
+                persona = await task
+                job.status = SUCCEEDED
+                job.persona = persona
+                job.message = DEGRADED_MESSAGE if persona.degraded else "Player persona generated successfully"
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    # Pool is shutting down: requeue the job if the queue outlives us
+                    task.cancel()
+                    if not await self.queue.release(job):
+                        job.status = FAILED
+                        job.error_type = "worker_shutdown"
+                        count_error(job.error_type)
+                        job.message = "Server shut down before the job finished"
+                        job.updated_at = time.time()
+                        await self.queue.update(job)
+                    raise
+                job.status = CANCELLED
+                job.message = "Job cancelled"
+            except ValueError as e:
+                job.status = FAILED
+                job.error_type = "validation_error"
+                job.message = str(e)
+            except Exception as e:
+                self.logger.error(f"Job {job.job_id} failed: {str(e)}", exc_info=True)
+                job.status = FAILED
+                job.error_type = "analysis_error"
+                job.message = "Failed to generate persona. Please try again."
+            finally:
+                lease.cancel()
+                self._running.pop(job.job_id, None)
+
+            if job.status == FAILED:
+                count_error(job.error_type)
+            job.updated_at = time.time()
+            await self.queue.update(job)
+            self.logger.info(f"Job {job.job_id} {job.status}")
+
+
+def create_job_queue() -> JobQueue:
+    """Job queue backend selected by settings"""
+    if settings.job_queue_backend == "sqlite":
+        return SqliteJobQueue(settings.job_queue_sqlite_path, settings.job_lease_seconds)
+    return InMemoryJobQueue()
+
+
+# Create singleton instance
+job_pool = AnalysisWorkerPool(
+    queue=create_job_queue(),
+    workers=settings.job_workers,
+    poll_interval=settings.job_poll_interval_seconds,
+    lease_seconds=settings.job_lease_seconds
+)
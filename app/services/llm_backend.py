@@ -0,0 +1,302 @@
+import logging
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Values of the llm_backend setting
+LLM_BACKENDS = ("gemini", "fake", "record", "replay")
+
+# Canned persona the fake backend answers with
+FAKE_PERSONA = {
+    "archetype_name": "The Benchmark Grinder",
+    "demographics": {
+        "age_range": "18-34",
+        "gaming_frequency": "10-20 hours per week",
+        "preferred_genres": ["RPG", "Shooter"],
+        "primary_platform": "PC"
+    },
+    "motivations": {
+        "primary_driver": "Progression",
+        "engagement_factors": ["loot", "friends"],
+        "psychological_profile": "Goal-oriented and social"
+    },
+    "pain_points": {
+        "frustrations": ["grind", "server issues"],
+        "what_they_hate": "Pay-to-win"
+    },
+    "spending_habits": {
+        "in_game_purchase_likelihood": "Moderate",
+        "monetization_preference": "Battle Pass",
+        "price_sensitivity": "Medium"
+    }
+}
+FAKE_SUMMARY = "Most players enjoy the story; several complain about the grind and prices."
+
+
+def fake_text(prompt: str) -> str:
+    """Deterministic answer to one of the analyzer's prompts (map, update or persona)"""
+    if "Summarize what they reveal" in prompt:
+        return FAKE_SUMMARY
+    if '{"persona": <updated persona>' in prompt:
+        return json.dumps({"persona": FAKE_PERSONA, "summary": FAKE_SUMMARY})
+    return json.dumps(FAKE_PERSONA)
+
+
+class CassetteNotFoundError(LookupError):
+    """Replay was asked for a prompt that was never recorded"""
+
+
+class LLMBackend(ABC):
+    """
+    What the analyzer needs from a language model
+
+    generate() returns the full response text of one prompt; stream()
+    yields the same text in pieces as it is produced. Both take the
+    analyzer's generation settings (temperature, max_output_tokens) as a
+    plain dict and raise the provider's errors unchanged, so retries, the
+    circuit breaker and rate limits wrap every backend alike.
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.stats = {"calls": 0}
+
+    @abstractmethod
+    async def generate(self, prompt: str, generation_settings: Dict) -> str:
+        """Full response text of one prompt"""
+
+    @abstractmethod
+    def stream(self, prompt: str, generation_settings: Dict) -> AsyncIterator[str]:
+        """Response text of one prompt, in pieces as it is generated"""
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Gemini through the google-generativeai SDK, or over plain HTTP
+
+    The client is created on the first call rather than at import, so the
+    service starts (and other backends run) without an API key. With
+    gemini_api_endpoint set, the REST client is used instead of the SDK,
+    e.g. to point at a local stand-in during load tests.
+    """
+
+    name = "gemini"
+
+    def __init__(self, model_name: str, api_key: str, endpoint: str = "", timeout: float = 120.0):
+        super().__init__(model_name)
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            if self.endpoint:
+                from app.services.gemini_rest import GeminiRestModel
+                self._model = GeminiRestModel(self.model_name, self.api_key, self.endpoint, self.timeout)
+            else:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+            logger.info(f"Gemini client initialized ({self.model_name})")
+        return self._model
+
+    @staticmethod
+    def _generation_config(generation_settings: Dict):
+        import google.generativeai as genai
+        return genai.types.GenerationConfig(**generation_settings)
+
+    async def generate(self, prompt: str, generation_settings: Dict) -> str:
+        self.stats["calls"] += 1
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=self._generation_config(generation_settings)
+        )
+        return response.text
+
+    async def stream(self, prompt: str, generation_settings: Dict) -> AsyncIterator[str]:
+        self.stats["calls"] += 1
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=self._generation_config(generation_settings),
+            stream=True
+        )
+        async for chunk in response:
+            # Chunks without parts (e.g. the final finish-reason chunk) carry no text
+            if chunk.parts:
+                yield chunk.text
+
+
+class FakeBackend(LLMBackend):
+    """
+    Local stand-in that answers every prompt with canned text
+
+    Each call sleeps latency +/- jitter seconds (uniform, seeded), then
+    returns fake_text(prompt), so the rest of the pipeline runs unchanged
+    with no network and its own overhead can be measured in isolation.
+    Streams spread the same delay over stream_chunks pieces.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, seed: int = 42, stream_chunks: int = 8):
+        super().__init__("fake")
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_chunks = stream_chunks
+        self._random = random.Random(seed)
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    async def generate(self, prompt: str, generation_settings: Dict) -> str:
+        self.stats["calls"] += 1
+        await asyncio.sleep(self._delay())
+        return fake_text(prompt)
+
+    async def stream(self, prompt: str, generation_settings: Dict) -> AsyncIterator[str]:
+        self.stats["calls"] += 1
+        text = fake_text(prompt)
+        delay = self._delay() / self.stream_chunks
+        size = len(text) // self.stream_chunks + 1
+        for start in range(0, len(text), size):
+            await asyncio.sleep(delay)
+            yield text[start:start + size]
+
+
+class RecordReplayBackend(LLMBackend):
+    """
+    Record responses of another backend to disk, or replay them offline
+
+    Cassettes are one JSON file per prompt in cassette_dir, named by the
+    SHA-256 of the model, generation settings and prompt. In record mode
+    every successful call of the inner backend is written out (streamed
+    calls once fully read); errors are passed through and not recorded.
+    In replay mode no model is called: a recorded prompt gets its
+    recorded text (optionally after its recorded latency), anything else
+    raises CassetteNotFoundError.
+    """
+
+    def __init__(self, mode: str, cassette_dir: str, model_name: str,
+                 inner: Optional[LLMBackend] = None, replay_latency: bool = False):
+        if mode not in ("record", "replay"):
+            raise ValueError("mode must be record or replay")
+        if mode == "record" and inner is None:
+            raise ValueError("Recording needs a backend to record")
+        super().__init__(model_name)
+        self.name = mode
+        self.mode = mode
+        self.cassette_dir = cassette_dir
+        self.inner = inner
+        self.replay_latency = replay_latency
+        self.stats.update({"replayed": 0, "missing": 0, "recorded": 0})
+        os.makedirs(cassette_dir, exist_ok=True)
+
+    def cassette_key(self, prompt: str, generation_settings: Dict) -> str:
+        payload = json.dumps(
+            {"model": self.model_name, "generation_settings": generation_settings, "prompt": prompt},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cassette_dir, f"{key}.json")
+
+    def _load(self, key: str) -> Dict:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                cassette = json.load(f)
+        except FileNotFoundError:
+            self.stats["missing"] += 1
+            raise CassetteNotFoundError(f"No cassette {key} in {self.cassette_dir}; record this prompt first") from None
+        self.stats["replayed"] += 1
+        return cassette
+
+    def _save(self, key: str, prompt: str, generation_settings: Dict, chunks: List[str], seconds: float):
+        cassette = {
+            "model": self.model_name,
+            "generation_settings": generation_settings,
+            "prompt_chars": len(prompt),
+            "text": "".join(chunks),
+            "chunks": chunks,
+            "latency_seconds": round(seconds, 3),
+            "recorded_at": time.time(),
+        }
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cassette, f)
+        os.replace(tmp_path, self._path(key))
+        self.stats["recorded"] += 1
+
+    async def generate(self, prompt: str, generation_settings: Dict) -> str:
+        self.stats["calls"] += 1
+        key = self.cassette_key(prompt, generation_settings)
+
+        if self.mode == "replay":
+            cassette = await asyncio.to_thread(self._load, key)
+            if self.replay_latency:
+                await asyncio.sleep(cassette["latency_seconds"])
+            return cassette["text"]
+
+        start = time.perf_counter()
+        text = await self.inner.generate(prompt, generation_settings)
+        await asyncio.to_thread(
+            self._save, key, prompt, generation_settings, [text], time.perf_counter() - start
+        )
+        return text
+
+    async def stream(self, prompt: str, generation_settings: Dict) -> AsyncIterator[str]:
+        self.stats["calls"] += 1
+        key = self.cassette_key(prompt, generation_settings)
+
+        if self.mode == "replay":
+            cassette = await asyncio.to_thread(self._load, key)
+            chunks = cassette.get("chunks") or [cassette["text"]]
+            delay = cassette["latency_seconds"] / len(chunks) if self.replay_latency else 0.0
+            for chunk in chunks:
+                if delay:
+                    await asyncio.sleep(delay)
+                yield chunk
+            return
+
+        start = time.perf_counter()
+        chunks = []
+        async for chunk in self.inner.stream(prompt, generation_settings):
+            chunks.append(chunk)
+            yield chunk
+        await asyncio.to_thread(
+            self._save, key, prompt, generation_settings, chunks, time.perf_counter() - start
+        )
+
+
+def create_backend(name: Optional[str] = None) -> LLMBackend:
+    """The backend named by llm_backend (or name), configured from settings"""
+    name = name or settings.llm_backend
+    if name == "gemini":
+        return GeminiBackend(
+            settings.gemini_model, settings.gemini_api_key,
+            settings.gemini_api_endpoint, settings.gemini_api_timeout_seconds
+        )
+    if name == "fake":
+        return FakeBackend(settings.llm_fake_latency_seconds, settings.llm_fake_jitter_seconds)
+    if name in ("record", "replay"):
+        return RecordReplayBackend(
+            name, settings.llm_cassette_dir, settings.gemini_model,
+            inner=create_backend("gemini") if name == "record" else None,
+            replay_latency=settings.llm_cassette_replay_latency
+        )
+    raise ValueError(f"Unknown llm_backend '{name}'; choose from: {', '.join(LLM_BACKENDS)}")
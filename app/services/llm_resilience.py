@@ -0,0 +1,206 @@
+import logging
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncContextManager, Awaitable, Callable, Deque, Dict, Optional
+import httpx
+import numpy as np
+from google.api_core import exceptions as api_exceptions
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Quota, overload and transient server/network faults; anything else fails at once
+RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,  # includes ResourceExhausted
+    api_exceptions.InternalServerError,
+    api_exceptions.BadGateway,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.GatewayTimeout,
+    api_exceptions.DeadlineExceeded,
+    httpx.TransportError,
+)
+
+
+
+class LLMDeadlineError(TimeoutError):
+    """
+    A call ran out of its overall deadline on our side
+
+    Raised by LLMResilience rather than the provider, so it is neither
+    retried nor counted as a provider failure by the circuit breaker.
+    """
+
+
+# Unused hedge allowance carried over from quiet periods (in hedged calls)
+HEDGE_BUDGET_BURST = 10.0
+
+# Recent successful call latencies kept per call kind
+LATENCY_WINDOW = 200
+
+
+def _retry_after(error: Optional[BaseException]) -> float:
+    """Seconds the provider asked us to wait (Retry-After header), if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after") or 0) if headers else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class LLMResilience:
+    """
+    Retries, an overall deadline and hedged requests around LLM calls
+
+    Retryable errors are retried with jittered exponential backoff (or the
+    provider's Retry-After, if longer). Every attempt of one call shares a
+    single deadline, after which LLMDeadlineError is raised. The deadline
+    starts once the first attempt is admitted, so time spent queueing for
+    capacity (see LLMRateLimiter) never runs it down.
+
+    With hedging on, an attempt still running past a high percentile of
+    recent latencies gets a second identical call; the first to succeed
+    wins and the other is cancelled. Hedges are paid from a budget that
+    grows by hedge_budget_ratio per call, so they add at most that share
+    of extra calls (plus a small burst) no matter how slow the provider is.
+    """
+
+    def __init__(self, max_attempts: int, backoff_initial: float, backoff_max: float, deadline: float,
+                 hedge_enabled: bool, hedge_quantile: float, hedge_min_samples: int, hedge_budget_ratio: float):
+        self.logger = logger
+        self.max_attempts = max(1, max_attempts)
+        self.deadline = deadline
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_budget_ratio = hedge_budget_ratio
+        self._backoff = wait_random_exponential(multiplier=backoff_initial, max=backoff_max)
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._hedge_budget = 0.0
+        self.stats = {
+            "calls": 0,
+            "retries": 0,
+            "deadline_exceeded": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "hedges_denied": 0,
+        }
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], kind: str,
+                   admit: Callable[[], AsyncContextManager]) -> Any:
+        """
+        Run fn() with retries and hedging, all within the deadline
+
+        Every call of fn() (each retry and hedge) first enters admit(),
+        e.g. an LLMRateLimiter slot, and runs while holding it.
+        """
+        self.stats["calls"] += 1
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=self._wait,
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            before_sleep=self._before_sleep,
+            reraise=True,
+        )
+        # Monotonic time the deadline runs out, set when the first attempt is admitted
+        deadline: Dict[str, float] = {}
+
+        async def admitted() -> Any:
+            async with admit():
+                start = time.perf_counter()
+                if not self.deadline:
+                    result = await fn()
+                else:
+                    loop = asyncio.get_running_loop()
+                    expires = deadline.setdefault("at", loop.time() + self.deadline)
+                    try:
+                        result = await asyncio.wait_for(fn(), max(0.0, expires - loop.time()))
+                    except asyncio.TimeoutError:
+                        self.stats["deadline_exceeded"] += 1
+                        raise LLMDeadlineError(f"LLM {kind} call did not finish within {self.deadline:g}s") from None
+                # Latency of the provider call alone, for the hedge delay
+                self._latencies.setdefault(kind, deque(maxlen=LATENCY_WINDOW)).append(time.perf_counter() - start)
+                return result
+
+        return await retrying(self._attempt, admitted, kind)
+
+    def _wait(self, retry_state: RetryCallState) -> float:
+        return max(self._backoff(retry_state), _retry_after(retry_state.outcome.exception()))
+
+    def _before_sleep(self, retry_state: RetryCallState):
+        self.stats["retries"] += 1
+        error = retry_state.outcome.exception()
+        self.logger.warning(
+            f"LLM call failed ({type(error).__name__}: {str(error)}); "
+            f"retry {retry_state.attempt_number}/{self.max_attempts - 1} in {retry_state.next_action.sleep:.2f}s"
+        )
+
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]], kind: str) -> Any:
+        """One attempt: the call, plus a hedge if it runs past the hedge delay"""
+        self._hedge_budget = min(HEDGE_BUDGET_BURST, self._hedge_budget + self.hedge_budget_ratio)
+        delay = self._hedge_delay(kind)
+        primary = asyncio.ensure_future(fn())
+        if delay is None:
+            return await primary
+
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if primary in done:
+                return primary.result()
+            if self._hedge_budget < 1:
+                self.stats["hedges_denied"] += 1
+                return await primary
+
+            self._hedge_budget -= 1
+            self.stats["hedges"] += 1
+            self.logger.info(f"LLM {kind} call slower than {delay:.2f}s, sending a hedged request")
+            hedge = asyncio.ensure_future(fn())
+            pending = {primary, hedge}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                if not pending:
+                    # Both failed; surface one of the errors to the retry loop
+                    raise done.pop().exception()
+        finally:
+            # Also reached when our caller is cancelled mid-wait; don't leave calls running
+            for task in pending:
+                if not task.done():
+                    task.cancel()
+
+    def _hedge_delay(self, kind: str) -> Optional[float]:
+        """Latency after which to hedge, or None until enough calls have been seen"""
+        if not self.hedge_enabled:
+            return None
+        samples = self._latencies.get(kind)
+        if samples is None or len(samples) < self.hedge_min_samples:
+            return None
+        return float(np.quantile(samples, self.hedge_quantile))
+
+    def get_stats(self) -> Dict[str, float]:
+        """Retry/hedge counters plus the current hedge delays"""
+        stats = {**self.stats, "hedge_budget": round(self._hedge_budget, 2)}
+        for kind in self._latencies:
+            delay = self._hedge_delay(kind)
+            if delay is not None:
+                stats[f"hedge_delay_seconds_{kind}"] = round(delay, 3)
+        return stats
+
+
+# Create singleton instance
+llm_resilience = LLMResilience(
+    max_attempts=settings.llm_max_attempts,
+    backoff_initial=settings.llm_backoff_initial_seconds,
+    backoff_max=settings.llm_backoff_max_seconds,
+    deadline=settings.llm_deadline_seconds,
+    hedge_enabled=settings.llm_hedge_enabled,
+    hedge_quantile=settings.llm_hedge_quantile,
+    hedge_min_samples=settings.llm_hedge_min_samples,
+    hedge_budget_ratio=settings.llm_hedge_budget_ratio
+)
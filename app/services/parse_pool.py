@@ -0,0 +1,263 @@
+import logging
+import asyncio
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.models import SurveyData
+from app.config import settings
+from app.services.file_validator import validator, FileContent
+from app.services.metrics import stage_timer, STAGE_SECONDS, RESPONSES_PARSED, RESPONSES_FILTERED
+
+logger = logging.getLogger(__name__)
+
+# Copy uploads into shared memory in slices this big
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Returns True once the client has gone away (e.g. Request.is_disconnected)
+DisconnectCheck = Callable[[], Awaitable[bool]]
+
+
+def _worker_main(conn, log_level: int):
+    """
+    Parse worker loop: (filename, shared memory name, size) in, one reply out
+
+    Replies are (status, payload, metrics) where status is "ok" (payload is
+    the SurveyData), "invalid" (a ValueError message for the client) or
+    "error" (anything else). metrics carries the stage timings recorded
+    while parsing so the server can fold them into /metrics.
+    """
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+
+        filename, shm_name, size = request
+        shm = shared_memory.SharedMemory(name=shm_name)
+        view = shm.buf[:size]
+        try:
+            status, payload = "ok", validator.validate_file(filename, view)
+        except ValueError as e:
+            status, payload = "invalid", str(e)
+        except Exception as e:
+            status, payload = "error", f"{type(e).__name__}: {str(e)}"
+        finally:
+            view.release()
+            shm.close()
+
+        metrics = {
+            "stages": STAGE_SECONDS.drain(),
+            "parsed": RESPONSES_PARSED.drain(),
+            "filtered": RESPONSES_FILTERED.drain(),
+        }
+        conn.send((status, payload, metrics))
+
+
+class _Worker:
+    """One parse process and the server's end of its pipe"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, logging.getLogger().level), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class ParsePool:
+    """
+    Parse uploaded files in worker processes
+
+    pandas/Arrow/openpyxl parsing is CPU-bound and would otherwise run on
+    the event loop, stalling every other request (/health included) while
+    a large workbook is read. Each parse is handed to an idle worker
+    process: the raw bytes go through a shared memory segment, only the
+    segment name crosses the pipe, and the parsed Arrow columns come back.
+
+    A parse that runs past the timeout, or whose client disconnects, has
+    its worker killed and replaced, so the CPU is freed right away. With
+    no workers configured, files are parsed on a thread instead; that keeps
+    the loop free but a runaway parse cannot be stopped.
+    """
+
+    def __init__(self, workers: int, timeout: float, poll_interval: float):
+        self.logger = logger
+        self.size = workers
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self.stats = {"parses": 0, "timeouts": 0, "disconnects": 0, "cancelled": 0, "crashes": 0, "restarts": 0}
+
+    def start(self):
+        """Spawn the worker processes (no-op if already running or disabled)"""
+        if self._idle is not None or self.size <= 0:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._add_worker()
+        self.logger.info(f"Started {self.size} parse workers")
+
+    def stop(self):
+        """Shut down idle workers and kill busy ones"""
+        if self._idle is None:
+            return
+        idle = set()
+        while not self._idle.empty():
+            idle.add(self._idle.get_nowait())
+        for worker in self._workers:
+            if worker in idle:
+                worker.close()
+            else:
+                worker.kill()
+        self._workers = []
+        self._idle = None
+
+    def _add_worker(self):
+        worker = _Worker(self._context)
+        self._workers.append(worker)
+        self._idle.put_nowait(worker)
+
+    def _replace(self, worker: _Worker):
+        """Kill a worker whose parse was abandoned and spawn a fresh one"""
+        worker.kill()
+        self._workers.remove(worker)
+        self.stats["restarts"] += 1
+        if self._idle is not None:
+            self._add_worker()
+
+    async def parse(self, filename: str, file_content: FileContent,
+                    is_disconnected: Optional[DisconnectCheck] = None) -> SurveyData:
+        """Validate and parse one upload off the event loop"""
+        # Cheap checks first, so bad uploads never reach a worker
+        _, size = validator.check_upload(filename, file_content)
+
+        self.stats["parses"] += 1
+        if self.size <= 0:
+            return await self._watch(asyncio.ensure_future(
+                asyncio.to_thread(validator.validate_file, filename, file_content)
+            ), is_disconnected)
+
+        self.start()
+        shm = await asyncio.to_thread(self._share, file_content, size)
+        try:
+            with stage_timer("parse_queue"):
+                worker = await self._idle.get()
+            return await self._run(worker, filename, shm, size, is_disconnected)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _share(self, file_content: FileContent, size: int) -> shared_memory.SharedMemory:
+        """Copy the upload into a new shared memory segment"""
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            if isinstance(file_content, (bytes, bytearray, memoryview)):
+                shm.buf[:size] = file_content
+                return shm
+
+            file_content.seek(0)
+            offset = 0
+            while offset < size:
+                chunk = file_content.read(min(COPY_CHUNK_BYTES, size - offset))
+                if not chunk:
+                    break
+                shm.buf[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+            file_content.seek(0)
+            return shm
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+
+    async def _run(self, worker: _Worker, filename: str, shm: shared_memory.SharedMemory,
+                   size: int, is_disconnected: Optional[DisconnectCheck]) -> SurveyData:
+        replied = False
+        try:
+            worker.conn.send((filename, shm.name, size))
+            reply = asyncio.ensure_future(asyncio.to_thread(worker.conn.recv))
+            try:
+                status, payload, metrics = await self._watch(reply, is_disconnected)
+            except (EOFError, OSError):
+                self.stats["crashes"] += 1
+                raise RuntimeError(f"Parse worker exited while parsing {filename}")
+            replied = True
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        finally:
+            if replied:
+                self._idle.put_nowait(worker)
+            else:
+                self._replace(worker)
+
+        STAGE_SECONDS.merge(metrics["stages"])
+        RESPONSES_PARSED.merge(metrics["parsed"])
+        RESPONSES_FILTERED.merge(metrics["filtered"])
+        if status == "invalid":
+            raise ValueError(payload)
+        if status == "error":
+            raise RuntimeError(f"Parsing {filename} failed: {payload}")
+        return payload
+
+    async def _watch(self, task: asyncio.Future, is_disconnected: Optional[DisconnectCheck]):
+        """Result of task, unless it times out or the client goes away first"""
+        # An abandoned task fails later (killed worker, closed upload); nobody reads that error
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        waiting = {task}
+        watcher = None
+        if is_disconnected is not None:
+            watcher = asyncio.ensure_future(self._wait_disconnect(is_disconnected))
+            waiting.add(watcher)
+        try:
+            done, _ = await asyncio.wait(waiting, timeout=self.timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+        if task in done:
+            return task.result()
+        if watcher is not None and watcher in done:
+            self.stats["disconnects"] += 1
+            raise ValueError("Client disconnected before the upload was parsed")
+        self.stats["timeouts"] += 1
+        raise ValueError(f"Parsing took longer than the {self.timeout:g}s limit")
+
+    async def _wait_disconnect(self, is_disconnected: DisconnectCheck):
+        while not await is_disconnected():
+            await asyncio.sleep(self.poll_interval)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Parse counters plus worker occupancy"""
+        idle = self._idle.qsize() if self._idle is not None else 0
+        return {**self.stats, "workers": len(self._workers), "busy": len(self._workers) - idle}
+
+
+# Create singleton instance
+parse_pool = ParsePool(
+    workers=settings.parse_pool_workers,
+    timeout=settings.parse_timeout_seconds,
+    poll_interval=settings.parse_disconnect_poll_seconds
+)
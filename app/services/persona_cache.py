@@ -0,0 +1,125 @@
+import logging
+import asyncio
+import hashlib
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, List, Optional
+import numpy as np
+from cachetools import TTLCache
+from app.models import PlayerPersona
+from app.config import settings
+from app.services.file_validator import validator
+from app.services.text_vectors import TextColumn, as_text_array, update_digest
+
+logger = logging.getLogger(__name__)
+
+
+class PersonaCache:
+    """
+    Content-addressed persona cache
+
+    Keys hash the normalized responses and their respondent weights
+    together with the prompt, model and generation-config version, so a
+    re-uploaded survey maps to the same entry. Lookups go through a
+    bounded in-process LRU with TTL first, then an optional SQLite tier
+    that survives restarts and is shared by workers. The SQLite tier is
+    queried in a thread, off the event loop.
+    """
+
+    def __init__(self):
+        self.logger = logger
+        self.enabled = settings.persona_cache_enabled
+        self.ttl_seconds = settings.persona_cache_ttl_seconds
+        self.sqlite_path = settings.persona_cache_sqlite_path
+        self._memory = TTLCache(maxsize=settings.persona_cache_max_entries, ttl=self.ttl_seconds)
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+        if self.sqlite_path:
+            self._init_sqlite()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.sqlite_path, timeout=5)
+
+    def _init_sqlite(self):
+        """Create the on-disk tier (WAL so several workers can share it)"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS personas ("
+                "key TEXT PRIMARY KEY, persona TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+        self.logger.info(f"Persona cache SQLite tier at {self.sqlite_path}")
+
+    def make_key(self, survey_responses: TextColumn, version: str, weights: Optional[List[int]] = None) -> str:
+        """Hash of the normalized responses and their weights plus the prompt/model/config version"""
+        responses = validator.normalize_column(as_text_array(survey_responses))
+        weights = np.ones(len(responses), dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+        digest = hashlib.sha256(version.encode("utf-8"))
+        update_digest(digest, responses)
+        digest.update(weights.tobytes())
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[PlayerPersona]:
+        """Look up a persona, promoting disk hits into memory"""
+        persona = self._memory.get(key)
+        if persona is not None:
+            self.stats["memory_hits"] += 1
+            return persona
+
+        if self.sqlite_path:
+            persona = await asyncio.to_thread(self._disk_get, key)
+            if persona is not None:
+                self.stats["disk_hits"] += 1
+                self._memory[key] = persona
+                return persona
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, persona: PlayerPersona):
+        """Store a persona in every tier"""
+        self._memory[key] = persona
+        if self.sqlite_path:
+            await asyncio.to_thread(self._disk_set, key, persona)
+        self.stats["stores"] += 1
+
+    def _disk_get(self, key: str) -> Optional[PlayerPersona]:
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT persona FROM personas WHERE key = ? AND created_at >= ?",
+                    (key, time.time() - self.ttl_seconds)
+                ).fetchone()
+            return PlayerPersona.model_validate_json(row[0]) if row else None
+        except Exception as e:
+            # A broken disk tier must never fail an analysis
+            self.logger.warning(f"Persona cache read failed: {str(e)}")
+            return None
+
+    def _disk_set(self, key: str, persona: PlayerPersona):
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO personas (key, persona, created_at) VALUES (?, ?, ?)",
+                    (key, persona.model_dump_json(), now)
+                )
+                conn.execute("DELETE FROM personas WHERE created_at < ?", (now - self.ttl_seconds,))
+        except Exception as e:
+            self.logger.warning(f"Persona cache write failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Hit/miss counters plus current in-memory size"""
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "hits": hits,
+            "lookups": lookups,
+            "memory_entries": len(self._memory),
+        }
+
+
+# Create singleton instance
+persona_cache = PersonaCache()
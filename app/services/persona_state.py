@@ -0,0 +1,185 @@
+import logging
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import asynccontextmanager, closing
+from typing import Dict, Optional
+import numpy as np
+from cachetools import TTLCache
+from app.models import PlayerPersona, SurveyData
+from app.config import settings
+from app.services.text_vectors import row_hashes, HASH_MULTIPLIER
+
+logger = logging.getLogger(__name__)
+
+# How rows of a re-uploaded survey are matched against the ones already analyzed
+MATCH_MODES = ("content", "respondent_id")
+
+
+def row_keys(survey_data: SurveyData, match_on: str) -> np.ndarray:
+    """
+    One uint64 key per row: its respondent ID, or ID and text together
+
+    With "content" an edited answer counts as a new response; with
+    "respondent_id" only rows with IDs not seen before do.
+    """
+    if match_on not in MATCH_MODES:
+        raise ValueError(f"match_on must be one of: {', '.join(MATCH_MODES)}")
+    keys = row_hashes(survey_data.respondent_ids)
+    if match_on == "content":
+        keys = (keys * HASH_MULTIPLIER) ^ row_hashes(survey_data.texts)
+    return keys
+
+
+class PersonaState:
+    """The running persona of one survey and the rows it already covers"""
+
+    def __init__(self, persona: PlayerPersona, summary: str, seen: np.ndarray, match_on: str,
+                 version: str, updated_at: Optional[float] = None):
+        self.persona = persona
+        self.summary = summary
+        # Sorted, unique row keys (8 bytes per analyzed response)
+        self.seen = seen
+        self.match_on = match_on
+        self.version = version
+        self.updated_at = updated_at or time.time()
+
+    @property
+    def responses_count(self) -> int:
+        return len(self.seen)
+
+    def new_rows(self, keys: np.ndarray) -> np.ndarray:
+        """Indices of the rows whose keys were not analyzed yet"""
+        return np.flatnonzero(~np.isin(keys, self.seen))
+
+
+class PersonaStateStore:
+    """
+    Running personas of live surveys, keyed by a client-chosen survey_key
+
+    Holds, per survey, the latest persona, the model's compact running
+    summary and the keys of every row already analyzed, so a re-uploaded
+    survey only has its new rows sent to Gemini. Lookups go through a
+    bounded in-process LRU with TTL first, then an optional SQLite tier.
+    Updates for one key are serialized with a per-key lock.
+    """
+
+    def __init__(self):
+        self.logger = logger
+        self.ttl_seconds = settings.persona_state_ttl_seconds
+        self.sqlite_path = settings.persona_state_sqlite_path
+        self._memory = TTLCache(maxsize=settings.persona_state_max_entries, ttl=self.ttl_seconds)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+        if self.sqlite_path:
+            self._init_sqlite()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.sqlite_path, timeout=5)
+
+    def _init_sqlite(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS persona_states ("
+                "key TEXT PRIMARY KEY, state TEXT NOT NULL, seen BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+        self.logger.info(f"Persona state SQLite tier at {self.sqlite_path}")
+
+    def make_key(self, survey_key: str) -> str:
+        """Storage key of a client survey_key"""
+        if not survey_key or len(survey_key) > 200:
+            raise ValueError("survey_key must be 1-200 characters")
+        return hashlib.sha256(survey_key.encode("utf-8")).hexdigest()
+
+    @asynccontextmanager
+    async def lock(self, key: str):
+        """Hold the update lock of one survey"""
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    def get(self, key: str) -> Optional[PersonaState]:
+        """Look up a survey's state, promoting disk hits into memory"""
+        state = self._memory.get(key)
+        if state is not None:
+            self.stats["memory_hits"] += 1
+            return state
+
+        if self.sqlite_path:
+            state = self._disk_get(key)
+            if state is not None:
+                self.stats["disk_hits"] += 1
+                self._memory[key] = state
+                return state
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, state: PersonaState):
+        """Store a survey's state in every tier"""
+        self._memory[key] = state
+        if self.sqlite_path:
+            self._disk_set(key, state)
+        self.stats["stores"] += 1
+
+    def _disk_get(self, key: str) -> Optional[PersonaState]:
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT state, seen, updated_at FROM persona_states WHERE key = ? AND updated_at >= ?",
+                    (key, time.time() - self.ttl_seconds)
+                ).fetchone()
+            if row is None:
+                return None
+            data = json.loads(row[0])
+            return PersonaState(
+                persona=PlayerPersona.model_validate(data["persona"]),
+                summary=data["summary"],
+                seen=np.frombuffer(row[1], dtype=np.uint64),
+                match_on=data["match_on"],
+                version=data["version"],
+                updated_at=row[2]
+            )
+        except Exception as e:
+            # A broken disk tier only costs a full re-analysis
+            self.logger.warning(f"Persona state read failed: {str(e)}")
+            return None
+
+    def _disk_set(self, key: str, state: PersonaState):
+        data = {
+            "persona": state.persona.model_dump(),
+            "summary": state.summary,
+            "match_on": state.match_on,
+            "version": state.version,
+        }
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO persona_states (key, state, seen, updated_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(data), state.seen.tobytes(), state.updated_at)
+                )
+                conn.execute(
+                    "DELETE FROM persona_states WHERE updated_at < ?", (time.time() - self.ttl_seconds,)
+                )
+        except Exception as e:
+            self.logger.warning(f"Persona state write failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Hit/miss counters plus current in-memory size"""
+        return {**self.stats, "memory_entries": len(self._memory), "updates_in_progress": len(self._locks)}
+
+
+# Create singleton instance
+persona_states = PersonaStateStore()
@@ -0,0 +1,97 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+# Persona sections in the order the prompt asks for them
+PERSONA_SECTIONS = ("archetype_name", "demographics", "motivations", "pain_points", "spending_habits")
+
+
+class PersonaStreamParser:
+    """
+    Incremental parser for the persona JSON object
+
+    Streamed text is fed in as it arrives; each top-level "key": value pair
+    is returned as soon as its value is complete, without waiting for the
+    rest of the object. Markdown code fences around the object are skipped.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Add streamed text; returns the top-level (key, value) pairs it completed"""
+        self.text += chunk
+        completed = []
+
+        while self._pos < len(self.text) and not self.done:
+            pos = self._pos
+            char = self.text[pos]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key_start is not None:
+                        self._key = json.loads(self.text[self._key_start:pos + 1])
+                        self._key_start = None
+                    elif self._depth == 1 and self._value_start is not None:
+                        completed.append(self._complete(pos + 1))
+                continue
+
+            if self._depth == 0:
+                # Skip anything before the object (e.g. a ```json fence)
+                if char == "{":
+                    self._depth = 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._key is None:
+                        self._key_start = pos
+                    elif self._value_start is None:
+                        self._value_start = pos
+            elif char in "{[":
+                if self._depth == 1 and self._value_start is None:
+                    self._value_start = pos
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    completed.append(self._complete(pos + 1))
+                elif self._depth == 0:
+                    # Object closed; flush a trailing scalar value
+                    if self._value_start is not None:
+                        completed.append(self._complete(pos))
+                    self.done = True
+            elif self._depth == 1:
+                if char == "," and self._value_start is not None:
+                    completed.append(self._complete(pos))
+                elif self._key is not None and self._value_start is None and not char.isspace() and char != ":":
+                    # Number, true/false/null
+                    self._value_start = pos
+
+        return completed
+
+    def _complete(self, end: int) -> Tuple[str, Any]:
+        key = self._key
+        value = json.loads(self.text[self._value_start:end])
+        self._key = None
+        self._value_start = None
+        return key, value
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,169 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.config import settings
+from app.services.text_vectors import as_text_array, TextColumn
+from app.services.token_estimator import CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# Common words that say nothing about what a response is about
+STOP_WORDS = {
+    "about", "after", "again", "also", "been", "being", "could", "does", "doesn't", "don't",
+    "even", "from", "have", "having", "just", "like", "made", "make", "more", "most", "much",
+    "only", "other", "really", "some", "than", "that", "their", "them", "then", "there",
+    "they", "thing", "things", "think", "this", "very", "want", "were", "what", "when",
+    "which", "while", "will", "with", "would", "your",
+}
+
+
+class PromptBudget:
+    """
+    Keep analysis prompts within an input token budget
+
+    Token counts are estimated locally. When a survey is over budget, a
+    stratified sample is kept instead: responses are grouped by length
+    bucket, keyword cluster and position in the file, every stratum gets
+    a share of the budget proportional to the respondents in it, and each
+    stratum is sampled systematically by respondent weight. Sampling is
+    deterministic, so the same survey always produces the same prompt.
+    """
+
+    def __init__(self, input_token_budget: int, keyword_clusters: int, length_buckets: int, order_buckets: int):
+        self.logger = logger
+        self.input_token_budget = input_token_budget
+        self.keyword_clusters = keyword_clusters
+        self.length_buckets = length_buckets
+        self.order_buckets = order_buckets
+
+    def line_tokens(self, survey_responses: TextColumn) -> np.ndarray:
+        """Estimated tokens of each "- {response}" prompt line"""
+        lengths = pc.utf8_length(as_text_array(survey_responses)).to_numpy(zero_copy_only=False)
+        return -(-lengths // CHARS_PER_TOKEN) + 1
+
+    def keywords(self, words: pa.Array) -> List[str]:
+        """Most frequent content words across the survey"""
+        words = words.filter(pc.greater_equal(pc.utf8_length(words), 4))
+        counts = pc.value_counts(words).to_pylist()
+        counts.sort(key=lambda item: (-item["counts"], item["values"]))
+        return [
+            item["values"] for item in counts if item["values"] not in STOP_WORDS
+        ][:self.keyword_clusters]
+
+    def strata(self, survey_responses: TextColumn) -> np.ndarray:
+        """Stratum id of each response (length x keyword cluster x order)"""
+        count = len(survey_responses)
+        texts = pc.utf8_lower(as_text_array(survey_responses))
+
+        lengths = pc.utf8_length(texts).to_numpy(zero_copy_only=False)
+        edges = np.quantile(lengths, np.linspace(0, 1, self.length_buckets + 1)[1:-1])
+        length_bucket = np.searchsorted(edges, lengths, side="right")
+
+        # Cluster = most frequent survey keyword the response mentions (last cluster: none)
+        split = pc.split_pattern_regex(texts, pattern=r"[^\p{L}\p{N}']+")
+        words = pc.list_flatten(split)
+        rank = pc.index_in(words, value_set=pa.array(self.keywords(words), type=pa.string()))
+        rank = pc.fill_null(rank, self.keyword_clusters).to_numpy(zero_copy_only=False)
+        keyword_cluster = np.full(count, self.keyword_clusters, dtype=np.int64)
+        np.minimum.at(keyword_cluster, pc.list_parent_indices(split).to_numpy(zero_copy_only=False), rank)
+
+        order_bucket = np.arange(count) * self.order_buckets // max(count, 1)
+
+        return (length_bucket * (self.keyword_clusters + 1) + keyword_cluster) * self.order_buckets + order_bucket
+
+    def _allocate(self, strata: np.ndarray, weights: np.ndarray, sample_size: int) -> np.ndarray:
+        """Sample sample_size responses, proportional to respondents per stratum"""
+        _, stratum_of = np.unique(strata, return_inverse=True)
+        stratum_weights = np.bincount(stratum_of, weights=weights)
+        stratum_sizes = np.bincount(stratum_of)
+
+        # Largest-remainder allocation, at most every member of a stratum
+        quota = stratum_weights / stratum_weights.sum() * sample_size
+        picks = np.minimum(np.floor(quota).astype(np.int64), stratum_sizes)
+        remainder = sample_size - picks.sum()
+        if remainder > 0:
+            order = np.argsort(-(quota - picks), kind="stable")
+            extra = order[picks[order] < stratum_sizes[order]][:remainder]
+            picks[extra] += 1
+
+        selected = []
+        members_by_stratum = np.split(np.argsort(stratum_of, kind="stable"), np.cumsum(stratum_sizes)[:-1])
+        for members, k in zip(members_by_stratum, picks):
+            if k == 0:
+                continue
+            # Systematic sampling along cumulative weight, so heavier lines are likelier picks
+            cumulative = np.cumsum(weights[members])
+            targets = (np.arange(k) + 0.5) * cumulative[-1] / k
+            selected.append(members[np.unique(np.searchsorted(cumulative, targets))])
+
+        return np.sort(np.concatenate(selected)) if selected else np.empty(0, dtype=np.int64)
+
+    def fit(self, survey_responses: TextColumn, token_budget: Optional[int] = None,
+            weights: Optional[List[int]] = None) -> Tuple[List[int], Dict]:
+        """
+        Indices of the responses to include, and the sampling report
+
+        All responses are kept when the survey fits the budget (or the
+        budget is disabled with 0); included_indices is only listed when
+        a sample was taken. token_budget overrides the configured budget.
+        weights are the respondents each line stands for (1 each if not
+        given), as returned by ResponseDeduplicator.collapse.
+        """
+        budget = self.input_token_budget if token_budget is None else token_budget
+        survey_responses = as_text_array(survey_responses)
+        line_tokens = self.line_tokens(survey_responses)
+        total_tokens = int(line_tokens.sum())
+        report = {
+            "applied": False,
+            "budget_tokens": budget,
+            "input_responses": len(survey_responses),
+            "input_tokens_estimated": total_tokens,
+        }
+
+        if not budget or total_tokens <= budget:
+            report.update(included_responses=len(survey_responses), included_tokens_estimated=total_tokens)
+            return list(range(len(survey_responses))), report
+
+        strata = self.strata(survey_responses)
+        weights = np.ones(len(survey_responses)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+        # Shrink the target until the sample fits (usually one or two passes)
+        sample_size = max(1, int(len(survey_responses) * budget / total_tokens))
+        while True:
+            selected = self._allocate(strata, weights, sample_size)
+            sample_tokens = int(line_tokens[selected].sum())
+            if sample_tokens <= budget or sample_size == 1:
+                break
+            sample_size = max(1, int(sample_size * budget / sample_tokens * 0.98))
+
+        included = selected.tolist()
+        report.update(
+            applied=True,
+            strata=len(np.unique(strata)),
+            included_responses=len(included),
+            included_indices=included,
+            included_tokens_estimated=sample_tokens,
+        )
+        self.logger.info(
+            f"Prompt budget: sampled {len(included)}/{len(survey_responses)} responses "
+            f"(~{sample_tokens}/{total_tokens} tokens, {report['strata']} strata)"
+        )
+        return included, report
+
+    def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
+        """Estimated USD cost of a call with the configured per-million prices"""
+        return (
+            input_tokens * settings.gemini_input_price_per_million
+            + output_tokens * settings.gemini_output_price_per_million
+        ) / 1_000_000
+
+
+# Create singleton instance
+prompt_budget = PromptBudget(
+    input_token_budget=settings.prompt_input_token_budget,
+    keyword_clusters=settings.prompt_sample_keyword_clusters,
+    length_buckets=settings.prompt_sample_length_buckets,
+    order_buckets=settings.prompt_sample_order_buckets
+)
@@ -0,0 +1,130 @@
+import logging
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from app.config import settings
+from app.services.metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Continuously refilling token bucket sized for one minute of budget"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until amount can be taken (0 if available now)"""
+        self._refill()
+        # A single request larger than a minute's budget waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMRateLimiter:
+    """
+    Admission control for LLM calls
+
+    A semaphore caps calls in flight, and token buckets enforce requests per
+    minute and tokens per minute. Callers queue until there is capacity
+    instead of failing with a quota error. Queue waits are recorded.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: int, tokens_per_minute: int):
+        self.logger = logger
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        # Serializes bucket waits so queued callers are admitted in order
+        self._bucket_lock = asyncio.Lock()
+        self.stats = {
+            "admitted": 0,
+            "waiting": 0,
+            "in_flight": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def _bucket_delay(self, estimated_tokens: int) -> float:
+        delays = [0.0]
+        if self._requests is not None:
+            delays.append(self._requests.delay_for(1))
+        if self._tokens is not None:
+            delays.append(self._tokens.delay_for(estimated_tokens))
+        return max(delays)
+
+    async def _wait_for_buckets(self, estimated_tokens: int):
+        async with self._bucket_lock:
+            delay = self._bucket_delay(estimated_tokens)
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = self._bucket_delay(estimated_tokens)
+
+            if self._requests is not None:
+                self._requests.consume(1)
+            if self._tokens is not None:
+                self._tokens.consume(estimated_tokens)
+
+    @asynccontextmanager
+    async def acquire(self, estimated_tokens: int):
+        """Wait for a concurrency slot and rate budget; yields the queue wait in seconds"""
+        start = time.monotonic()
+        self.stats["waiting"] += 1
+        try:
+            await self._semaphore.acquire()
+            try:
+                await self._wait_for_buckets(estimated_tokens)
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.stats["waiting"] -= 1
+
+        wait = time.monotonic() - start
+        STAGE_SECONDS.observe(wait, stage="llm_queue")
+        self.stats["admitted"] += 1
+        self.stats["total_wait_seconds"] += wait
+        self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], wait)
+        if wait > 1:
+            self.logger.info(f"LLM call waited {wait:.2f}s for capacity")
+
+        self.stats["in_flight"] += 1
+        try:
+            yield wait
+        finally:
+            self.stats["in_flight"] -= 1
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Queue-wait and occupancy counters"""
+        admitted = self.stats["admitted"]
+        return {
+            **self.stats,
+            "max_concurrency": self.max_concurrency,
+            "avg_wait_seconds": self.stats["total_wait_seconds"] / admitted if admitted else 0.0,
+        }
+
+
+# Shared by every Gemini call in the process
+llm_limiter = LLMRateLimiter(
+    max_concurrency=settings.gemini_max_concurrency,
+    requests_per_minute=settings.gemini_requests_per_minute,
+    tokens_per_minute=settings.gemini_tokens_per_minute
+)
@@ -0,0 +1,227 @@
+import logging
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.config import settings
+from app.services.text_vectors import byte_ngrams, as_text_array, TextColumn, HASH_MULTIPLIER
+from app.services.token_estimator import CHARS_PER_TOKEN
+from app.services.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# Weight suffix of a collapsed response in prompts, e.g. "great game (x37)"
+WEIGHT_SUFFIX_PATTERN = r" \(x\d+\)$"
+
+# Marks a MinHash bin that no gram of the text fell into
+_EMPTY_BIN = np.iinfo(np.uint64).max
+
+class ResponseDeduplicator:
+    """
+    Collapse duplicate and near-duplicate survey responses before prompting
+
+    Responses are grouped in three passes, all vectorized:
+    1. exact duplicates of the normalized text
+    2. identical after lowercasing and dropping punctuation ("Great game!!")
+    3. near-duplicates by MinHash over byte 4-grams, with LSH banding to
+       find candidates and the signature agreement to confirm them
+
+    Each group is sent once, as its first response and the group size as
+    its weight; prompts show the weight as a "(xN)" suffix.
+    Everything is sort/hash based, so cost grows near-linearly with the
+    number of responses.
+    """
+
+    def __init__(self, enabled: bool, num_perm: int, bands: int, threshold: float):
+        if num_perm % bands:
+            raise ValueError("dedup_num_perm must be a multiple of dedup_bands")
+        self.logger = logger
+        self.enabled = enabled
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+
+    def canonicalize(self, texts: pa.Array) -> pa.Array:
+        """Lowercase, drop punctuation/symbols and collapse whitespace"""
+        texts = pc.utf8_lower(texts)
+        texts = pc.replace_substring_regex(texts, pattern=r"[^\p{L}\p{N}]+", replacement=" ")
+        return pc.utf8_trim(texts, characters=" ")
+
+    def minhash(self, texts: Union[List[str], pa.Array]) -> np.ndarray:
+        """
+        (len(texts), num_perm) MinHash signatures over byte 4-grams
+
+        One-permutation hashing: each gram hash is routed to one of num_perm
+        bins and only the minimum per bin is kept, so every gram is hashed
+        once instead of num_perm times. Bins a short text leaves empty
+        borrow the next filled bin (rotation densification).
+        """
+        hashes, doc_ids = byte_ngrams(texts, n=4)
+        # High 32 bits pick the bin (multiply-shift), low 32 bits are the value
+        bins = (((hashes >> np.uint64(32)) * np.uint64(self.num_perm)) >> np.uint64(32)).astype(np.int64)
+        values = hashes & np.uint64(0xFFFFFFFF)
+
+        signatures = np.full(len(texts) * self.num_perm, _EMPTY_BIN, dtype=np.uint64)
+        np.minimum.at(signatures, doc_ids * self.num_perm + bins, values)
+        signatures = signatures.reshape(len(texts), self.num_perm)
+
+        empty = signatures == _EMPTY_BIN
+        if empty.any():
+            # Index of the next filled bin to the right, wrapping around
+            width = 2 * self.num_perm
+            filled_at = np.where(np.tile(empty, 2), width, np.arange(width))
+            next_filled = np.minimum.accumulate(filled_at[:, ::-1], axis=1)[:, ::-1][:, :self.num_perm]
+            distance = (next_filled - np.arange(self.num_perm)).astype(np.uint64)
+            borrowed = np.take_along_axis(signatures, next_filled % self.num_perm, axis=1)
+            # Mix in the distance so borrowed values differ from native ones
+            signatures = np.where(empty, borrowed ^ (distance * HASH_MULTIPLIER), signatures)
+
+        return signatures
+
+    def _near_duplicate_labels(self, signatures: np.ndarray) -> np.ndarray:
+        """Group label (lowest member index) for each signature"""
+        count = len(signatures)
+        rows = self.num_perm // self.bands
+        columns = np.ascontiguousarray(signatures.T)
+        sources, targets = [], []
+
+        for band in range(self.bands):
+            # Fold the band's rows into one bucket key
+            keys = columns[band * rows].copy()
+            for col in range(band * rows + 1, (band + 1) * rows):
+                keys = keys * HASH_MULTIPLIER ^ columns[col]
+            _, buckets = np.unique(keys, return_inverse=True)
+
+            # Pair every bucket member with the bucket's first member
+            first = np.full(buckets.max() + 1 if count else 0, count, dtype=np.int64)
+            np.minimum.at(first, buckets, np.arange(count))
+            representative = first[buckets]
+            candidates = np.flatnonzero(representative != np.arange(count))
+            if not len(candidates):
+                continue
+
+            # LSH only proposes pairs; confirm with the estimated Jaccard similarity
+            agreement = (signatures[candidates] == signatures[representative[candidates]]).mean(axis=1)
+            confirmed = candidates[agreement >= self.threshold]
+            sources.append(confirmed)
+            targets.append(representative[confirmed])
+
+        labels = np.arange(count)
+        if not sources:
+            return labels
+
+        # Connected components by label propagation with pointer jumping
+        sources = np.concatenate(sources)
+        targets = np.concatenate(targets)
+        while True:
+            previous = labels.copy()
+            np.minimum.at(labels, sources, labels[targets])
+            np.minimum.at(labels, targets, labels[sources])
+            labels = labels[labels]
+            if np.array_equal(labels, previous):
+                return labels
+
+    def collapse(self, responses: TextColumn) -> Tuple[List[str], List[int], List[int], Dict[str, int]]:
+        """
+        Collapse duplicate responses into weighted lines
+
+        Args:
+            responses: Normalized response texts (as produced by validate_file),
+                ideally the SurveyData.texts column itself
+
+        Returns:
+            (one response per group in first-seen order, respondents each
+            stands for, index of the response each came from, dedup report)
+        """
+        responses = as_text_array(responses)
+        if not self.enabled or not len(responses):
+            lines = responses.to_pylist()
+            weights = [1] * len(lines)
+            return lines, weights, list(range(len(lines))), self._report(responses, responses, weights, 0, 0)
+
+        with stage_timer("dedup"):
+            return self._collapse(responses)
+
+    def _collapse(self, responses: pa.Array) -> Tuple[List[str], List[int], List[int], Dict[str, int]]:
+
+        # Pass 1: exact duplicates
+        exact = responses.dictionary_encode()
+        exact_ids = exact.indices.to_numpy()
+        unique_texts = exact.dictionary
+
+        # Pass 2: case/punctuation variants
+        canonical = self.canonicalize(unique_texts).dictionary_encode()
+        canonical_ids = canonical.indices.to_numpy()[exact_ids]
+
+        # Pass 3: near-duplicates among the canonical forms
+        signatures = self.minhash(canonical.dictionary)
+        group_ids = self._near_duplicate_labels(signatures)[canonical_ids]
+
+        # One line per group: its first response, weighted by group size
+        group_ids = np.unique(group_ids, return_inverse=True)[1]
+        counts = np.bincount(group_ids)
+        first_seen = np.full(len(counts), len(responses), dtype=np.int64)
+        np.minimum.at(first_seen, group_ids, np.arange(len(responses)))
+        order = np.argsort(first_seen)
+
+        representatives = first_seen[order].tolist()
+        weights = counts[order].tolist()
+        # Only the group representatives become Python strings
+        lines = responses.take(pa.array(representatives)).to_pylist()
+
+        report = self._report(
+            responses,
+            lines,
+            weights,
+            exact_duplicates=len(responses) - len(unique_texts),
+            near_duplicates=len(unique_texts) - len(lines)
+        )
+        self.logger.info(
+            f"Dedup: {report['input_responses']} responses -> {report['unique_responses']} groups, "
+            f"~{report['tokens_saved']} tokens saved"
+        )
+        return lines, weights, representatives, report
+
+    def _report(self, responses: TextColumn, lines: TextColumn, weights: List[int],
+                exact_duplicates: int, near_duplicates: int) -> Dict[str, int]:
+        # Same per-line estimate as prompt chunking ("- {text}" plus newline)
+        tokens_before = self._prompt_tokens(responses)
+        tokens_after = self._prompt_tokens(weighted_lines(lines, weights))
+        return {
+            "input_responses": len(responses),
+            "unique_responses": len(lines),
+            "exact_duplicates": exact_duplicates,
+            "near_duplicates": near_duplicates,
+            "estimated_tokens_before": tokens_before,
+            "estimated_tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+        }
+
+    def _prompt_tokens(self, lines: TextColumn) -> int:
+        # estimate_tokens(line) + 1 per line, over the whole column at once
+        lengths = pc.utf8_length(as_text_array(lines)).to_numpy(zero_copy_only=False)
+        return int((-(-lengths // CHARS_PER_TOKEN) + 1).sum())
+
+def weighted_lines(responses: TextColumn, weights: Optional[List[int]] = None) -> pa.Array:
+    """
+    Prompt text of each response: " (xN)" appended when it stands for N > 1
+
+    A single response that happens to end in "(xN)" gets " (x1)", so the
+    last suffix on a prompt line is always its weight.
+    """
+    responses = as_text_array(responses)
+    if weights is None:
+        weights = np.ones(len(responses), dtype=np.int64)
+    weights = pa.array(np.asarray(weights, dtype=np.int64))
+    suffix = pc.binary_join_element_wise(" (x", pc.cast(weights, pa.string()), ")", "")
+    tagged = pc.or_(pc.greater(weights, 1), pc.match_substring_regex(responses, pattern=WEIGHT_SUFFIX_PATTERN))
+    return pc.if_else(tagged, pc.binary_join_element_wise(responses, suffix, ""), responses)
+
+
+# Create singleton instance
+deduplicator = ResponseDeduplicator(
+    enabled=settings.dedup_enabled,
+    num_perm=settings.dedup_num_perm,
+    bands=settings.dedup_bands,
+    threshold=settings.dedup_similarity_threshold
+)
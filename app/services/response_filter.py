@@ -0,0 +1,188 @@
+import logging
+from typing import Dict, List, Tuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.config import settings
+from app.services.text_vectors import as_text_array, byte_counts, TextColumn
+
+logger = logging.getLogger(__name__)
+
+# Rules in the order they are applied; a response is counted under the first rule that drops it
+RULES = ("min_length", "alpha_ratio", "stop_answer", "deny_pattern", "script")
+
+# Unicode scripts accepted by filter_scripts (RE2 script names)
+SCRIPTS = (
+    "Latin", "Cyrillic", "Greek", "Arabic", "Hebrew", "Devanagari", "Thai",
+    "Han", "Hiragana", "Katakana", "Hangul",
+)
+
+# Stop answers padded with more punctuation than this (relative to the longest one) are not looked up
+STOP_ANSWER_SLACK = 3
+
+
+def _ascii_letters(data: np.ndarray) -> np.ndarray:
+    # Setting bit 0x20 lowercases A-Z; the uint8 subtraction wraps everything below "a"
+    return (data | np.uint8(0x20)) - np.uint8(ord("a")) < 26
+
+
+def _spaces(data: np.ndarray) -> np.ndarray:
+    return data == ord(" ")
+
+
+def _canonical(texts: pa.Array) -> pa.Array:
+    """Lowercase, punctuation/symbols collapsed to single spaces, trimmed"""
+    texts = pc.utf8_lower(texts)
+    texts = pc.replace_substring_regex(texts, pattern=r"[^\p{L}\p{N}]+", replacement=" ")
+    return pc.utf8_trim(texts, characters=" ")
+
+
+class ResponseFilter:
+    """
+    Drop low-signal responses before they reach dedup and the prompt
+
+    Answers like "n/a", "asdf", a lone emoji, a bare URL or a repeated
+    column header carry nothing a persona can use but still cost prompt
+    tokens. Each rule is one vectorized pass (Arrow kernels, or a NumPy
+    scan of the UTF-8 bytes) over what is left after the previous rules,
+    so the cheap rules shrink the input of the regex ones. Regexes only
+    see the texts that need them: short ones for stop answers, non-ASCII
+    ones for letter counts.
+
+    1. min_length: fewer than min_chars characters
+    2. alpha_ratio: letters make up less than min_alpha_ratio of the
+       non-space characters
+    3. stop_answer: the whole answer, lowercased and without punctuation,
+       is on the stop list
+    4. deny_pattern: matches one of the (RE2, case-insensitive) patterns
+    5. script: most letters are not in one of the allowed scripts. This
+       is a cheap language guess at the script level; it tells Russian
+       from English but not French from English.
+    """
+
+    def __init__(self, enabled: bool, min_chars: int, min_alpha_ratio: float, stop_answers: List[str],
+                 deny_patterns: List[str], scripts: List[str]):
+        self.logger = logger
+        self.enabled = enabled
+        self.min_chars = min_chars
+        self.min_alpha_ratio = min_alpha_ratio
+        self.stop_answers = pa.array(
+            sorted(set(_canonical(pa.array(stop_answers, type=pa.string())).to_pylist()) - {""}),
+            type=pa.string()
+        )
+        self.stop_answer_chars = max(pc.utf8_length(self.stop_answers).to_pylist(), default=0)
+        self.deny_pattern = "|".join(f"(?:{pattern})" for pattern in deny_patterns)
+        if self.deny_pattern:
+            try:
+                pc.match_substring_regex(pa.array([""]), pattern=self.deny_pattern, ignore_case=True)
+            except pa.ArrowInvalid as e:
+                raise ValueError(f"Invalid filter_deny_patterns: {str(e)}")
+
+        unknown = set(scripts) - set(SCRIPTS)
+        if unknown:
+            raise ValueError(f"Unknown filter_scripts {sorted(unknown)}; choose from: {', '.join(SCRIPTS)}")
+        self.scripts = list(scripts)
+        self.script_pattern = "[" + "".join(f"\\p{{{script}}}" for script in scripts) + "]" if scripts else ""
+
+    def _letter_counts(self, texts: pa.Array, non_ascii: np.ndarray, pattern: str,
+                       ascii_letters: bool) -> np.ndarray:
+        """Letters per text matching pattern; only texts with non-ASCII bytes go through the regex"""
+        if ascii_letters:
+            counts = byte_counts(texts, _ascii_letters)
+        else:
+            counts = np.zeros(len(texts), dtype=np.int64)
+        rows = np.flatnonzero(non_ascii)
+        if len(rows):
+            counts[rows] = pc.count_substring_regex(
+                texts.take(pa.array(rows)), pattern=pattern
+            ).to_numpy(zero_copy_only=False)
+        return counts
+
+    def _drops(self, rule: str, texts: pa.Array) -> np.ndarray:
+        """Boolean mask of the texts one rule drops"""
+        lengths = pc.utf8_length(texts).to_numpy(zero_copy_only=False)
+        if rule == "min_length":
+            return lengths < self.min_chars
+
+        if rule == "stop_answer":
+            # Only short texts can be a stop answer; the regex canonicalization is the slow part
+            rows = np.flatnonzero(lengths <= STOP_ANSWER_SLACK * self.stop_answer_chars)
+            drops = np.zeros(len(texts), dtype=bool)
+            if len(rows):
+                candidates = _canonical(texts.take(pa.array(rows)))
+                drops[rows] = pc.is_in(candidates, value_set=self.stop_answers).to_numpy(zero_copy_only=False)
+            return drops
+
+        if rule == "deny_pattern":
+            return pc.match_substring_regex(
+                texts, pattern=self.deny_pattern, ignore_case=True
+            ).to_numpy(zero_copy_only=False)
+
+        # Letter counting is a byte scan for ASCII texts and a regex for the rest
+        non_ascii = ~pc.string_is_ascii(texts).to_numpy(zero_copy_only=False)
+        letters = self._letter_counts(texts, non_ascii, r"[\p{L}\p{M}]", ascii_letters=True)
+        if rule == "alpha_ratio":
+            # Texts are normalized, so whitespace is single spaces
+            chars = lengths - byte_counts(texts, _spaces)
+            return letters < chars * self.min_alpha_ratio
+
+        # script: allowed letters are fewer than half of all letters
+        allowed = self._letter_counts(texts, non_ascii, self.script_pattern, ascii_letters="Latin" in self.scripts)
+        return allowed * 2 < letters
+
+    def _active_rules(self) -> List[str]:
+        active = {
+            "min_length": self.min_chars > 0,
+            "alpha_ratio": self.min_alpha_ratio > 0,
+            "stop_answer": len(self.stop_answers) > 0,
+            "deny_pattern": bool(self.deny_pattern),
+            "script": bool(self.script_pattern),
+        }
+        return [rule for rule in RULES if active[rule]]
+
+    def apply(self, texts: TextColumn) -> Tuple[np.ndarray, Dict]:
+        """
+        Indices of the responses to keep, and a report of what each rule dropped
+
+        Args:
+            texts: Normalized response texts (no nulls)
+
+        Returns:
+            (sorted row indices kept, filter report)
+        """
+        texts = as_text_array(texts)
+        kept = np.arange(len(texts), dtype=np.int64)
+        dropped = {rule: 0 for rule in RULES}
+
+        if self.enabled:
+            remaining = texts
+            for rule in self._active_rules():
+                if not len(kept):
+                    break
+                drops = self._drops(rule, remaining)
+                dropped[rule] = int(np.count_nonzero(drops))
+                if dropped[rule]:
+                    kept = kept[~drops]
+                    remaining = remaining.filter(pa.array(~drops))
+
+        report = {
+            "enabled": self.enabled,
+            "input_responses": len(texts),
+            "kept_responses": len(kept),
+            "dropped_responses": len(texts) - len(kept),
+            "dropped_by_rule": dropped,
+        }
+        if report["dropped_responses"]:
+            self.logger.info(f"Pre-filter dropped {report['dropped_responses']}/{len(texts)} responses: {dropped}")
+        return kept, report
+
+
+# Create singleton instance
+response_filter = ResponseFilter(
+    enabled=settings.filter_enabled,
+    min_chars=settings.filter_min_chars,
+    min_alpha_ratio=settings.filter_min_alpha_ratio,
+    stop_answers=settings.filter_stop_answers,
+    deny_patterns=settings.filter_deny_patterns,
+    scripts=settings.filter_scripts
+)
@@ -0,0 +1,291 @@
+import logging
+import asyncio
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.models import SurveyData
+from app.config import settings
+from app.services.metrics import stage_timer
+from app.services.prompt_budget import STOP_WORDS
+from app.services.response_dedup import deduplicator
+from app.services.text_vectors import TextColumn, as_text_array
+
+logger = logging.getLogger(__name__)
+
+# Short function words on top of the prompt sampler's list (which only has 4+ letter words)
+SHORT_STOP_WORDS = {
+    "and", "are", "but", "can", "did", "for", "get", "got", "had", "has", "her", "him", "his", "how",
+    "its", "it's", "not", "now", "one", "our", "out", "she", "the", "too", "was", "way", "who", "why",
+    "you", "i'm", "i've", "all", "any", "lot",
+}
+
+# Punctuation stripped from the ends of whitespace-separated words
+WORD_PUNCTUATION = ".,!?;:\"()[]{}<>*~_…-'`"
+
+# Rows scored per block in the final assignment pass
+ASSIGN_BLOCK_ROWS = 65536
+
+
+class TermMatrix:
+    """
+    Sparse TF-IDF rows, as parallel (row, feature, weight) entry arrays
+
+    Entries are grouped by row in row order; indptr[i]:indptr[i + 1] are
+    the entries of row i. A word repeated in a row has one entry per use,
+    which adds up to its term frequency.
+    """
+
+    def __init__(self, rows: np.ndarray, features: np.ndarray, weights: np.ndarray, vocabulary: List[str], count: int):
+        self.rows = rows
+        self.features = features
+        self.weights = weights
+        self.vocabulary = vocabulary
+        self.count = count
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=count))])
+
+    def dense(self, rows: np.ndarray) -> np.ndarray:
+        """L2-normalized dense float32 matrix of the given rows"""
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        local = np.repeat(np.arange(len(rows)), lengths)
+        entries = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+
+        size = len(self.vocabulary)
+        matrix = np.bincount(
+            local * size + self.features[entries], weights=self.weights[entries], minlength=len(rows) * size
+        ).reshape(len(rows), size).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+
+class ResponseSegmenter:
+    """
+    Split a survey into clusters of similar responses, one persona each
+
+    Responses are turned into TF-IDF vectors over the survey's most
+    frequent words with Arrow string kernels (no per-row Python), then
+    grouped with mini-batch spherical k-means in NumPy: centroids are
+    trained on small random batches and every response is assigned in one
+    sparse pass at the end, so half a million responses cluster in seconds.
+    Clustering is seeded and therefore deterministic for a given survey.
+
+    Each cluster is then deduplicated and analyzed on its own, concurrently
+    and under a smaller per-cluster token budget than the single prompt.
+    """
+
+    def __init__(self, vocabulary_size: int, batch_size: int, iterations: int, seed: int = 0):
+        self.logger = logger
+        self.vocabulary_size = vocabulary_size
+        self.batch_size = batch_size
+        self.iterations = iterations
+        self.seed = seed
+
+    def vectorize(self, survey_responses: TextColumn) -> TermMatrix:
+        """TF-IDF term matrix of the responses over their vocabulary_size most frequent words"""
+        texts = as_text_array(survey_responses)
+        count = len(texts)
+        words = pc.ascii_split_whitespace(pc.utf8_lower(texts))
+        rows = pc.list_parent_indices(words).to_numpy(zero_copy_only=False)
+        encoded = pc.dictionary_encode(pc.utf8_trim(pc.list_flatten(words), characters=WORD_PUNCTUATION))
+        terms = encoded.dictionary
+        term_ids = encoded.indices.to_numpy(zero_copy_only=False)
+
+        # Vocabulary: the most used content words, minus ones nearly every response has
+        term_counts = np.bincount(term_ids, minlength=len(terms))
+        usable = (
+            (pc.utf8_length(terms).to_numpy(zero_copy_only=False) >= 3)
+            & ~pc.is_in(terms, value_set=pa.array(sorted(STOP_WORDS | SHORT_STOP_WORDS))).to_numpy(zero_copy_only=False)
+            & (term_counts >= 2)
+            & (term_counts <= max(2, count // 2))
+        )
+        candidates = np.flatnonzero(usable)
+        selected = candidates[np.argsort(-term_counts[candidates], kind="stable")[:self.vocabulary_size]]
+        feature_of_term = np.full(len(terms), -1, dtype=np.int64)
+        feature_of_term[selected] = np.arange(len(selected))
+
+        # Smoothed IDF from term counts (short answers rarely repeat a word)
+        idf = np.log((1 + count) / (1 + term_counts[selected])) + 1
+        features = feature_of_term[term_ids]
+        keep = features >= 0
+        features = features[keep]
+        return TermMatrix(
+            rows=rows[keep], features=features, weights=idf[features],
+            vocabulary=terms.take(pa.array(selected, type=pa.int64())).to_pylist(), count=count
+        )
+
+    def cluster(self, survey_responses: TextColumn, clusters: int) -> Tuple[np.ndarray, Dict]:
+        """
+        Cluster label of every response (0 = largest cluster), and a report
+
+        The report lists each cluster's size and most characteristic words.
+        Responses without any vocabulary word join the largest cluster.
+        """
+        start = time.perf_counter()
+        with stage_timer("segment_vectorize"):
+            matrix = self.vectorize(survey_responses)
+
+        count = matrix.count
+        requested, clusters = clusters, max(1, min(clusters, count))
+        with stage_timer("segment_kmeans"):
+            if not matrix.vocabulary or clusters == 1:
+                labels, centroids = np.zeros(count, dtype=np.int64), np.zeros((1, len(matrix.vocabulary)), np.float32)
+            else:
+                centroids = self._fit(matrix, clusters)
+                labels = self._assign(matrix, centroids)
+
+        # Featureless rows score 0 everywhere; give them to the biggest cluster
+        featureless = np.diff(matrix.indptr) == 0
+        sizes = np.bincount(labels[~featureless], minlength=len(centroids))
+        labels[featureless] = int(np.argmax(sizes)) if len(sizes) else 0
+
+        # Renumber by size, dropping clusters nothing was assigned to
+        sizes = np.bincount(labels, minlength=len(centroids))
+        order = [idx for idx in np.argsort(-sizes, kind="stable") if sizes[idx] > 0]
+        relabel = np.full(len(centroids), -1, dtype=np.int64)
+        relabel[order] = np.arange(len(order))
+        labels = relabel[labels]
+
+        report = {
+            "clusters": len(order),
+            "requested_clusters": requested,
+            "responses": count,
+            "vocabulary_size": len(matrix.vocabulary),
+            "featureless_responses": int(featureless.sum()),
+            "seconds": round(time.perf_counter() - start, 3),
+            "sizes": [int(sizes[idx]) for idx in order],
+            "top_terms": [self._top_terms(centroids[idx], matrix.vocabulary) for idx in order],
+        }
+        self.logger.info(
+            f"Segmented {count} responses into {len(order)} clusters {report['sizes']} in {report['seconds']}s"
+        )
+        return labels, report
+
+    def _fit(self, matrix: TermMatrix, clusters: int) -> np.ndarray:
+        """Mini-batch spherical k-means centroids (unit rows)"""
+        rng = np.random.default_rng(self.seed)
+        batch_size = min(self.batch_size, matrix.count)
+        centroids = self._init_centroids(matrix.dense(rng.choice(matrix.count, size=batch_size, replace=False)),
+                                         clusters, rng)
+        seen = np.zeros(len(centroids))
+
+        # Small surveys converge in a few passes over the data
+        iterations = min(self.iterations, max(10, 10 * matrix.count // batch_size))
+        for _ in range(iterations):
+            batch = matrix.dense(rng.integers(matrix.count, size=batch_size))
+            nearest = np.argmax(batch @ centroids.T, axis=1)
+            batch_counts = np.bincount(nearest, minlength=len(centroids))
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, batch)
+
+            # Per-centroid learning rate 1/(points seen so far), as in Sculley's mini-batch k-means
+            seen += batch_counts
+            moved = batch_counts > 0
+            rate = (batch_counts[moved] / seen[moved])[:, None]
+            centroids[moved] = (1 - rate) * centroids[moved] + rate * sums[moved] / batch_counts[moved][:, None]
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            np.divide(centroids, norms, out=centroids, where=norms > 0)
+
+        return centroids
+
+    def _init_centroids(self, sample: np.ndarray, clusters: int, rng: np.random.Generator) -> np.ndarray:
+        """k-means++ seeding on a sample, with cosine distance"""
+        sample = sample[np.linalg.norm(sample, axis=1) > 0]
+        if not len(sample):
+            return np.zeros((1, sample.shape[1]), dtype=np.float32)
+
+        chosen = [int(rng.integers(len(sample)))]
+        distance = 1 - sample @ sample[chosen[0]]
+        for _ in range(min(clusters, len(sample)) - 1):
+            weights = np.maximum(distance, 0) ** 2
+            if weights.sum() <= 0:
+                break
+            chosen.append(int(rng.choice(len(sample), p=weights / weights.sum())))
+            distance = np.minimum(distance, 1 - sample @ sample[chosen[-1]])
+        return sample[chosen].copy()
+
+    def _assign(self, matrix: TermMatrix, centroids: np.ndarray) -> np.ndarray:
+        """Nearest centroid of every row in one sparse pass (cosine, so row norms don't matter)"""
+        labels = np.empty(matrix.count, dtype=np.int64)
+        for first in range(0, matrix.count, ASSIGN_BLOCK_ROWS):
+            last = min(first + ASSIGN_BLOCK_ROWS, matrix.count)
+            entries = slice(matrix.indptr[first], matrix.indptr[last])
+            rows = matrix.rows[entries] - first
+            features, weights = matrix.features[entries], matrix.weights[entries]
+            scores = np.stack([
+                np.bincount(rows, weights=weights * centroid[features], minlength=last - first)
+                for centroid in centroids
+            ], axis=1)
+            labels[first:last] = np.argmax(scores, axis=1)
+        return labels
+
+    def _top_terms(self, centroid: np.ndarray, vocabulary: List[str], limit: int = 8) -> List[str]:
+        top = np.argsort(-centroid, kind="stable")[:limit]
+        return [vocabulary[idx] for idx in top if centroid[idx] > 0]
+
+    async def analyze(self, survey_data: SurveyData, clusters: int) -> Tuple[List[Dict], Dict]:
+        """
+        One persona per cluster of responses
+
+        Returns (segments, clustering report). Each segment has its cluster
+        index, size and share of respondents, top terms, and either a
+        persona with its analysis metadata or the error that stopped it.
+        """
+        from app.services.gemini_analyzer import analyzer
+
+        labels, report = await asyncio.to_thread(self.cluster, survey_data.texts, clusters)
+        semaphore = asyncio.Semaphore(settings.segment_concurrency)
+
+        async def analyze_cluster(idx: int) -> Dict:
+            members = pa.array(np.flatnonzero(labels == idx), type=pa.int64())
+            segment = {
+                "cluster": idx,
+                "size": report["sizes"][idx],
+                "share": round(report["sizes"][idx] / len(survey_data), 4),
+                "top_terms": report["top_terms"][idx],
+            }
+            async with semaphore:
+                try:
+                    response_texts, weights, representatives, dedup_report = await asyncio.to_thread(
+                        deduplicator.collapse, survey_data.texts.take(members)
+                    )
+                    respondent_ids = survey_data.respondent_ids.take(members).take(
+                        pa.array(representatives, type=pa.int64())
+                    ).to_pylist()
+                    persona, metadata = await analyzer.analyze_survey_with_metadata(
+                        response_texts, respondent_ids=respondent_ids,
+                        token_budget=settings.segment_input_token_budget, weights=weights
+                    )
+                except Exception as e:
+                    # One failed cluster doesn't sink the others
+                    self.logger.error(f"Segment {idx} analysis failed: {str(e)}")
+                    return {
+                        **segment,
+                        "status": "error",
+                        "error_type": "validation_error" if isinstance(e, ValueError) else "analysis_error",
+                        "message": str(e) if isinstance(e, ValueError) else "Failed to generate persona",
+                    }
+            return {
+                **segment,
+                "status": "success",
+                "persona": persona.dict(),
+                "metadata": {"dedup": dedup_report, **metadata},
+            }
+
+        tasks = [asyncio.ensure_future(analyze_cluster(idx)) for idx in range(report["clusters"])]
+        try:
+            segments = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return list(segments), report
+
+
+# Create singleton instance
+segmenter = ResponseSegmenter(
+    vocabulary_size=settings.segment_vocabulary_size,
+    batch_size=settings.segment_batch_size,
+    iterations=settings.segment_iterations
+)
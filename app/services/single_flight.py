@@ -0,0 +1,67 @@
+import logging
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One in-flight call and the number of requests awaiting it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls onto one shared task
+
+    The first caller for a key starts the work; callers arriving while it
+    is running await the same task instead of starting their own. Nothing
+    is cached: the key is forgotten as soon as the task finishes.
+
+    The shared task is shielded from individual callers, so a cancelled
+    leader does not cancel the work for the others. It is only cancelled
+    once every caller has gone away. Errors propagate to every waiter.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.logger = logger
+        self._flights: Dict[str, _Flight] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() for key, or join the call already in flight for it"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+            self.logger.info(f"{self.name}: joined in-flight call ({flight.waiters} already waiting)")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller was cancelled; nobody is left to use the result
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        """Leader/coalesced counters and current in-flight keys"""
+        return {**self.stats, "in_flight": len(self._flights)}
+
+
+# Coalesces duplicate /analyze requests for the same parsed survey
+analysis_flight = SingleFlight("analysis")
@@ -0,0 +1,153 @@
+import logging
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+import pyarrow as pa
+import pyarrow.parquet as pq
+from cachetools import TTLCache
+from app.models import SurveyData
+from app.config import settings
+from app.services.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# Survey IDs are sha256 content hashes; anything else never touches the disk
+SURVEY_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class SurveyStore:
+    """
+    Content-addressed store of parsed surveys
+
+    /upload parses a file once and keeps the result under its content hash,
+    so /analyze can refer to it by survey_id instead of re-uploading. Reads
+    go through a bounded in-process LRU with TTL first, then Parquet files
+    on disk. Disk entries expire after the TTL (counted from last access)
+    and the least recently used ones are evicted once the directory grows
+    past its size limit.
+    """
+
+    def __init__(self):
+        self.logger = logger
+        self.directory = settings.survey_store_dir
+        self.ttl_seconds = settings.survey_store_ttl_seconds
+        self.max_disk_bytes = settings.survey_store_max_disk_mb * 1024 * 1024
+        self._memory = TTLCache(maxsize=settings.survey_store_memory_entries, ttl=self.ttl_seconds)
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _path(self, survey_id: str) -> str:
+        return os.path.join(self.directory, f"{survey_id}.parquet")
+
+    def put(self, survey_id: str, survey_data: SurveyData):
+        """Store a parsed survey in every tier"""
+        self._memory[survey_id] = survey_data
+        if self.directory:
+            self._disk_set(survey_id, survey_data)
+        self.stats["stores"] += 1
+
+    def get(self, survey_id: str) -> Optional[SurveyData]:
+        """Look up a survey, promoting disk hits into memory"""
+        if not SURVEY_ID_PATTERN.match(survey_id):
+            self.stats["misses"] += 1
+            return None
+
+        survey_data = self._memory.get(survey_id)
+        if survey_data is not None:
+            self.stats["memory_hits"] += 1
+            return survey_data
+
+        if self.directory:
+            survey_data = self._disk_get(survey_id)
+            if survey_data is not None:
+                self.stats["disk_hits"] += 1
+                self._memory[survey_id] = survey_data
+                return survey_data
+
+        self.stats["misses"] += 1
+        return None
+
+    def _disk_set(self, survey_id: str, survey_data: SurveyData):
+        path = self._path(survey_id)
+        try:
+            if os.path.exists(path):
+                # Same content already stored; just refresh its TTL
+                os.utime(path)
+                return
+
+            with stage_timer("survey_store_write"):
+                # Created on the first write rather than at import
+                os.makedirs(self.directory, exist_ok=True)
+                table = pa.table(
+                    {"respondent_id": survey_data.respondent_ids, "text": survey_data.texts},
+                    metadata={"format": survey_data.format, "filter": json.dumps(survey_data.filter_report)}
+                )
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                pq.write_table(table, tmp_path, compression="zstd")
+                os.replace(tmp_path, path)
+            self._evict()
+        except Exception as e:
+            # The memory tier still serves the survey; a broken disk tier must never fail an upload
+            self.logger.warning(f"Survey store write failed: {str(e)}")
+
+    def _disk_get(self, survey_id: str) -> Optional[SurveyData]:
+        path = self._path(survey_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+
+            with stage_timer("survey_store_read"):
+                table = pq.read_table(path)
+                survey_data = SurveyData(
+                    texts=table.column("text"),
+                    respondent_ids=table.column("respondent_id"),
+                    format=table.schema.metadata[b"format"].decode("utf-8"),
+                    filter_report=json.loads(table.schema.metadata.get(b"filter", b"null"))
+                )
+            # Access time drives both TTL and LRU eviction
+            os.utime(path)
+            return survey_data
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Survey store read failed: {str(e)}")
+            return None
+
+    def _evict(self):
+        """Drop expired files, then the least recently used ones until under the size limit"""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".parquet"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if now - mtime <= self.ttl_seconds and total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                self.stats["evictions"] += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def preview(self, survey_data: SurveyData) -> List[Dict[str, str]]:
+        """First few responses, for clients to confirm what was parsed"""
+        return [resp.dict() for resp in survey_data.responses(limit=settings.survey_store_preview_rows)]
+
+    def get_stats(self) -> Dict[str, int]:
+        """Hit/miss counters plus current in-memory size"""
+        return {**self.stats, "memory_entries": len(self._memory)}
+
+
+# Create singleton instance
+survey_store = SurveyStore()
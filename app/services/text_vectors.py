@@ -0,0 +1,107 @@
+"""
+Vectorized text features shared by the local NLP stages
+Byte n-grams are extracted for a whole column at once with NumPy
+"""
+import hashlib
+from typing import Callable, List, Tuple, Union
+import numpy as np
+import pyarrow as pa
+
+# Multiplicative hashing constant (64-bit golden ratio)
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# Response texts as a Python list or an Arrow string column (SurveyData.texts)
+TextColumn = Union[List[str], pa.Array]
+
+
+def as_text_array(texts: TextColumn) -> pa.Array:
+    """Arrow string array of the texts (Arrow input is passed through)"""
+    if isinstance(texts, pa.ChunkedArray):
+        return texts.combine_chunks()
+    if isinstance(texts, pa.Array):
+        return texts
+    return pa.array(texts, type=pa.string())
+
+
+def _utf8_buffers(texts: Union[List[str], pa.Array]) -> Tuple[np.ndarray, np.ndarray]:
+    """(offsets, bytes) of the UTF-8 encoded texts without per-string encoding"""
+    if isinstance(texts, pa.ChunkedArray):
+        texts = texts.combine_chunks()
+    if isinstance(texts, pa.Array):
+        texts = texts.cast(pa.large_string())
+    else:
+        texts = pa.array(texts, type=pa.large_string())
+
+    _, offsets_buffer, data_buffer = texts.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=np.int64)[texts.offset:texts.offset + len(texts) + 1]
+    data = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.empty(0, np.uint8)
+    return offsets, data
+
+
+def byte_ngrams(texts: Union[List[str], pa.Array], n: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashed byte n-grams of every text (n <= 8)
+
+    Returns (hashes, doc_ids): one uint64 hash per n-gram and the index of
+    the text it came from, grouped by text in input order. Texts shorter
+    than n (including nulls) yield a single zero-padded gram, so every text
+    has at least one.
+    """
+    offsets, data = _utf8_buffers(texts)
+    size = len(data)
+    buffer = np.concatenate([data, np.zeros(n, dtype=np.uint8)]).astype(np.uint64)
+
+    # Pack the n bytes starting at every buffer position into one integer
+    packed = np.zeros(size + 1, dtype=np.uint64)
+    for offset in range(n):
+        packed = (packed << np.uint64(8)) | buffer[offset:offset + size + 1]
+
+    starts = offsets[:-1]
+    lengths = offsets[1:] - starts
+    gram_counts = np.maximum(lengths - n + 1, 1)
+    doc_ids = np.repeat(np.arange(len(starts)), gram_counts)
+    first_gram = np.cumsum(gram_counts) - gram_counts
+    positions = np.arange(len(doc_ids)) + np.repeat(starts - first_gram, gram_counts)
+    grams = packed[positions]
+
+    # Zero-pad short texts instead of reading into the next one
+    short = np.flatnonzero(lengths < n)
+    if len(short):
+        padding = ((n - lengths[short]) * 8).astype(np.uint64)
+        grams[first_gram[short]] = (grams[first_gram[short]] >> padding) << padding
+
+    # Spread the packed bytes over the full 64-bit range
+    hashes = grams * HASH_MULTIPLIER
+    hashes ^= hashes >> np.uint64(29)
+    return hashes, doc_ids
+
+
+def row_hashes(texts: Union[List[str], pa.Array]) -> np.ndarray:
+    """One uint64 hash per text (BLAKE2b of its UTF-8 bytes), for telling rows apart"""
+    offsets, data = _utf8_buffers(texts)
+    view = memoryview(data)
+    bounds = zip(offsets[:-1].tolist(), offsets[1:].tolist())
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(view[start:end], digest_size=8).digest(), "little") for start, end in bounds),
+        dtype=np.uint64, count=len(offsets) - 1
+    )
+
+
+def update_digest(digest, texts: Union[List[str], pa.Array]):
+    """Feed the texts into a hashlib digest: their byte lengths, then their bytes"""
+    offsets, data = _utf8_buffers(texts)
+    digest.update((offsets - offsets[0]).tobytes())
+    digest.update(data[offsets[0]:offsets[-1]])
+
+
+def byte_counts(texts: Union[List[str], pa.Array], byte_class: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+    """Per text, how many of its UTF-8 bytes byte_class (uint8 array -> bool array) selects"""
+    offsets, data = _utf8_buffers(texts)
+    if not len(offsets) - 1:
+        return np.zeros(0, dtype=np.int64)
+    # Trailing False so empty texts at the end still have a valid segment start
+    flags = np.zeros(int(offsets[-1]) + 1, dtype=bool)
+    flags[:-1] = byte_class(data[:offsets[-1]])
+    counts = np.add.reduceat(flags, offsets[:-1], dtype=np.int64)
+    counts[offsets[1:] == offsets[:-1]] = 0
+    return counts
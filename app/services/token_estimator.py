@@ -0,0 +1,12 @@
+"""
+Local token estimates for prompt sizing
+Uses the usual ~4 characters per token heuristic, no API round-trip
+"""
+import math
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated token count for a piece of text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -0,0 +1,87 @@
+import logging
+from typing import Dict, Optional
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from app.config import settings
+from app.services.metrics import count_error
+
+logger = logging.getLogger(__name__)
+
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(HTTPException):
+    """Raised while the request body is streaming in, once it crosses the limit"""
+
+    def __init__(self, max_file_size_bytes: int):
+        self.message = f"File exceeds {max_file_size_bytes / (1024*1024):.0f}MB limit"
+        super().__init__(status_code=413, detail=self.message)
+
+
+def upload_too_large_response(message: str) -> JSONResponse:
+    """413 in the same shape the routes use for file_too_large"""
+    count_error("file_too_large")
+    return JSONResponse(
+        status_code=413,
+        content={
+            "status": "error",
+            "error_type": "file_too_large",
+            "message": message
+        }
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Enforce the upload size limit while the body is being received
+
+    Requests with a Content-Length over the limit are answered with 413
+    before any of the body is read. Chunked or mislabelled bodies are
+    counted as they arrive and aborted as soon as the limit is crossed, so
+    an oversized upload is never buffered in full. Bodies under the limit
+    are left to Starlette, which spools large multipart files to disk.
+    Paths that accept several files can be given their own limit.
+    """
+
+    def __init__(self, app, max_file_size_bytes: Optional[int] = None,
+                 path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_file_size_bytes = max_file_size_bytes or settings.get_max_file_size_bytes()
+        self.path_limits = path_limits or {}
+        self.logger = logger
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        max_file_size_bytes = self.path_limits.get(scope["path"], self.max_file_size_bytes)
+        max_body_bytes = max_file_size_bytes + MULTIPART_OVERHEAD_BYTES
+
+        # Reject up front when the client declares an oversized body
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_body_bytes:
+            error = UploadTooLargeError(max_file_size_bytes)
+            self.logger.warning(f"Rejected upload: Content-Length {int(content_length)} bytes, {error.message}")
+            await upload_too_large_response(error.message)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_bytes:
+                    self.logger.warning(f"Aborted upload after {received} bytes")
+                    raise UploadTooLargeError(max_file_size_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def upload_too_large_handler(request, exc: UploadTooLargeError) -> JSONResponse:
+    """Exception handler turning a mid-stream abort into the standard error body"""
+    return upload_too_large_response(exc.message)
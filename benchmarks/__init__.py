@@ -0,0 +1,4 @@
+"""
+Performance benchmarks for the survey pipeline
+Run with: python -m benchmarks.run_benchmarks --help
+"""
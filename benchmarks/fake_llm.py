@@ -0,0 +1,65 @@
+"""
+In-process stand-in for the Gemini SDK model (generate_content_async)
+Returns the fake backend's canned text after a configurable latency, with no network
+(the service itself runs offline with LLM_BACKEND=fake)
+"""
+import asyncio
+import random
+
+from app.services.llm_backend import fake_text
+
+
+class FakeResponse:
+    """Mimics the parts of GenerateContentResponse the analyzer reads"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = [text] if text else []
+
+
+class FakeStream:
+    """Async iterator of response chunks, spread over the call latency"""
+
+    def __init__(self, text: str, chunks: int, delay: float):
+        self.text = text
+        self.chunks = chunks
+        self.delay = delay
+
+    async def __aiter__(self):
+        size = max(1, len(self.text) // self.chunks + 1)
+        for start in range(0, len(self.text), size):
+            await asyncio.sleep(self.delay)
+            yield FakeResponse(self.text[start:start + size])
+
+
+class FakeGeminiModel:
+    """
+    Drop-in for genai.GenerativeModel in benchmarks
+
+    Every call sleeps latency +/- jitter seconds (uniform). Map-reduce
+    chunk prompts get a short plain-text summary; persona prompts get the
+    canned persona JSON.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, seed: int = 42):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _text(self, prompt: str) -> str:
+        return fake_text(prompt)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            return FakeStream(self._text(prompt), chunks=8, delay=self._delay() / 8)
+        await asyncio.sleep(self._delay())
+        return FakeResponse(self._text(prompt))
+
+    def generate_content(self, prompt, generation_config=None, **kwargs):
+        self.calls += 1
+        return FakeResponse(self._text(prompt))
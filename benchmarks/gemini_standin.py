@@ -0,0 +1,124 @@
+"""
+Local stand-in for the Gemini REST API
+
+Serves generateContent and streamGenerateContent (alt=sse) with simulated
+latency, 429s and 5xx errors, so the service can be load-tested offline.
+
+Usage:
+    python -m benchmarks.gemini_standin --port 8090 --latency 1.0 --rate-429 0.05
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8090 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks.fake_llm import FakeGeminiModel
+
+
+def _payload(text: str, finish: bool = True) -> dict:
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finish:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+
+def _error(status: int, message: str, retry_after: float = None) -> JSONResponse:
+    headers = {"Retry-After": str(int(retry_after))} if retry_after else None
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"code": status, "message": message}},
+        headers=headers,
+    )
+
+
+def create_app(latency: float = 1.0, jitter: float = 0.2, rate_429: float = 0.0,
+               rate_5xx: float = 0.0, stream_chunks: int = 8, seed: int = 42) -> FastAPI:
+    app = FastAPI(title="Gemini stand-in")
+    fake = FakeGeminiModel(latency=latency, jitter=jitter, seed=seed)
+    rng = random.Random(seed)
+    stats = {"requests": 0, "ok": 0, "429": 0, "5xx": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def injected_error():
+        roll = rng.random()
+        if roll < rate_429:
+            stats["429"] += 1
+            return _error(429, "Resource has been exhausted (e.g. check quota).", retry_after=1)
+        if roll < rate_429 + rate_5xx:
+            stats["5xx"] += 1
+            status = rng.choice((500, 503))
+            return _error(status, "The service is currently unavailable." if status == 503 else "Internal error.")
+        return None
+
+    @app.post("/v1beta/models/{model_method}")
+    async def generate(model_method: str, request: Request):
+        _, _, method = model_method.partition(":")
+        body = await request.json()
+        prompt = "".join(part.get("text", "") for content in body.get("contents", [])
+                         for part in content.get("parts", []))
+
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        streaming = False
+        try:
+            # Errors come back after a short delay, like a real rejected call
+            error = injected_error()
+            if error is not None:
+                await asyncio.sleep(min(0.05, latency))
+                return error
+
+            text = fake._text(prompt)
+            delay = fake._delay()
+            if method == "streamGenerateContent":
+                # The stream releases its in-flight slot when it finishes
+                streaming = True
+                return StreamingResponse(_sse(text, delay, stream_chunks), media_type="text/event-stream")
+
+            await asyncio.sleep(delay)
+            stats["ok"] += 1
+            return _payload(text)
+        finally:
+            if not streaming:
+                stats["in_flight"] -= 1
+
+    async def _sse(text: str, delay: float, chunks: int):
+        size = max(1, len(text) // chunks + 1)
+        pieces = [text[start:start + size] for start in range(0, len(text), size)]
+        try:
+            for index, piece in enumerate(pieces):
+                await asyncio.sleep(delay / len(pieces))
+                yield f"data: {json.dumps(_payload(piece, finish=index == len(pieces) - 1))}\r\n\r\n"
+            stats["ok"] += 1
+        finally:
+            stats["in_flight"] -= 1
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local Gemini REST stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=1.0, help="Mean response latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Uniform latency jitter (seconds)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of calls rejected with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Fraction of calls failing with 500/503")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.jitter, args.rate_429, args.rate_5xx, seed=args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Open-loop load test for /analyze against a local Gemini stand-in
+
+Usage:
+    python -m benchmarks.load_test --rates 1 2 4 8 16 --duration 30
+    python -m benchmarks.load_test --target http://127.0.0.1:8000 --no-spawn
+
+By default this starts the Gemini stand-in (benchmarks/gemini_standin.py)
+and one uvicorn worker of the app pointed at it, then offers requests at
+each rate in turn. Arrivals are scheduled on a clock (Poisson by default)
+and never wait for earlier responses, so a saturated server shows up as
+growing latency and in-flight requests instead of a lower send rate.
+Everything runs offline on one machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.synthetic import survey_file  # noqa: E402
+from benchmarks.run_benchmarks import DATA_DIR, RESULTS_DIR, _git_commit  # noqa: E402
+
+
+def _percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return round(ordered[index], 4)
+
+
+class LoadStep:
+    """Outcome of every request offered at one rate"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def record(self, status: str, latency: float):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == "200":
+            self.latencies.append(latency)
+
+    def report(self, sent: int, duration: float, busy_seconds: float, llm_stats: Dict) -> Dict:
+        ordered = sorted(self.latencies)
+        ok = len(ordered)
+        return {
+            "offered_rps": self.rate,
+            "sent": sent,
+            "ok": ok,
+            "throughput_rps": round(ok / duration, 3),
+            "error_rate": round(1 - ok / sent, 4) if sent else 0.0,
+            "statuses": self.statuses,
+            "latency_seconds": {
+                "p50": _percentile(ordered, 0.50),
+                "p95": _percentile(ordered, 0.95),
+                "p99": _percentile(ordered, 0.99),
+                "max": round(ordered[-1], 4) if ordered else None,
+            },
+            # Little's law: mean requests in flight over the step
+            "mean_concurrency": round(busy_seconds / duration, 2),
+            "max_concurrency": self.max_in_flight,
+            "llm": llm_stats,
+        }
+
+
+async def run_step(client: httpx.AsyncClient, base_content: bytes, rate: float, duration: float,
+                   timeout: float, arrivals: str, rng: random.Random, counter: List[int]):
+    step = LoadStep(rate)
+    tasks = []
+    busy = [0.0]
+
+    async def one_request(request_id: int):
+        # A unique row per request keeps single-flight from merging identical uploads
+        content = base_content + f'"load test request {request_id}"\r\n'.encode()
+        step.in_flight += 1
+        step.max_in_flight = max(step.max_in_flight, step.in_flight)
+        start = time.perf_counter()
+        try:
+            response = await client.post(
+                "/analyze", files={"file": (f"load_{request_id}.csv", content)}, timeout=timeout
+            )
+            status = str(response.status_code)
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        finally:
+            step.in_flight -= 1
+        latency = time.perf_counter() - start
+        busy[0] += latency
+        step.record(status, latency)
+
+    start = time.perf_counter()
+    next_at = 0.0
+    while next_at < duration:
+        delay = start + next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        counter[0] += 1
+        tasks.append(asyncio.create_task(one_request(counter[0])))
+        next_at += rng.expovariate(rate) if arrivals == "poisson" else 1.0 / rate
+
+    await asyncio.gather(*tasks)
+    return step, len(tasks), time.perf_counter() - start, busy[0]
+
+
+async def _llm_stats(standin_url: Optional[str]) -> Dict:
+    if not standin_url:
+        return {}
+    async with httpx.AsyncClient(base_url=standin_url) as client:
+        return (await client.get("/stats")).json()
+
+
+def _stats_delta(before: Dict, after: Dict) -> Dict:
+    delta = {key: after[key] - before.get(key, 0) for key in ("requests", "ok", "429", "5xx") if key in after}
+    if "max_in_flight" in after:
+        delta["max_in_flight_total"] = after["max_in_flight"]
+    return delta
+
+
+async def run_load(args, target: str, standin_url: Optional[str]) -> List[Dict]:
+    with open(survey_file(DATA_DIR, args.rows, "csv"), "rb") as f:
+        base_content = f.read()
+
+    rng = random.Random(args.seed)
+    counter = [0]
+    steps = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=target, limits=limits) as client:
+        for rate in args.rates:
+            before = await _llm_stats(standin_url)
+            step, sent, elapsed, busy = await run_step(
+                client, base_content, rate, args.duration, args.timeout, args.arrivals, rng, counter
+            )
+            after = await _llm_stats(standin_url)
+            report = step.report(sent, elapsed, busy, _stats_delta(before, after) if after else {})
+            steps.append(report)
+            latency = report["latency_seconds"]
+            print(
+                f"rate {rate:>6} rps: throughput {report['throughput_rps']:.2f} rps, "
+                f"p50 {latency['p50']}s p95 {latency['p95']}s p99 {latency['p99']}s, "
+                f"errors {report['error_rate']:.1%}, concurrency {report['mean_concurrency']} "
+                f"(max {report['max_concurrency']})",
+                flush=True
+            )
+    return steps
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {proc.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+def _spawn(args) -> List[subprocess.Popen]:
+    # Per-request INFO logs from the app would drown the step reports
+    output = None if args.server_logs else subprocess.DEVNULL
+    standin = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.gemini_standin", "--port", str(args.standin_port),
+         "--latency", str(args.latency), "--jitter", str(args.jitter),
+         "--rate-429", str(args.rate_429), "--rate-5xx", str(args.rate_5xx), "--seed", str(args.seed)],
+        cwd=ROOT_DIR, stdout=output, stderr=output
+    )
+    env = {
+        # Provider limits are left to the stand-in; the app's own limiter can
+        # be re-enabled by exporting these before running
+        "GEMINI_REQUESTS_PER_MINUTE": "0",
+        "GEMINI_TOKENS_PER_MINUTE": "0",
+        **os.environ,
+        "GEMINI_API_KEY": "load-test",
+        "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{args.standin_port}",
+    }
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(args.app_port), "--workers", "1", "--log-level", "warning"],
+        cwd=ROOT_DIR, env=env, stdout=output, stderr=output
+    )
+    processes = [standin, app]
+    try:
+        _wait_ready(f"http://127.0.0.1:{args.standin_port}/stats", standin)
+        _wait_ready(f"http://127.0.0.1:{args.app_port}/metrics", app)
+    except Exception:
+        _stop(processes)
+        raise
+    return processes
+
+
+def _stop(processes: List[subprocess.Popen]):
+    for proc in processes:
+        proc.terminate()
+    for proc in processes:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop /analyze load test")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="Offered request rates (requests/second), run in order")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per rate")
+    parser.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--rows", type=int, default=1000, help="Responses per uploaded survey")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request")
+    parser.add_argument("--target", help="App base URL (default: spawn one on --app-port)")
+    parser.add_argument("--standin", help="Stand-in base URL for LLM call stats")
+    parser.add_argument("--no-spawn", dest="spawn", action="store_false",
+                        help="Use already running servers given by --target/--standin")
+    parser.add_argument("--server-logs", action="store_true", help="Show spawned server output")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--standin-port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=1.0, help="Stand-in latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Stand-in latency jitter (seconds)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Stand-in 429 fraction")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Stand-in 500/503 fraction")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/load_<timestamp>.json)")
+    args = parser.parse_args()
+
+    processes = []
+    if args.spawn:
+        processes = _spawn(args)
+        target = f"http://127.0.0.1:{args.app_port}"
+        standin_url = f"http://127.0.0.1:{args.standin_port}"
+    else:
+        if not args.target:
+            parser.error("--target is required with --no-spawn")
+        target, standin_url = args.target, args.standin
+
+    started = datetime.now(timezone.utc)
+    try:
+        steps = asyncio.run(run_load(args, target, standin_url))
+    finally:
+        _stop(processes)
+
+    results = {
+        "meta": {
+            "timestamp": started.isoformat(),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "steps": steps,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, "load_" + started.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+Benchmark suite for parsing, prompt building and the full HTTP path
+
+Usage:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --rows 10 1000 100000 1000000 --formats csv --repeat 5
+
+Surveys are generated deterministically (see benchmarks/synthetic.py) and
+cached in benchmarks/data/. Gemini is replaced by the fake LLM backend with
+configurable latency, so runs need no API key and no network. Results are
+written as JSON for comparison between commits.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.synthetic import survey_file, generate_responses  # noqa: E402
+
+# Benchmarks run without credentials or provider limits; these must be set
+# before app.config is first imported (also in the spawned parse workers)
+BENCH_ENV = {
+    "GEMINI_API_KEY": "benchmark",
+    "GEMINI_REQUESTS_PER_MINUTE": "0",
+    "GEMINI_TOKENS_PER_MINUTE": "0",
+    "PERSONA_CACHE_ENABLED": "false",
+}
+
+
+def _apply_env():
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "runs": len(samples),
+        "min": round(ordered[0], 6),
+        "median": round(statistics.median(ordered), 6),
+        "mean": round(statistics.fmean(ordered), 6),
+        "p95": round(p95, 6),
+    }
+
+
+def _peak_rss_mb() -> float:
+    import resource
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# ============================================
+# PARSING
+# ============================================
+
+def _parse_worker(path: str) -> Dict:
+    """Runs in a fresh process so peak RSS belongs to one parse only"""
+    _apply_env()
+    import pyarrow as pa
+    from app.services.file_validator import validator
+
+    with open(path, "rb") as f:
+        content = f.read()
+    validator.MAX_FILE_SIZE_BYTES = len(content) + 1
+
+    baseline_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    survey_data = validator.validate_file(os.path.basename(path), content)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "seconds": elapsed,
+        "responses": len(survey_data),
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_growth_mb": _peak_rss_mb() - baseline_rss,
+        "arrow_peak_mb": pa.default_memory_pool().max_memory() / (1024 * 1024),
+    }
+
+
+def bench_parse(path: str, repeat: int) -> Dict:
+    ctx = multiprocessing.get_context("spawn")
+    runs = []
+    for _ in range(repeat):
+        # A new single-use worker per run; worker errors are re-raised here
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            runs.append(pool.submit(_parse_worker, path).result())
+
+    size = os.path.getsize(path)
+    seconds = _summary([run["seconds"] for run in runs])
+    return {
+        "file_bytes": size,
+        "responses": runs[0]["responses"],
+        "seconds": seconds,
+        "mb_per_second": round(size / (1024 * 1024) / seconds["median"], 2) if seconds["median"] else None,
+        "rows_per_second": round(runs[0]["responses"] / seconds["median"]) if seconds["median"] else None,
+        "peak_rss_mb": round(max(run["peak_rss_mb"] for run in runs), 1),
+        "rss_growth_mb": round(max(run["rss_growth_mb"] for run in runs), 1),
+        "arrow_peak_mb": round(max(run["arrow_peak_mb"] for run in runs), 1),
+    }
+
+
+# ============================================
+# SURVEY REPRESENTATION
+# ============================================
+
+def bench_survey_data(rows: int, repeat: int) -> Dict:
+    """Row objects (one SurveyResponse per response) vs the columnar SurveyData"""
+    import gc
+    import tracemalloc
+    import pyarrow as pa
+    from app.models import SurveyData, SurveyResponse
+
+    # Columns as the CSV parser hands them over
+    texts = pa.array(generate_responses(rows), type=pa.large_string())
+    respondent_ids = pa.array([str(idx) for idx in range(rows)], type=pa.string())
+
+    def build_rows():
+        return [
+            SurveyResponse(text=text, respondent_id=respondent_id)
+            for text, respondent_id in zip(texts.to_pylist(), respondent_ids.to_pylist())
+        ]
+
+    def build_columns():
+        return SurveyData(texts=texts, respondent_ids=respondent_ids, format="csv")
+
+    results = {"responses": rows, "text_bytes": texts.nbytes}
+    for name, build in (("row_objects", build_rows), ("columnar", build_columns)):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            built = build()
+            times.append(time.perf_counter() - start)
+            del built
+
+        # Memory the representation keeps alive: traced Python objects for
+        # the rows, the Arrow buffers it references for the columns
+        gc.collect()
+        tracemalloc.start()
+        built = build()
+        python_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        held = built.nbytes + python_bytes if isinstance(built, SurveyData) else python_bytes
+        results[name] = {
+            "build_seconds": _summary(times),
+            "memory_mb": round(held / (1024 * 1024), 2),
+        }
+        del built
+
+    rows_result, columns_result = results["row_objects"], results["columnar"]
+    results["memory_reduction"] = round(rows_result["memory_mb"] / max(columns_result["memory_mb"], 0.01), 1)
+    results["build_speedup"] = round(
+        rows_result["build_seconds"]["median"] / max(columns_result["build_seconds"]["median"], 1e-6), 1
+    )
+    return results
+
+
+# ============================================
+# PROMPT BUILDING
+# ============================================
+
+def bench_prompt(rows: int, repeat: int) -> Dict:
+    import pyarrow as pa
+    from app.services.gemini_analyzer import analyzer
+    from app.services.response_dedup import deduplicator, weighted_lines
+    from app.services.prompt_budget import prompt_budget
+    from app.services.token_estimator import estimate_tokens
+
+    responses = generate_responses(rows)
+    # Warm-up so one-off costs (regex compilation, imports) are not timed
+    deduplicator.collapse(responses[:100])
+
+    raw_times, pipeline_times = [], []
+    prompt = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        prompt = analyzer.create_analysis_prompt(responses)
+        raw_times.append(time.perf_counter() - start)
+
+    final_prompt, report = "", {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        collapsed, weights, _, report = deduplicator.collapse(responses)
+        lines = weighted_lines(collapsed, weights)
+        included, _ = prompt_budget.fit(lines, weights=weights)
+        final_prompt = analyzer.create_analysis_prompt(lines.take(pa.array(included, type=pa.int64())).to_pylist())
+        pipeline_times.append(time.perf_counter() - start)
+
+    return {
+        "responses": rows,
+        "create_analysis_prompt_seconds": _summary(raw_times),
+        "raw_prompt_chars": len(prompt),
+        "raw_prompt_tokens_estimated": estimate_tokens(prompt),
+        "dedup_budget_prompt_seconds": _summary(pipeline_times),
+        "final_prompt_chars": len(final_prompt),
+        "final_prompt_tokens_estimated": estimate_tokens(final_prompt),
+        "unique_responses": report.get("unique_responses"),
+    }
+
+
+# ============================================
+# END TO END
+# ============================================
+
+async def _bench_http(paths: Dict[str, str], repeat: int, latency: float, jitter: float) -> Dict:
+    import logging
+    import httpx
+    from app.main import app
+    from app.services.gemini_analyzer import analyzer
+    from app.services.llm_backend import FakeBackend
+
+    # Per-request INFO logs would dominate the small-survey timings
+    logging.getLogger().setLevel(logging.WARNING)
+    analyzer.backend = FakeBackend(latency=latency, jitter=jitter)
+    results = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, path in paths.items():
+            with open(path, "rb") as f:
+                content = f.read()
+            filename = os.path.basename(path)
+
+            timings = {"upload": [], "analyze": []}
+            for _ in range(repeat):
+                for endpoint in timings:
+                    start = time.perf_counter()
+                    response = await client.post(f"/{endpoint}", files={"file": (filename, content)})
+                    timings[endpoint].append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"/{endpoint} {name}: {response.status_code} {response.text[:200]}")
+
+            calls_before = analyzer.backend.stats["calls"]
+            await client.post("/analyze", files={"file": (filename, content)})
+            results[name] = {
+                "file_bytes": len(content),
+                "upload_seconds": _summary(timings["upload"]),
+                "analyze_seconds": _summary(timings["analyze"]),
+                "llm_calls_per_analysis": analyzer.backend.stats["calls"] - calls_before,
+            }
+
+    return results
+
+
+# ============================================
+# RUNNER
+# ============================================
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Survey pipeline benchmarks")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 1000, 10000, 100000],
+                        help="Survey sizes to generate (rows)")
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx"],
+                        choices=["csv", "xlsx", "parquet", "arrow", "ndjson"])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Fake LLM latency jitter (seconds)")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["parse", "survey_data", "prompt", "http"])
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    _apply_env()
+    from app.config import settings
+
+    started = datetime.now(timezone.utc)
+    results = {
+        "meta": {
+            "timestamp": started.isoformat(),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        }
+    }
+
+    paths = {}
+    for rows in args.rows:
+        for file_format in args.formats:
+            start = time.perf_counter()
+            paths[f"{file_format}_{rows}"] = survey_file(DATA_DIR, rows, file_format)
+            print(f"survey {file_format} {rows} rows ready ({time.perf_counter() - start:.1f}s)", flush=True)
+
+    if "parse" not in args.skip:
+        results["parse"] = {}
+        for name, path in paths.items():
+            results["parse"][name] = bench_parse(path, args.repeat)
+            print(f"parse {name}: {results['parse'][name]['seconds']['median']:.3f}s", flush=True)
+
+    if "survey_data" not in args.skip:
+        results["survey_data"] = {}
+        for rows in args.rows:
+            result = bench_survey_data(rows, args.repeat)
+            results["survey_data"][str(rows)] = result
+            print(f"survey_data {rows}: {result['memory_reduction']}x less memory, "
+                  f"{result['build_speedup']}x faster to build", flush=True)
+
+    if "prompt" not in args.skip:
+        results["prompt"] = {}
+        for rows in args.rows:
+            results["prompt"][str(rows)] = bench_prompt(rows, args.repeat)
+            print(f"prompt {rows}: {results['prompt'][str(rows)]['dedup_budget_prompt_seconds']['median']:.3f}s",
+                  flush=True)
+
+    if "http" not in args.skip:
+        # The HTTP path keeps the production upload limit
+        limit = settings.get_max_file_size_bytes()
+        http_paths = {name: path for name, path in paths.items() if os.path.getsize(path) <= limit}
+        skipped = sorted(set(paths) - set(http_paths))
+        results["http"] = asyncio.run(_bench_http(http_paths, args.repeat, args.latency, args.jitter))
+        results["http_skipped_over_upload_limit"] = skipped
+        for name, result in results["http"].items():
+            print(f"http {name}: analyze {result['analyze_seconds']['median']:.3f}s", flush=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, started.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Synthetic survey generator
+Builds reproducible CSV/XLSX/Parquet/Arrow/NDJSON surveys with realistic response lengths
+"""
+import csv
+import json
+import os
+from typing import List
+import numpy as np
+import openpyxl
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# Vocabulary skewed towards what game surveys talk about
+THEMES = [
+    "story", "combat", "graphics", "music", "multiplayer", "coop", "pvp", "grind", "loot",
+    "progression", "bosses", "levels", "controls", "camera", "performance", "crashes", "bugs",
+    "price", "microtransactions", "battle pass", "dlc", "servers", "matchmaking", "tutorial",
+    "difficulty", "exploration", "crafting", "quests", "characters", "dialogue", "open world",
+]
+OPINIONS = [
+    "I love the", "I really enjoy the", "the", "honestly the", "I hate the", "not a fan of the",
+    "could improve the", "please fix the", "would pay more for better", "spent hours on the",
+]
+QUALIFIERS = [
+    "is amazing", "feels clunky", "is too slow", "is way too grindy", "is fun with friends",
+    "needs work", "keeps me coming back", "is overpriced", "is the best part", "is confusing",
+    "runs great on PC", "drops frames on console", "is pretty good", "could be better",
+]
+FILLER = [
+    "and", "but", "also", "because", "when", "after", "every", "weekend", "session", "really",
+    "game", "play", "time", "friends", "hours", "update", "season", "team", "new", "more",
+]
+
+# Short answers many respondents give verbatim (or nearly so)
+COMMON_ANSWERS = [
+    "great game", "Great game!!", "fun", "love it", "its ok", "too expensive", "more content please",
+    "fix the servers", "best game ever", "boring",
+]
+
+
+def generate_responses(rows: int, seed: int = 42, duplicate_ratio: float = 0.15) -> List[str]:
+    """
+    Response texts with a log-normal word count (median ~12 words, long tail
+    up to 400) and a share of short stock answers
+    """
+    rng = np.random.default_rng(seed)
+    word_counts = np.clip(rng.lognormal(mean=np.log(12), sigma=0.9, size=rows), 1, 400).astype(int)
+    is_common = rng.random(rows) < duplicate_ratio
+
+    responses = []
+    for count, common in zip(word_counts.tolist(), is_common.tolist()):
+        if common:
+            responses.append(COMMON_ANSWERS[rng.integers(len(COMMON_ANSWERS))])
+            continue
+        words = [
+            OPINIONS[rng.integers(len(OPINIONS))],
+            THEMES[rng.integers(len(THEMES))],
+            QUALIFIERS[rng.integers(len(QUALIFIERS))],
+        ]
+        extra = max(0, count - 6)
+        if extra:
+            words.extend(FILLER[idx] if idx < len(FILLER) else THEMES[idx - len(FILLER)]
+                         for idx in rng.integers(len(FILLER) + len(THEMES), size=extra).tolist())
+        responses.append(" ".join(words))
+
+    return responses
+
+
+def write_csv(path: str, responses: List[str]):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(["Survey Response"])
+        writer.writerows([resp] for resp in responses)
+
+
+def write_xlsx(path: str, responses: List[str]):
+    # Write-only mode streams rows to disk
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Survey")
+    sheet.append(["Survey Response"])
+    for resp in responses:
+        sheet.append([resp])
+    workbook.save(path)
+
+
+def _export_table(responses: List[str]) -> pa.Table:
+    # Analytics exports carry more than the response; the validator only reads that column
+    return pa.table({
+        "respondent_id": [f"resp_{idx}" for idx in range(len(responses))],
+        "score": np.random.default_rng(0).integers(1, 11, size=len(responses)),
+        "Survey Response": responses,
+    })
+
+
+def write_parquet(path: str, responses: List[str]):
+    pq.write_table(_export_table(responses), path)
+
+
+def write_arrow(path: str, responses: List[str]):
+    # Uncompressed, so the validator can read it zero-copy
+    feather.write_feather(_export_table(responses), path, compression="uncompressed")
+
+
+def write_ndjson(path: str, responses: List[str]):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in _export_table(responses).to_pylist():
+            f.write(json.dumps(record) + "\n")
+
+
+WRITERS = {
+    "csv": write_csv,
+    "xlsx": write_xlsx,
+    "parquet": write_parquet,
+    "arrow": write_arrow,
+    "ndjson": write_ndjson,
+}
+
+
+def survey_file(data_dir: str, rows: int, file_format: str, seed: int = 42) -> str:
+    """Path to a generated survey, creating it on first use"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"survey_{rows}_{seed}.{file_format}")
+    if not os.path.exists(path):
+        responses = generate_responses(rows, seed)
+        tmp_path = path + ".tmp"
+        WRITERS[file_format](tmp_path, responses)
+        os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,265 @@
+"""
+LLM Call Path Tests
+Circuit breaker states, rate limiter admission, the fake/record/replay backends and the analyzer running on the fake backend.
+No API key or network needed.
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from google.api_core import exceptions as api_exceptions
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from app.services.gemini_analyzer import analyzer
+from app.services.llm_backend import (
+    CassetteNotFoundError, FAKE_PERSONA, FakeBackend, RecordReplayBackend, fake_text
+)
+from app.services.llm_resilience import LLMDeadlineError, LLMResilience
+from app.services.rate_limiter import LLMRateLimiter
+
+
+def banner(title: str):
+    print("\n" + "="*60)
+    print(title)
+    print("="*60)
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = dict(
+        enabled=True, window_calls=10, min_calls=4, failure_ratio=0.5,
+        slow_call_seconds=0, open_seconds=0.1, half_open_probes=2
+    )
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+
+def fail_once(breaker: CircuitBreaker):
+    try:
+        with breaker.guard():
+            raise api_exceptions.ServiceUnavailable("overloaded")
+    except api_exceptions.ServiceUnavailable:
+        pass
+
+
+@asynccontextmanager
+async def no_admission():
+    yield
+
+
+def test_breaker_opens_half_opens_and_closes():
+    """Failures open the circuit; successful probes close it again"""
+    banner("TEST: Circuit Breaker Open -> Half-Open -> Closed")
+    breaker = make_breaker()
+
+    for _ in range(4):
+        fail_once(breaker)
+    assert breaker.state == OPEN, breaker.state
+    print(f"✓ Opened after 4 failures: {breaker.get_stats()}")
+
+    def guarded_call():
+        with breaker.guard():
+            pass
+
+    for reject in (breaker.check, guarded_call):
+        try:
+            reject()
+            raise AssertionError("Open circuit let a call through")
+        except CircuitOpenError:
+            pass
+    assert breaker.stats["rejected"] == 2
+    print("✓ check() and guard() reject while open")
+
+    time.sleep(0.12)
+    with breaker.guard():
+        assert breaker.state == HALF_OPEN
+        with breaker.guard():
+            try:
+                with breaker.guard():
+                    raise AssertionError("Third probe admitted with half_open_probes=2")
+            except CircuitOpenError:
+                pass
+    assert breaker.state == CLOSED, breaker.state
+    print("✓ Half-open admits 2 probes, closes after both succeed")
+
+
+def test_breaker_reopens_on_failed_probe():
+    """One failing probe sends the circuit straight back to open"""
+    banner("TEST: Circuit Breaker Failed Probe")
+    breaker = make_breaker()
+    for _ in range(4):
+        fail_once(breaker)
+    time.sleep(0.12)
+    fail_once(breaker)
+    assert breaker.state == OPEN, breaker.state
+    assert breaker.stats["opened"] == 2
+    print(f"✓ Reopened: {breaker.get_stats()}")
+
+
+def test_breaker_slow_calls_and_local_deadline():
+    """Slow provider calls count as failures; our own deadline does not"""
+    banner("TEST: Circuit Breaker Slow Calls vs Local Deadline")
+    breaker = make_breaker(slow_call_seconds=0.01)
+    for _ in range(4):
+        with breaker.guard():
+            time.sleep(0.02)
+    assert breaker.state == OPEN and breaker.stats["slow_calls"] == 4
+    print("✓ 4 slow calls opened the circuit")
+
+    breaker = make_breaker()
+    resilience = LLMResilience(1, 0.01, 0.01, 0.05, False, 0.9, 5, 0.1)
+
+    async def hang():
+        with breaker.guard():
+            await asyncio.sleep(1)
+
+    async def run():
+        for _ in range(5):
+            try:
+                await resilience.call(hang, "test", admit=no_admission)
+                raise AssertionError("Deadline did not fire")
+            except LLMDeadlineError:
+                pass
+
+    asyncio.run(run())
+    assert breaker.state == CLOSED and breaker.stats["failures"] == 0, breaker.get_stats()
+    assert resilience.stats["deadline_exceeded"] == 5
+    print(f"✓ 5 local deadlines, circuit still closed: {breaker.get_stats()}")
+
+
+def test_limiter_admission():
+    """Concurrency cap holds and token budget makes callers wait"""
+    banner("TEST: Rate Limiter Admission")
+
+    async def concurrency():
+        limiter = LLMRateLimiter(max_concurrency=2, requests_per_minute=0, tokens_per_minute=0)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with limiter.acquire(10):
+                peak = max(peak, limiter.stats["in_flight"])
+                await asyncio.sleep(0.02)
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        return peak, limiter.get_stats()
+
+    peak, stats = asyncio.run(concurrency())
+    assert peak == 2, peak
+    assert stats["admitted"] == 6 and stats["in_flight"] == 0 and stats["waiting"] == 0, stats
+    print(f"✓ 6 calls, at most {peak} in flight")
+
+    async def token_budget():
+        # 600 tokens/minute refill at 10 per second; the bucket starts full
+        limiter = LLMRateLimiter(max_concurrency=4, requests_per_minute=0, tokens_per_minute=600)
+        async with limiter.acquire(600) as first_wait:
+            pass
+        async with limiter.acquire(3) as second_wait:
+            pass
+        return first_wait, second_wait
+
+    first_wait, second_wait = asyncio.run(token_budget())
+    assert first_wait < 0.05, first_wait
+    assert 0.2 < second_wait < 1.0, second_wait
+    print(f"✓ Full bucket admits at once, empty bucket waits {second_wait:.2f}s")
+
+
+def test_fake_backend_record_replay():
+    """Recorded prompts replay offline, in the same chunks; others fail"""
+    banner("TEST: Fake Backend Record/Replay")
+    prompt = "Summarize what they reveal about these players:\n- great game"
+    generation_settings = {"temperature": 0.0, "max_output_tokens": 256}
+
+    async def run(cassette_dir: str):
+        fake = FakeBackend(latency=0, jitter=0, stream_chunks=4)
+        recorder = RecordReplayBackend("record", cassette_dir, "test-model", inner=fake)
+        recorded = await recorder.generate(prompt, generation_settings)
+        recorded_chunks = [chunk async for chunk in recorder.stream(prompt + " (stream)", generation_settings)]
+
+        player = RecordReplayBackend("replay", cassette_dir, "test-model")
+        replayed = await player.generate(prompt, generation_settings)
+        replayed_chunks = [chunk async for chunk in player.stream(prompt + " (stream)", generation_settings)]
+        try:
+            await player.generate(prompt, {**generation_settings, "temperature": 0.5})
+            raise AssertionError("Replayed a prompt that was never recorded")
+        except CassetteNotFoundError:
+            pass
+        return recorded, recorded_chunks, replayed, replayed_chunks, recorder, player, fake
+
+    with tempfile.TemporaryDirectory() as cassette_dir:
+        recorded, recorded_chunks, replayed, replayed_chunks, recorder, player, fake = asyncio.run(run(cassette_dir))
+        cassettes = len(list(Path(cassette_dir).glob("*.json")))
+
+    assert recorded == fake_text(prompt) == replayed
+    assert len(recorded_chunks) > 1 and replayed_chunks == recorded_chunks
+    assert cassettes == 2 and recorder.stats["recorded"] == 2
+    assert fake.stats["calls"] == 2
+    assert player.stats["replayed"] == 2 and player.stats["missing"] == 1
+    print(f"✓ Recorded {cassettes} cassettes, replayed both; unknown prompt raised CassetteNotFoundError")
+
+
+def test_analyzer_on_fake_backend():
+    """Full analysis and streaming through limiter, retries and breaker, with the fake LLM"""
+    banner("TEST: Analyzer on the Fake LLM Backend")
+    latency = 0.2
+
+    async def run():
+        surveys = [[f"I play raid {i} every night with friends", "The grind is too slow"] for i in range(8)]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(analyzer.analyze_survey_with_metadata(survey) for survey in surveys))
+        elapsed = time.perf_counter() - start
+        events = [event async for event, _ in analyzer.stream_survey(["Streaming works for me too"])]
+        return results, elapsed, events
+
+    backend = analyzer.backend
+    analyzer.backend = FakeBackend(latency=latency, jitter=0)
+    try:
+        results, elapsed, events = asyncio.run(run())
+        calls = analyzer.backend.stats["calls"]
+    finally:
+        analyzer.backend = backend
+
+    for persona, metadata in results:
+        assert not persona.degraded
+        assert persona.archetype_name == FAKE_PERSONA["archetype_name"], persona.archetype_name
+        assert metadata["prompt"]["llm_calls"] == 1, metadata
+    # The fake's latency is paid, but the surveys are analyzed concurrently
+    assert latency <= elapsed < latency * len(results), elapsed
+    assert events[-1] == "persona" and events.count("section") > 1, events
+    assert calls == len(results) + 1, calls
+    print(f"✓ {len(results)} analyses in {elapsed:.2f}s and one stream ({len(events)} events), {calls} fake LLM calls")
+
+
+def main():
+    """Run all tests"""
+    print("\n")
+    print("█" * 60)
+    print("  LLM CALL PATH TESTS")
+    print("█" * 60)
+
+    try:
+        test_breaker_opens_half_opens_and_closes()
+        test_breaker_reopens_on_failed_probe()
+        test_breaker_slow_calls_and_local_deadline()
+        test_limiter_admission()
+        test_fake_backend_record_replay()
+        test_analyzer_on_fake_backend()
+
+        print("\n" + "="*60)
+        print("✓ ALL TESTS PASSED")
+        print("="*60)
+        return True
+
+    except Exception as e:
+        print(f"\n✗ TEST FAILED: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -22,7 +22,7 @@ async def test_file_validation():
     
     survey = validator.validate_file('test_survey.csv', content)
     print(f"✓ CSV parsed successfully")
-    print(f"  - Responses: {len(survey.responses)}")
+    print(f"  - Responses: {len(survey)}")
     print(f"  - Format: {survey.format}")
     
     return True
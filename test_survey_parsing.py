@@ -0,0 +1,253 @@
+"""
+Survey Parsing Tests
+Columnar file formats, CSV type rendering, the response pre-filter and dedup.
+No API key or network needed.
+"""
+import io
+import json
+import random
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as paipc
+import pyarrow.parquet as pq
+from app.config import settings
+from app.services.file_validator import validator
+from app.services.response_dedup import ResponseDeduplicator, weighted_lines
+from app.services.response_filter import ResponseFilter, response_filter
+
+# Other columns around the responses, and a null response that must be skipped
+SURVEY_TABLE = pa.table({
+    "respondent": [1, 2, 3],
+    "response": ["Great   game", "Too grindy", None],
+    "score": [9.5, 4.0, 7.0],
+})
+EXPECTED_TEXTS = ["Great game", "Too grindy"]
+
+
+def banner(title: str):
+    print("\n" + "="*60)
+    print(title)
+    print("="*60)
+
+
+def make_filter(**rules) -> ResponseFilter:
+    """A filter with only the given rules switched on"""
+    options = dict(enabled=True, min_chars=0, min_alpha_ratio=0.0, stop_answers=[], deny_patterns=[], scripts=[])
+    options.update(rules)
+    return ResponseFilter(**options)
+
+
+def kept_texts(survey_filter: ResponseFilter, texts):
+    kept, report = survey_filter.apply(pa.array(texts, type=pa.string()))
+    return [texts[index] for index in kept], report
+
+
+@contextmanager
+def prefilter_off():
+    """Parse without the pre-filter, so only the parser decides what is kept"""
+    enabled = response_filter.enabled
+    response_filter.enabled = False
+    try:
+        yield
+    finally:
+        response_filter.enabled = enabled
+
+
+def test_columnar_formats():
+    """Parquet, Arrow file, Arrow stream and NDJSON all find the response column"""
+    banner("TEST: Parquet / Arrow / NDJSON Parsing")
+
+    parquet = io.BytesIO()
+    pq.write_table(SURVEY_TABLE, parquet)
+    arrow_file = io.BytesIO()
+    feather.write_feather(SURVEY_TABLE, arrow_file)
+    arrow_stream = pa.BufferOutputStream()
+    with paipc.new_stream(arrow_stream, SURVEY_TABLE.schema) as writer:
+        writer.write_table(SURVEY_TABLE)
+    ndjson = "".join(json.dumps(row) + "\n" for row in SURVEY_TABLE.to_pylist()).encode("utf-8")
+
+    uploads = [
+        ("survey.parquet", parquet.getvalue(), "parquet"),
+        ("survey.arrow", arrow_file.getvalue(), "arrow"),
+        ("survey_stream.arrow", arrow_stream.getvalue().to_pybytes(), "arrow"),
+        ("survey.ndjson", ndjson, "ndjson"),
+    ]
+    for filename, content, survey_format in uploads:
+        survey = validator.validate_file(filename, content)
+        assert survey.format == survey_format, (filename, survey.format)
+        assert survey.texts.to_pylist() == EXPECTED_TEXTS, (filename, survey.texts)
+        assert survey.respondent_ids.to_pylist() == ["0", "1"], (filename, survey.respondent_ids)
+        print(f"✓ {filename}: {len(survey)} responses ({survey.format})")
+
+    try:
+        validator.validate_file("survey.parquet", b"not parquet at all")
+        raise AssertionError("Broken Parquet accepted")
+    except ValueError as e:
+        assert "Invalid Parquet file" in str(e), str(e)
+    print("✓ Broken Parquet rejected with ValueError")
+
+
+def test_csv_values():
+    """CSV cells render like pandas, except integers too large for int64"""
+    banner("TEST: CSV Value Rendering")
+    cases = [
+        (b"score\n5\n10\n", ["5", "10"]),
+        (b"score\n1.5\n2\n", ["1.5", "2.0"]),
+        (b"score,comment\n5,fine\n,ok\n", ["5.0", "ok"]),
+        (b"answer\nTrue\nfalse\n", ["True", "False"]),
+        (b"id\n123456789012345678901\n5\n", ["123456789012345678901", "5"]),
+        (b"code\n0x10\n5\n", ["0x10", "5"]),
+        (b"score\n+5\n 6 \n", ["5", "6"]),
+        (b"score\n+1.5\n 2\n", ["1.5", "2.0"]),
+        (b"id\n18446744073709551615\n5\n", ["18446744073709551615", "5"]),
+        (b"answer\n10/10\nyes\n", ["10/10", "yes"]),
+    ]
+    with prefilter_off():
+        for content, expected in cases:
+            survey = validator.validate_file("survey.csv", content)
+            assert survey.texts.to_pylist() == expected, (content, survey.texts)
+            print(f"✓ {expected}")
+
+
+def pandas_texts(content: bytes):
+    """(text, respondent_id) pairs as the original pandas iterrows parser built them"""
+    df = pd.read_csv(io.BytesIO(content))
+    rows = []
+    for idx, row in df.iterrows():
+        text = None
+        for val in row:
+            if pd.notna(val):
+                text = validator.normalize_text(str(val))
+                if text:
+                    break
+        if text and text.lower() != "nan":
+            rows.append((text, str(idx)))
+    return rows
+
+
+def test_csv_multiple_blocks():
+    """Files the Arrow reader splits into several blocks parse like pandas"""
+    banner("TEST: Multi-block CSV")
+    rng = random.Random(45000)
+    lines = ["score,response"] + [
+        f"{rng.choice(['', str(rng.randint(1, 10)), '7.5'])},answer number {i} " + "x" * rng.randint(0, 60)
+        for i in range(45000)
+    ]
+    content = ("\n".join(lines) + "\n").encode("utf-8")
+    assert len(content) > 2 * 1024 * 1024, len(content)
+
+    with prefilter_off():
+        survey = validator.validate_file("survey.csv", content)
+    rows = list(zip(survey.texts.to_pylist(), survey.respondent_ids.to_pylist()))
+    assert rows == pandas_texts(content)
+    print(f"✓ {len(content) / 1e6:.1f} MB, {len(rows)} responses match pandas")
+
+
+def test_filter_rules():
+    """Each pre-filter rule drops what it should and nothing else"""
+    banner("TEST: Response Pre-filter Rules")
+    cases = [
+        ("min_length", make_filter(min_chars=3), ["ok", "fun", "5"], ["fun"]),
+        ("alpha_ratio", make_filter(min_alpha_ratio=0.5), ["10/10", "fun game 10/10", "!!!"], ["fun game 10/10"]),
+        ("stop_answer", make_filter(stop_answers=["n/a", "same"]),
+         ["N/A", "Same.", "same as last year, but better"], ["same as last year, but better"]),
+        ("deny_pattern", make_filter(deny_patterns=settings.filter_deny_patterns),
+         ["https://example.com/x", "me@example.com", "asdfgh", "see https://example.com for the bug"],
+         ["see https://example.com for the bug"]),
+        ("script", make_filter(scripts=["Latin"]), ["отличная игра", "great game", "café ☕"], ["great game", "café ☕"]),
+    ]
+    for rule, survey_filter, texts, expected in cases:
+        kept, report = kept_texts(survey_filter, texts)
+        assert kept == expected, (rule, kept)
+        assert report["dropped_by_rule"][rule] == len(texts) - len(expected), (rule, report)
+        assert sum(report["dropped_by_rule"].values()) == report["dropped_responses"]
+        print(f"✓ {rule}: dropped {report['dropped_by_rule'][rule]}/{len(texts)}")
+
+    kept, report = kept_texts(make_filter(enabled=False, min_chars=100), ["ok", "fun"])
+    assert kept == ["ok", "fun"] and not report["dropped_responses"]
+    print("✓ Disabled filter keeps everything")
+
+    # The shipped defaults only drop non-answers
+    texts = ["5", "10/10", "yes", "no", "same", "feedback", "n/a", "idk", "asdfgh", "www.example.com"]
+    kept, report = kept_texts(response_filter, texts)
+    assert kept == ["5", "10/10", "yes", "no", "same", "feedback"], kept
+    print(f"✓ Defaults keep ratings and short words: {report['dropped_by_rule']}")
+
+
+def test_dedup_grouping():
+    """Exact, case/punctuation and near duplicates collapse into one line with a weight"""
+    banner("TEST: Response Dedup Grouping")
+    deduplicator = ResponseDeduplicator(enabled=True, num_perm=64, bands=16, threshold=0.8)
+    responses = [
+        "Great game",
+        "Love the soundtrack",
+        "Great game",
+        "great game!!",
+        "The matchmaking is slow and unfair to new players",
+        "The matchmaking is slow and unfair to new player",
+        "Rated it 5 stars (x3)",
+    ]
+    lines, weights, representatives, report = deduplicator.collapse(responses)
+    assert lines == [
+        "Great game",
+        "Love the soundtrack",
+        "The matchmaking is slow and unfair to new players",
+        "Rated it 5 stars (x3)",
+    ], lines
+    assert weights == [3, 1, 2, 1], weights
+    assert representatives == [0, 1, 4, 6], representatives
+    assert report["exact_duplicates"] == 1 and report["near_duplicates"] == 2, report
+    assert report["tokens_saved"] > 0
+    print(f"✓ {len(responses)} responses -> {len(lines)} lines, weights {weights}")
+
+    # The weight is only rendered into prompt lines, and always as the last suffix
+    assert weighted_lines(lines, weights).to_pylist() == [
+        "Great game (x3)",
+        "Love the soundtrack",
+        "The matchmaking is slow and unfair to new players (x2)",
+        "Rated it 5 stars (x3) (x1)",
+    ]
+    print("✓ Prompt lines carry the weight as a suffix")
+
+    lines, weights, representatives, report = ResponseDeduplicator(False, 64, 16, 0.8).collapse(responses)
+    assert lines == responses and weights == [1] * len(responses)
+    assert representatives == list(range(len(responses)))
+    print("✓ Disabled dedup passes responses through")
+
+
+def main():
+    """Run all tests"""
+    print("\n")
+    print("█" * 60)
+    print("  SURVEY PARSING TESTS")
+    print("█" * 60)
+
+    try:
+        test_columnar_formats()
+        test_csv_values()
+        test_csv_multiple_blocks()
+        test_filter_rules()
+        test_dedup_grouping()
+
+        print("\n" + "="*60)
+        print("✓ ALL TESTS PASSED")
+        print("="*60)
+        return True
+
+    except Exception as e:
+        print(f"\n✗ TEST FAILED: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)